@@ -5,7 +5,12 @@ import threading
 # Add the vendor directory to the sys.path to allow importing bundled packages
 sys.path.append(os.path.join(os.path.dirname(__file__), "vendor"))
 
-from repacker.repacker import repack_bundle
+from repacker.repacker import (
+    repack_bundle, plan_repack as plan_repack_bundle, create_worker_executor,
+    open_result_cache, repack_result_key, DEFAULT_RESULT_CACHE_MAX_BYTES, DEFAULT_TEXTURE_ENCODER,
+    DEFAULT_ASTC_BLOCK_SIZE, DEFAULT_ASTC_PRESET, DEFAULT_COMPRESSION_LEVEL,
+)
+from utils.mod_source import close_archives
 import character_scraper
 import cdn_downloader
 from unpacker import unpack_bundle as unpacker_main
@@ -13,8 +18,16 @@ import spine_merger
 import resolver
 import local_bundle_indexer
 import json
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
+# --- Batch repack scheduling ---
+# Downloads are I/O bound and overlap with the CPU work of other jobs.
+BATCH_DOWNLOAD_WORKERS = 3
+# Bundles repacked at the same time; each one keeps its Environment in memory.
+BATCH_REPACK_WORKERS = 2
+
 # --- Global Cache for CDN Catalog ---
 # In-memory cache for the catalog JSON content.
 # The key is the version, the value is the parsed JSON content.
@@ -383,18 +396,104 @@ def unpack_bundle(bundle_path, output_dir, progress_callback=None):
         return False, error_message
 
 
-def main(original_bundle_path, modded_assets_folder, output_path, use_astc, progress_callback=None):
+def _repack_with_result_cache(result_cache_mb, **repack_args):
+    """
+    Run repack_bundle, or copy the stored output when the same original bundle,
+    mod files and encoder options were repacked before.
+
+    result_cache_mb: Byte cap of the result cache in MiB; None uses the default
+                     cap and 0 disables the cache
+    """
+    progress_callback = repack_args.get("progress_callback")
+    output_path = repack_args["output_path"]
+
+    result_cache = None
+    result_key = None
+    if result_cache_mb != 0:
+        max_bytes = result_cache_mb * 1024 * 1024 if result_cache_mb else DEFAULT_RESULT_CACHE_MAX_BYTES
+        try:
+            result_cache = open_result_cache(repack_args.get("cache_dir"), max_bytes)
+            # Hashes the mod files in place; archives are read without extracting them
+            result_key = repack_result_key(
+                repack_args["original_bundle_path"],
+                repack_args["modded_assets_folder"],
+                repack_args["use_astc"],
+                repack_args["astc_block_size"],
+                repack_args["astc_preset"],
+                repack_args["compression_level"],
+                repack_args.get("max_texture_size"),
+                repack_args.get("texture_encoder", DEFAULT_TEXTURE_ENCODER),
+            )
+            os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+            if result_cache.get_file(result_key, output_path):
+                message = "Reused cached repack result."
+                if progress_callback:
+                    progress_callback(message)
+                return True, message
+        except OSError as e:
+            print(f"Repack result cache unavailable: {e}")
+            result_cache = None
+
+    success, message = repack_bundle(**repack_args)
+    if success and result_cache is not None:
+        result_cache.put_file(result_key, output_path)
+    return success, message
+
+
+def main(original_bundle_path, modded_assets_folder, output_path, use_astc, progress_callback=None, cache_dir=None,
+         astc_block_size=DEFAULT_ASTC_BLOCK_SIZE, astc_preset=DEFAULT_ASTC_PRESET,
+         compression_level=DEFAULT_COMPRESSION_LEVEL, memory_budget_mb=None, result_cache_mb=None,
+         save_merged_pngs=False, max_texture_size=None, texture_encoder=DEFAULT_TEXTURE_ENCODER):
     """
     Main entry point to be called from Kotlin.
+
+    Args:
+        modded_assets_folder: Mod directory, mod zip archive, or a list of them
+                              (later sources override files of earlier ones);
+                              archives are read in place without extracting
+        cache_dir: Optional root directory for persistent repack caches
+                   (defaults to a folder under the app's temp dir)
+        astc_block_size: "4x4", "5x5", "6x6", "8x8", or "original" to keep
+                         each target texture's existing ASTC format
+        astc_preset: astcenc speed preset: "fastest", "fast", "medium", "thorough"
+        compression_level: LZ4 level for the saved bundle: 0 for fast LZ4,
+                           1-12 for LZ4HC (9 is the previous fixed setting)
+        memory_budget_mb: Memory budget for concurrent texture compression in MiB
+                          (None derives it from the currently available RAM)
+        result_cache_mb: Size cap in MiB of the cache of finished bundles, keyed by
+                         the original bundle, mod files and options (None for the
+                         default cap, 0 to disable)
+        save_merged_pngs: Debug option that also writes merged Spine pages and atlas
+                          to a mod directory (they are otherwise kept in memory);
+                          bypasses the result cache so the merge always runs
+        max_texture_size: Longest allowed texture side in pixels, e.g. 2048 for
+                          low-memory devices; larger textures are downscaled and
+                          their atlas pages rescaled to match (None keeps the
+                          original resolution)
+        texture_encoder: Encoder for compressed textures: "astc" (libastcenc) or
+                         "etcpak" (ETC2_RGBA8, much faster but lower quality;
+                         needs the optional etcpak package and ignores the
+                         ASTC block size and preset; falls back to "astc" with
+                         a progress message when etcpak is not installed)
+
     Returns a tuple: (success: Boolean, message: String)
     """
     try:
-        success, message = repack_bundle(
+        success, message = _repack_with_result_cache(
+            0 if save_merged_pngs else result_cache_mb,
             original_bundle_path=original_bundle_path,
             modded_assets_folder=modded_assets_folder,
             output_path=output_path,
             use_astc=use_astc,
-            progress_callback=progress_callback
+            progress_callback=progress_callback,
+            cache_dir=cache_dir,
+            astc_block_size=astc_block_size,
+            astc_preset=astc_preset,
+            compression_level=compression_level,
+            memory_budget_mb=memory_budget_mb,
+            save_merged_pngs=save_merged_pngs,
+            max_texture_size=max_texture_size,
+            texture_encoder=texture_encoder
         )
 
         print(message)
@@ -405,6 +504,158 @@ def main(original_bundle_path, modded_assets_folder, output_path, use_astc, prog
         error_message = traceback.format_exc()
         print(f"An error occurred: {error_message}")
         return False, error_message
+    finally:
+        # Result cache hits hash the mod files without reaching repack_bundle
+        close_archives(modded_assets_folder)
+
+
+def plan_repack(original_bundle_path, modded_assets_folder, use_astc=True, cache_dir=None,
+                astc_block_size=DEFAULT_ASTC_BLOCK_SIZE, astc_preset=DEFAULT_ASTC_PRESET, max_texture_size=None,
+                texture_encoder=DEFAULT_TEXTURE_ENCODER):
+    """
+    Dry run of main(): reports what a repack would do without decoding or
+    compressing anything, so the UI can show the work and its cost up front.
+
+    Returns a tuple: (success: Boolean, plan JSON string or error message)
+    """
+    try:
+        success, plan = plan_repack_bundle(
+            original_bundle_path=original_bundle_path,
+            modded_assets_folder=modded_assets_folder,
+            use_astc=use_astc,
+            cache_dir=cache_dir,
+            astc_block_size=astc_block_size,
+            astc_preset=astc_preset,
+            max_texture_size=max_texture_size,
+            texture_encoder=texture_encoder
+        )
+        if not success:
+            return False, plan
+        return True, json.dumps(plan)
+
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred: {error_message}")
+        return False, error_message
+
+
+def repack_batch(jobs_json, output_dir, cache_key, quality="HD", use_astc=True, progress_callback=None,
+                 result_callback=None, cache_dir=None, astc_block_size=DEFAULT_ASTC_BLOCK_SIZE,
+                 astc_preset=DEFAULT_ASTC_PRESET, compression_level=DEFAULT_COMPRESSION_LEVEL, memory_budget_mb=None,
+                 result_cache_mb=None, max_texture_size=None, texture_encoder=DEFAULT_TEXTURE_ENCODER):
+    """
+    Entry point for Kotlin to download and repack several bundles with one shared scheduler.
+
+    Downloads run on their own small thread pool so they overlap with CPU work,
+    and a job is repacked as soon as its bundle is available. JSON conversions
+    and texture compressions of all jobs go into one bounded worker pool
+    instead of one executor per job.
+
+    Args:
+        jobs_json: JSON string of [{"hashed_name": "...", "modded_assets_folder": "...",
+                   "output_path": "...", "original_bundle_path": "..."}, ...];
+                   original_bundle_path is optional and skips the download;
+                   modded_assets_folder accepts the same values as in main();
+                   an optional "texture_encoder" overrides the batch default for that job
+        output_dir: Directory for downloaded bundles and the catalog
+        cache_key: Batch key for the shared catalog cache (see download_bundle)
+        quality: CDN quality used for downloads
+        progress_callback: Called with "[hashed_name] message" strings
+        result_callback: Called with a JSON string as soon as a job finishes:
+                         {"hashed_name", "success", "message", "original_bundle_path", "output_path"}
+        use_astc, cache_dir, astc_block_size, astc_preset, compression_level,
+        memory_budget_mb, result_cache_mb, max_texture_size, texture_encoder: same as main(); without an explicit
+                          budget all jobs share one budget derived from the available RAM
+
+    Returns a tuple: (success: Boolean, results_json: String)
+    success is True only if every job succeeded.
+    """
+    results = []
+    results_lock = threading.Lock()
+
+    def job_progress(hashed_name):
+        def report(message):
+            if progress_callback:
+                progress_callback(f"[{hashed_name}] {message}")
+        return report
+
+    def finish(job, success, message, original_bundle_path=None):
+        result = {
+            "hashed_name": job["hashed_name"],
+            "success": success,
+            "message": message,
+            "original_bundle_path": original_bundle_path,
+            "output_path": job["output_path"],
+        }
+        with results_lock:
+            results.append(result)
+        if result_callback:
+            result_callback(json.dumps(result))
+
+    def run_repack(job, original_bundle_path):
+        try:
+            success, message = _repack_with_result_cache(
+                result_cache_mb,
+                original_bundle_path=original_bundle_path,
+                modded_assets_folder=job["modded_assets_folder"],
+                output_path=job["output_path"],
+                use_astc=use_astc,
+                progress_callback=job_progress(job["hashed_name"]),
+                cache_dir=cache_dir,
+                astc_block_size=astc_block_size,
+                astc_preset=astc_preset,
+                compression_level=compression_level,
+                executor=worker_executor,
+                memory_budget_mb=memory_budget_mb,
+                max_texture_size=max_texture_size,
+                texture_encoder=job.get("texture_encoder", texture_encoder),
+            )
+        except Exception:
+            success, message = False, traceback.format_exc()
+        finish(job, success, message, original_bundle_path)
+
+    try:
+        jobs = json.loads(jobs_json)
+        worker_executor = create_worker_executor()
+        try:
+            with ThreadPoolExecutor(max_workers=BATCH_DOWNLOAD_WORKERS) as download_pool, \
+                    ThreadPoolExecutor(max_workers=BATCH_REPACK_WORKERS) as repack_pool:
+                repack_futures = []
+                download_futures = {}
+                for job in jobs:
+                    if job.get("original_bundle_path"):
+                        repack_futures.append(repack_pool.submit(run_repack, job, job["original_bundle_path"]))
+                    else:
+                        future = download_pool.submit(
+                            download_bundle, job["hashed_name"], quality, output_dir, cache_key,
+                            job_progress(job["hashed_name"]),
+                        )
+                        download_futures[future] = job
+
+                # Queue each repack as soon as its own download is done
+                for future in as_completed(download_futures):
+                    job = download_futures[future]
+                    try:
+                        downloaded, message_or_path = future.result()
+                    except Exception:
+                        downloaded, message_or_path = False, traceback.format_exc()
+                    if downloaded:
+                        repack_futures.append(repack_pool.submit(run_repack, job, message_or_path))
+                    else:
+                        finish(job, False, f"Download failed: {message_or_path}")
+
+                for future in repack_futures:
+                    future.result()
+        finally:
+            worker_executor.shutdown()
+            close_archives()
+
+        return all(r["success"] for r in results), json.dumps(results)
+
+    except Exception as e:
+        error_message = traceback.format_exc()
+        print(f"An error occurred during batch repack: {error_message}")
+        return False, error_message
 
 
 def merge_spine_assets(mod_dir_path, progress_callback=None):
@@ -1,7 +1,15 @@
 import hashlib
 import json
+import multiprocessing
+import os
+import re
 import struct
+import sys
 import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+from utils.disk_cache import DEFAULT_CACHE_ROOT, DiskCache, make_key
+from utils.mod_source import hash_mod_file, mod_file_size, open_mod_text
 
 transform_mode = { 'normal': 0, 'onlytranslation': 1, 'norotationorreflection': 2, 'noscale': 3, 'noscaleorreflection': 4 }
 blend_mode = {'normal': 0, 'additive': 1, 'multiply': 2, 'screen': 3 }
@@ -16,100 +24,229 @@ timeline_attachment_type = { "deform": 0, "sequence": 1 }
 timeline_path_type = { "position": 0, "spacing": 1, "mix": 2 }
 timeline_curve_type = { "linear": 0, "stepped": 1, "bezier": 2 }
 
-# Global variables for index mappings (used during conversion)
-strings_name_to_index = {}
-bones_name_to_index = {}
-slots_name_to_index = {}
-iks_name_to_index = {}
-transforms_name_to_index = {}
-paths_name_to_index = {}
-skins_name_to_index = {}
+# Bump whenever the .skel output for the same JSON changes, so cached output is not reused
+CONVERTER_VERSION = 1
 
-# Thread lock to prevent concurrent modifications to global variables
-_conversion_lock = threading.Lock()
+# Persistent cache of converted skeletons, keyed by JSON content hash and CONVERTER_VERSION
+SKEL_CACHE_SUBDIR = "skel"
+SKEL_CACHE_MAX_BYTES = 128 * 1024 * 1024
 
+# Parallel animation encoding
+# Animations are independent once the name tables are built, so long skeletons
+# are split into contiguous ranges, encoded by workers and concatenated in order.
+# Free-threaded builds use threads. Otherwise forked processes are used, which
+# inherit the parsed JSON instead of pickling it (unpickling the animation dicts
+# costs more than encoding them). Android (Chaquopy) can't fork, so it stays sequential.
+# Forking is also skipped while other threads run: a lock they hold at fork time
+# (logging, caches, astcenc helpers) would stay locked forever in the child.
+ANIMATION_WORKERS = max(1, os.cpu_count() or 1)
+PARALLEL_MIN_ANIMATIONS = 8
+_IS_ANDROID = hasattr(sys, 'getandroidapilevel') or 'ANDROID_ROOT' in os.environ
+_FREE_THREADED = not getattr(sys, '_is_gil_enabled', lambda: True)()
+_CAN_FORK = not _IS_ANDROID and 'fork' in multiprocessing.get_all_start_methods()
 
+# (converter, animation items) inherited by forked workers; one forked encode at a time
+_fork_state = None
+_fork_lock = threading.Lock()
 
-# Main function to convert JSON file to binary
-def json_to_skel(json_file, output_file):
+# Open .skel caches by root directory
+_skel_caches = {}
+_skel_caches_lock = threading.Lock()
+
+
+def _reset_skel_caches():
+    # Cache locks may have been copied while held by another thread of the parent
+    global _skel_caches, _skel_caches_lock
+    _skel_caches = {}
+    _skel_caches_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_skel_caches)
+
+
+# Streaming ingestion
+# Files at least this large are parsed incrementally when animations can't be
+# encoded in parallel anyway, so the whole object graph is never held at once.
+STREAMING_MIN_BYTES = 8 * 1024 * 1024
+# Top-level sections that feed the name -> index tables
+_TABLE_SECTIONS = frozenset({'bones', 'slots', 'ik', 'transform', 'path', 'skins'})
+
+
+def _encode_forked_range(start, end):
+    converter, items = _fork_state
+    return converter.encode_animations(items[start:end])
+
+
+class SkelConverter:
     """
-    Convert a JSON Spine file to binary .skel format.
-    
-    IMPORTANT: This function uses global variables and is NOT thread-safe.
-    A lock is used to ensure only one conversion runs at a time.
+    Converts Spine 4.1 JSON skeleton data to the binary .skel format.
+
+    Each converter holds its own name -> index tables, so separate instances
+    can run concurrently. An instance can be reused, but not shared between
+    threads while a conversion is running.
+
+    max_workers: workers for encoding animations in parallel; None uses
+    ANIMATION_WORKERS, 1 always encodes sequentially (e.g. inside a pool worker)
     """
-    with _conversion_lock:
+
+    def __init__(self, max_workers=None):
+        self.max_workers = ANIMATION_WORKERS if max_workers is None else max(1, max_workers)
+        # String refs that missed the table while streaming (see convert_stream)
+        self._unresolved_refs = None
+        self.strings_name_to_index = {}
+        self.bones_name_to_index = {}
+        self.slots_name_to_index = {}
+        self.iks_name_to_index = {}
+        self.transforms_name_to_index = {}
+        self.paths_name_to_index = {}
+        self.skins_name_to_index = {}
+
+    def convert_file(self, json_file, streaming=None):
+        """
+        Read a Spine JSON file and return the binary skeleton as bytes.
+        json_file may also be a zip entry path ("<archive>!/<entry>"), read without extraction.
+
+        streaming: parse incrementally with convert_stream(); None picks it for
+        files of STREAMING_MIN_BYTES or more when animations would be encoded
+        sequentially anyway
+        """
+        if streaming is None:
+            streaming = not self._can_encode_in_parallel() and mod_file_size(json_file) >= STREAMING_MIN_BYTES
+        if streaming:
+            return self.convert_stream(json_file)
+
         try:
-            with open(json_file, "r", encoding="utf-8") as f:
+            with open_mod_text(json_file, "utf-8") as f:
                 skeleton_data = json.load(f)
         except UnicodeDecodeError:
-            with open(json_file, "r", encoding="utf-8-sig") as f:
+            with open_mod_text(json_file, "utf-8-sig") as f:
                 skeleton_data = json.load(f)
-        
+        return self.convert(skeleton_data)
+
+    def convert_stream(self, json_file):
+        """
+        Convert a Spine JSON file while parsing it incrementally.
+
+        Top-level sections are parsed one at a time, and each animation is
+        encoded and released as soon as it has been parsed, so peak memory is
+        bounded by the largest animation instead of the whole file. The header
+        is written last, once the string table is complete.
+
+        Output is identical to convert_file(). A file that can't be encoded in
+        one pass (a table section after "animations", or an attachment name used
+        before the animation whose slot timeline introduces it) is streamed a
+        second time with the complete tables; real data errors surface there.
+        """
+        sections = {}
+        animation_strings = {}  # attachment names from slot timelines, in first-seen order
+        chunks = []
+        tables_ready = False
+        tables_changed = False
+
+        self._unresolved_refs = set()
+        try:
+            with open_mod_text(json_file, "utf-8-sig") as f:
+                stream = _JsonStream(f)
+                for key in stream.iter_object():
+                    if key != 'animations':
+                        sections[key] = stream.read_value()
+                        tables_changed = tables_changed or (tables_ready and key in _TABLE_SECTIONS)
+                        continue
+
+                    self.build_tables(sections)
+                    tables_ready = True
+                    for name in stream.iter_object():
+                        animation = stream.read_value()
+                        for string in _animation_attachment_names(animation):
+                            animation_strings[string] = None
+                        self.add_animation_strings(animation)
+                        if chunks is not None:
+                            try:
+                                chunks.append(self.encode_animations([(name, animation)]))
+                            except Exception:
+                                # Tables may still be incomplete here; redone in the second pass
+                                chunks = None
+                        del animation
+            unresolved = self._unresolved_refs
+        finally:
+            self._unresolved_refs = None
+
+        self._check_version(sections)
+        self.build_tables(sections)
+        for string in animation_strings:
+            self.strings_name_to_index.setdefault(string, len(self.strings_name_to_index))
+
+        if chunks is None or tables_changed or any(string in self.strings_name_to_index for string in unresolved):
+            chunks = []
+            with open_mod_text(json_file, "utf-8-sig") as f:
+                stream = _JsonStream(f)
+                for key in stream.iter_object():
+                    if key != 'animations':
+                        stream.read_value()
+                        continue
+                    for name in stream.iter_object():
+                        chunks.append(self.encode_animations([(name, stream.read_value())]))
+
+        writer = SkelWriter()
+        self.write_header(writer, sections)
+        writer.write_varint(len(chunks))
+        for chunk in chunks:
+            writer.write_bytes(chunk)
+        return writer.getvalue()
+
+    def convert(self, skeleton_data):
+        """Convert parsed Spine JSON data and return the binary skeleton as bytes."""
+        self._check_version(skeleton_data)
+
+        writer = SkelWriter()
+        self.write_skeleton_data(writer, skeleton_data)
+        return writer.getvalue()
+
+    def _check_version(self, skeleton_data):
         if not skeleton_data.get('skeleton').get('spine').startswith("4.1"):
             raise Exception("Cannot convert this file, unsupported Spine version.")
-        
-        write_skeleton_data_to_binary(skeleton_data, output_file)
 
+    def _can_encode_in_parallel(self):
+        return self.max_workers > 1 and (_FREE_THREADED or (_CAN_FORK and threading.active_count() == 1))
 
+    # Function to write skeleton data into binary
+    def write_skeleton_data(self, writer, skeleton_data):
+        animations = skeleton_data.get('animations', {})
+        self.build_tables(skeleton_data)
+        for animation in animations.values():
+            self.add_animation_strings(animation)
+        self.write_header(writer, skeleton_data)
 
-# Function to write skeleton data into binary
-def write_skeleton_data_to_binary(skeleton_data, output_file):
-    global strings_name_to_index
-    global bones_name_to_index
-    global slots_name_to_index
-    global iks_name_to_index
-    global transforms_name_to_index
-    global paths_name_to_index
-    global skins_name_to_index
-    
-    bones = skeleton_data.get('bones', [])
-    bones_name_to_index = {bone['name']: index for index, bone in enumerate(bones)}
-    
-    slots = skeleton_data.get('slots', [])
-    slots_name_to_index = {slot['name']: index for index, slot in enumerate(slots)}
-    
-    iks = skeleton_data.get('ik', [])
-    iks_name_to_index = {ik['name']: index for index, ik in enumerate(iks)}
-    
-    transforms = skeleton_data.get('transform', [])
-    transforms_name_to_index = {transform['name']: index for index, transform in enumerate(transforms)}
-    
-    paths = skeleton_data.get('path', [])
-    paths_name_to_index = {path['name']: index for index, path in enumerate(paths)}
-    
-    skins = skeleton_data.get('skins', [])
-    default_skin = next((s for s in skins if s.get('name') == 'default'), None)
-    other_skins = [s for s in skins if s.get('name') != 'default']
-    skins_in_order = ([default_skin] if default_skin else []) + other_skins
-    skins_name_to_index = {skin.get('name'): index for index, skin in enumerate(skins_in_order) if skin.get('name') is not None}
-    
-    animations = skeleton_data.get('animations', {})
+        # Animations
+        # This took a while to reverse
+        writer.write_varint(len(animations))
+        writer.write_bytes(self.encode_animations_parallel(list(animations.items())))
 
-    with open(output_file, 'wb') as binary_file:
-        
-        # Write the hash
-        # I don't know how it's actually generated so I just rehash the
-        # hash string from the JSON file, but it doesn't matter anyway
-        hash_string = skeleton_data.get('skeleton').get('hash', '')
-        hash_bytes = hashlib.sha256(hash_string.encode('utf-8')).digest()
-        hash_int = int.from_bytes(hash_bytes[:8], byteorder='big')
-        write_long(binary_file, hash_int)
+    def build_tables(self, skeleton_data):
+        """Build the name -> index tables and seed the string table from skins and slots."""
+        bones = skeleton_data.get('bones', [])
+        self.bones_name_to_index = {bone['name']: index for index, bone in enumerate(bones)}
 
-        # Write version string
-        write_string(binary_file, skeleton_data.get('skeleton').get('spine', ""))
+        slots = skeleton_data.get('slots', [])
+        self.slots_name_to_index = {slot['name']: index for index, slot in enumerate(slots)}
 
-        # Write basic properties (x, y, width, height)
-        write_float(binary_file, skeleton_data.get('skeleton').get('x', 0.0))
-        write_float(binary_file, skeleton_data.get('skeleton').get('y', 0.0))
-        write_float(binary_file, skeleton_data.get('skeleton').get('width', 0.0))
-        write_float(binary_file, skeleton_data.get('skeleton').get('height', 0.0))
+        iks = skeleton_data.get('ik', [])
+        self.iks_name_to_index = {ik['name']: index for index, ik in enumerate(iks)}
 
-        # We're not writing any on the non-essential data to the file since those aren't needed
-        # write_bool(binary_file, skeleton_data.get('nonessential', False))
-        write_bool(binary_file, False)
-        
-        # This strings_name_to_index thing is wrong but it seems to be working at the moment...
+        transforms = skeleton_data.get('transform', [])
+        self.transforms_name_to_index = {transform['name']: index for index, transform in enumerate(transforms)}
+
+        paths = skeleton_data.get('path', [])
+        self.paths_name_to_index = {path['name']: index for index, path in enumerate(paths)}
+
+        skins = skeleton_data.get('skins', [])
+        default_skin = next((s for s in skins if s.get('name') == 'default'), None)
+        other_skins = [s for s in skins if s.get('name') != 'default']
+        skins_in_order = ([default_skin] if default_skin else []) + other_skins
+        self.skins_name_to_index = {skin.get('name'): index for index, skin in enumerate(skins_in_order) if skin.get('name') is not None}
+
+        # This self.strings_name_to_index thing is wrong but it seems to be working at the moment...
         # It should actually be a dict for a lot of different strings in the file (attachments, events, etc)
         # Using just the list of attachments in the skin works for BD2 since they don't have events and such so far
         temp = []
@@ -140,206 +277,234 @@ def write_skeleton_data_to_binary(skeleton_data, output_file):
             if att:
                 temp.append(att)
 
-        # From animations: slot attachment timeline names
-        animations = skeleton_data.get('animations', {})
-        for anim in animations.values():
-            slots_timelines = anim.get('slots', {})
-            for _slot_name, timelines in slots_timelines.items():
-                attach_frames = timelines.get('attachment', [])
-                for frame in attach_frames:
-                    name = frame.get('name')
-                    if name:
-                        temp.append(name)
-
         # Build unique list preserving order
-        strings_name_to_index = {name: index for index, name in enumerate(dict.fromkeys(temp))}
-            
-        write_varint(binary_file, len(strings_name_to_index))
-        for name in strings_name_to_index:
-            write_string(binary_file, name)
+        self.strings_name_to_index = {name: index for index, name in enumerate(dict.fromkeys(temp))}
+
+    def add_animation_strings(self, animation):
+        """Append the attachment names used by an animation's slot timelines to the string table."""
+        strings = self.strings_name_to_index
+        for name in _animation_attachment_names(animation):
+            if name not in strings:
+                strings[name] = len(strings)
+
+    def write_header(self, writer, skeleton_data):
+        """Write everything before the animations (build_tables() must run first)."""
+        bones = skeleton_data.get('bones', [])
+        slots = skeleton_data.get('slots', [])
+        iks = skeleton_data.get('ik', [])
+        transforms = skeleton_data.get('transform', [])
+        paths = skeleton_data.get('path', [])
+        skins = skeleton_data.get('skins', [])
+        default_skin = next((s for s in skins if s.get('name') == 'default'), None)
+        other_skins = [s for s in skins if s.get('name') != 'default']
+
+        # Write the hash
+        # I don't know how it's actually generated so I just rehash the
+        # hash string from the JSON file, but it doesn't matter anyway
+        hash_string = skeleton_data.get('skeleton').get('hash', '')
+        hash_bytes = hashlib.sha256(hash_string.encode('utf-8')).digest()
+        hash_int = int.from_bytes(hash_bytes[:8], byteorder='big')
+        writer.write_long(hash_int)
+
+        # Write version string
+        writer.write_string(skeleton_data.get('skeleton').get('spine', ""))
+
+        # Write basic properties (x, y, width, height)
+        writer.write_float(skeleton_data.get('skeleton').get('x', 0.0))
+        writer.write_float(skeleton_data.get('skeleton').get('y', 0.0))
+        writer.write_float(skeleton_data.get('skeleton').get('width', 0.0))
+        writer.write_float(skeleton_data.get('skeleton').get('height', 0.0))
+
+        # We're not writing any on the non-essential data to the file since those aren't needed
+        # writer.write_bool(skeleton_data.get('nonessential', False))
+        writer.write_bool(False)
+
+        writer.write_varint(len(self.strings_name_to_index))
+        for name in self.strings_name_to_index:
+            writer.write_string(name)
 
 
         # Bones
-        write_varint(binary_file, len(bones))
+        writer.write_varint(len(bones))
         i = 0
         for bone in bones:
             # Bone name
-            write_string(binary_file, bone['name'])
-        
+            writer.write_string(bone['name'])
+
             # Parent bone index
             if i > 0:
-                parent_index = bones_name_to_index.get(bone.get('parent'), 0)
-                write_varint(binary_file, parent_index)
-                
+                parent_index = self.bones_name_to_index.get(bone.get('parent'), 0)
+                writer.write_varint(parent_index)
+
             # Bone properties
-            write_float(binary_file, bone.get('rotation', 0.0))
-            write_float(binary_file, bone.get('x', 0.0))
-            write_float(binary_file, bone.get('y', 0.0))
-            write_float(binary_file, bone.get('scaleX', 1.0))
-            write_float(binary_file, bone.get('scaleY', 1.0))
-            write_float(binary_file, bone.get('shearX', 0.0))
-            write_float(binary_file, bone.get('shearY', 0.0))
-            write_float(binary_file, bone.get('length', 0.0))
-            write_varint(binary_file, transform_mode.get(bone.get('transform', 'normal').lower(), 0))
-            write_bool(binary_file, bone.get('skin', False))
+            writer.write_float(bone.get('rotation', 0.0))
+            writer.write_float(bone.get('x', 0.0))
+            writer.write_float(bone.get('y', 0.0))
+            writer.write_float(bone.get('scaleX', 1.0))
+            writer.write_float(bone.get('scaleY', 1.0))
+            writer.write_float(bone.get('shearX', 0.0))
+            writer.write_float(bone.get('shearY', 0.0))
+            writer.write_float(bone.get('length', 0.0))
+            writer.write_varint(transform_mode.get(bone.get('transform', 'normal').lower(), 0))
+            writer.write_bool(bone.get('skin', False))
 
             i+=1
-            
+
 
         # Slots
-        write_varint(binary_file, len(slots))
+        writer.write_varint(len(slots))
         for slot in slots:
             # Slot name
-            write_string(binary_file, slot['name'])
-        
+            writer.write_string(slot['name'])
+
             # Bone index the slot is attached to
-            bone_index = bones_name_to_index.get(slot['bone'], -1)
-            write_varint(binary_file, bone_index)
-        
+            bone_index = self.bones_name_to_index.get(slot['bone'], -1)
+            writer.write_varint(bone_index)
+
             # Slot colors
-            write_rgba(binary_file, slot.get('color'))
-            write_rgba(binary_file, slot.get('dark'))
-        
+            writer.write_rgba(slot.get('color'))
+            writer.write_rgba(slot.get('dark'))
+
             # Attachment name as a reference (index from the strings dict)
-            write_string_ref(binary_file, slot.get('attachment'))
-        
+            self.write_string_ref(writer, slot.get('attachment'))
+
             # Blend mode
-            write_varint(binary_file, blend_mode.get(slot.get('blend', 'normal').lower(), 0))
-            
+            writer.write_varint(blend_mode.get(slot.get('blend', 'normal').lower(), 0))
+
 
         # IK constraints
-        write_varint(binary_file, len(iks))
+        writer.write_varint(len(iks))
         for ik in iks:
-            write_string(binary_file, ik.get('name'))
-            write_varint(binary_file, ik.get('order', 0))
-            write_bool(binary_file, ik.get('skin', False))
-        
+            writer.write_string(ik.get('name'))
+            writer.write_varint(ik.get('order', 0))
+            writer.write_bool(ik.get('skin', False))
+
             ik_bones = ik.get('bones', [])
-            write_varint(binary_file, len(ik_bones))
+            writer.write_varint(len(ik_bones))
             for ik_bone in ik_bones:
-                bone_index = bones_name_to_index.get(ik_bone)
-                write_varint(binary_file, bone_index)
-               
-            target_index = bones_name_to_index.get(ik.get('target'))
-            write_varint(binary_file, target_index)
-            
-            write_float(binary_file, ik.get('mix', 1.0))
-            write_float(binary_file, ik.get('softness', 0.0))
-            write_sbyte(binary_file, 1 if ik.get('bendPositive', True) else -1)
-            write_bool(binary_file, ik.get('compress', False))
-            write_bool(binary_file, ik.get('stretch', False))
-            write_bool(binary_file, ik.get('uniform', False))
-            
+                bone_index = self.bones_name_to_index.get(ik_bone)
+                writer.write_varint(bone_index)
+
+            target_index = self.bones_name_to_index.get(ik.get('target'))
+            writer.write_varint(target_index)
+
+            writer.write_float(ik.get('mix', 1.0))
+            writer.write_float(ik.get('softness', 0.0))
+            writer.write_sbyte(1 if ik.get('bendPositive', True) else -1)
+            writer.write_bool(ik.get('compress', False))
+            writer.write_bool(ik.get('stretch', False))
+            writer.write_bool(ik.get('uniform', False))
+
 
         # Transform constraints
-        write_varint(binary_file, len(transforms))
+        writer.write_varint(len(transforms))
         for transform in transforms:
-            write_string(binary_file, transform.get('name'))
-            write_varint(binary_file, transform.get('order', 0))
-            write_bool(binary_file, transform.get('skin', False))
-        
+            writer.write_string(transform.get('name'))
+            writer.write_varint(transform.get('order', 0))
+            writer.write_bool(transform.get('skin', False))
+
             transform_bones = transform.get('bones', [])
-            write_varint(binary_file, len(transform_bones))
+            writer.write_varint(len(transform_bones))
             for transform_bone in transform_bones:
-                bone_index = bones_name_to_index.get(transform_bone)
-                write_varint(binary_file, bone_index)
-               
-            target_index = bones_name_to_index.get(transform.get('target'))
-            write_varint(binary_file, target_index)
-            
-            write_bool(binary_file, transform.get('local', False))
-            write_bool(binary_file, transform.get('relative', False))
-            
-            write_float(binary_file, transform.get('rotation', 0.0))
-            write_float(binary_file, transform.get('x', 0.0))
-            write_float(binary_file, transform.get('y', 0.0))
-            write_float(binary_file, transform.get('scaleX', 0.0))
-            write_float(binary_file, transform.get('scaleY', 0.0))
-            write_float(binary_file, transform.get('shearY', 0.0))
-            
-            write_float(binary_file, transform.get('mixRotate', 1.0))
-            write_float(binary_file, transform.get('mixX', 1.0))
-            write_float(binary_file, transform.get('mixY', transform.get('mixX', 1.0)))
-            write_float(binary_file, transform.get('mixScaleX', 1.0))
-            write_float(binary_file, transform.get('mixScaleY', transform.get('mixScaleX', 1.0)))
-            write_float(binary_file, transform.get('mixShearY', 1.0))
+                bone_index = self.bones_name_to_index.get(transform_bone)
+                writer.write_varint(bone_index)
+
+            target_index = self.bones_name_to_index.get(transform.get('target'))
+            writer.write_varint(target_index)
+
+            writer.write_bool(transform.get('local', False))
+            writer.write_bool(transform.get('relative', False))
+
+            writer.write_float(transform.get('rotation', 0.0))
+            writer.write_float(transform.get('x', 0.0))
+            writer.write_float(transform.get('y', 0.0))
+            writer.write_float(transform.get('scaleX', 0.0))
+            writer.write_float(transform.get('scaleY', 0.0))
+            writer.write_float(transform.get('shearY', 0.0))
+
+            writer.write_float(transform.get('mixRotate', 1.0))
+            writer.write_float(transform.get('mixX', 1.0))
+            writer.write_float(transform.get('mixY', transform.get('mixX', 1.0)))
+            writer.write_float(transform.get('mixScaleX', 1.0))
+            writer.write_float(transform.get('mixScaleY', transform.get('mixScaleX', 1.0)))
+            writer.write_float(transform.get('mixShearY', 1.0))
 
 
         # Path constraints
-        write_varint(binary_file, len(paths))
+        writer.write_varint(len(paths))
         for path in paths:
-            write_string(binary_file, path.get('name'))
-            write_varint(binary_file, path.get('order', 0))
-            write_bool(binary_file, path.get('skin', False))
-        
+            writer.write_string(path.get('name'))
+            writer.write_varint(path.get('order', 0))
+            writer.write_bool(path.get('skin', False))
+
             path_bones = path.get('bones', [])
-            write_varint(binary_file, len(path_bones))
+            writer.write_varint(len(path_bones))
             for path_bone in path_bones:
-                bone_index = bones_name_to_index.get(path_bone)
-                write_varint(binary_file, bone_index)
-               
-            target_index = slots_name_to_index.get(path.get('target'))
-            write_varint(binary_file, target_index)
-            
-            write_varint(binary_file, position_mode.get(path.get('positionMode', 'percent').lower(), 1))
-            write_varint(binary_file, spacing_mode.get(path.get('spacingMode', 'length').lower(), 0))
-            write_varint(binary_file, rotate_mode.get(path.get('rotateMode', 'tangent').lower(), 0))
-            
-            write_float(binary_file, path.get('rotation', 0.0))
-            write_float(binary_file, path.get('position', 0.0))
-            write_float(binary_file, path.get('spacing', 0.0))
-            
-            write_float(binary_file, path.get('mixRotate', 1.0))
-            write_float(binary_file, path.get('mixX', 1.0))
-            write_float(binary_file, path.get('mixY', path.get('mixX', 1.0)))
-            
+                bone_index = self.bones_name_to_index.get(path_bone)
+                writer.write_varint(bone_index)
+
+            target_index = self.slots_name_to_index.get(path.get('target'))
+            writer.write_varint(target_index)
+
+            writer.write_varint(position_mode.get(path.get('positionMode', 'percent').lower(), 1))
+            writer.write_varint(spacing_mode.get(path.get('spacingMode', 'length').lower(), 0))
+            writer.write_varint(rotate_mode.get(path.get('rotateMode', 'tangent').lower(), 0))
+
+            writer.write_float(path.get('rotation', 0.0))
+            writer.write_float(path.get('position', 0.0))
+            writer.write_float(path.get('spacing', 0.0))
+
+            writer.write_float(path.get('mixRotate', 1.0))
+            writer.write_float(path.get('mixX', 1.0))
+            writer.write_float(path.get('mixY', path.get('mixX', 1.0)))
+
         # Skins
         if default_skin == None:
-            write_varint(binary_file, 0)
+            writer.write_varint(0)
         else:
             skin_attachments = default_skin.get('attachments', {})
-            write_varint(binary_file, len(skin_attachments))
+            writer.write_varint(len(skin_attachments))
             for key, entry in skin_attachments.items():
-                write_varint(binary_file, slots_name_to_index.get(key))
-                write_varint(binary_file, len(entry))   
+                writer.write_varint(self.slots_name_to_index.get(key))
+                writer.write_varint(len(entry))   
                 for name, attachment in entry.items():
-                    write_string_ref(binary_file, name)
-                    write_attachment(binary_file, attachment, name)
-                    
+                    self.write_string_ref(writer, name)
+                    self.write_attachment(writer, attachment, name)
+
         # Other skins
-        write_varint(binary_file, len(other_skins))
+        writer.write_varint(len(other_skins))
         for skin in other_skins:
-            write_string_ref(binary_file, skin.get('name'))
+            self.write_string_ref(writer, skin.get('name'))
 
             skin_bones = skin.get('bones') or []
-            write_varint(binary_file, len(skin_bones))
+            writer.write_varint(len(skin_bones))
             for bone_name in skin_bones:
-                write_varint(binary_file, bones_name_to_index.get(bone_name, 0))
+                writer.write_varint(self.bones_name_to_index.get(bone_name, 0))
 
             skin_ik = skin.get('ik') or []
-            write_varint(binary_file, len(skin_ik))
+            writer.write_varint(len(skin_ik))
             for constraint_name in skin_ik:
-                write_varint(binary_file, iks_name_to_index.get(constraint_name, 0))
+                writer.write_varint(self.iks_name_to_index.get(constraint_name, 0))
 
             skin_transform = skin.get('transform') or []
-            write_varint(binary_file, len(skin_transform))
+            writer.write_varint(len(skin_transform))
             for constraint_name in skin_transform:
-                write_varint(binary_file, transforms_name_to_index.get(constraint_name, 0))
+                writer.write_varint(self.transforms_name_to_index.get(constraint_name, 0))
 
             skin_path = skin.get('path') or []
-            write_varint(binary_file, len(skin_path))
+            writer.write_varint(len(skin_path))
             for constraint_name in skin_path:
-                write_varint(binary_file, paths_name_to_index.get(constraint_name, 0))
+                writer.write_varint(self.paths_name_to_index.get(constraint_name, 0))
 
             skin_attachments = skin.get('attachments', {})
-            write_varint(binary_file, len(skin_attachments))
+            writer.write_varint(len(skin_attachments))
             for key, entry in skin_attachments.items():
-                write_varint(binary_file, slots_name_to_index.get(key, 0))
-                write_varint(binary_file, len(entry))
+                writer.write_varint(self.slots_name_to_index.get(key, 0))
+                writer.write_varint(len(entry))
                 for name, attachment in entry.items():
-                    write_string_ref(binary_file, name)
-                    write_attachment(binary_file, attachment, name)
-        
+                    self.write_string_ref(writer, name)
+                    self.write_attachment(writer, attachment, name)
+
         # Events
         # o = skeletonData.events.Resize(n = input.ReadInt(true)).Items;
         # for (int i = 0; i < n; i++) {
@@ -355,14 +520,577 @@ def write_skeleton_data_to_binary(skeleton_data, output_file):
         #     o[i] = data;
         # }
         # No events, at least with BD2
-        write_varint(binary_file, 0)
-        
-        # Animations
-        # This took a while to reverse
-        write_varint(binary_file, len(animations))
-        for name, animation in animations.items():
-            write_string(binary_file, name)
-            write_animation(binary_file, name, animation)
+        writer.write_varint(0)
+
+    def encode_animations(self, items):
+        """Encode (name, animation) pairs in order and return the bytes."""
+        writer = SkelWriter()
+        for name, animation in items:
+            writer.write_string(name)
+            self.write_animation(writer, name, animation)
+        return writer.getvalue()
+
+    def encode_animations_parallel(self, items):
+        """
+        Same output as encode_animations(), split across workers when the
+        skeleton has enough animations and a parallel backend is available.
+        """
+        workers = min(self.max_workers, len(items))
+        if workers < 2 or len(items) < PARALLEL_MIN_ANIMATIONS or not self._can_encode_in_parallel():
+            return self.encode_animations(items)
+
+        # A few ranges per worker evens out animations of different lengths
+        range_count = min(len(items), workers * 4)
+        bounds = [len(items) * i // range_count for i in range(range_count + 1)]
+        ranges = list(zip(bounds[:-1], bounds[1:]))
+
+        if _FREE_THREADED:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                return b"".join(pool.map(lambda r: self.encode_animations(items[r[0]:r[1]]), ranges))
+
+        global _fork_state
+        with _fork_lock:
+            _fork_state = (self, items)
+            try:
+                with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+                    return b"".join(pool.map(_encode_forked_range, *zip(*ranges)))
+            finally:
+                _fork_state = None
+
+    def write_animation(self, writer, name, animation):
+        timeline_count = count_animation_timelines(animation)
+        writer.write_varint(timeline_count)
+
+        # Slots timelines
+        slots = animation.get('slots', {})
+        writer.write_varint(len(slots))
+        for name, slot in slots.items():
+            slot_index = self.slots_name_to_index.get(name)
+            writer.write_varint(slot_index)
+            writer.write_varint(len(slot))
+            for ttype, frames in slot.items():
+                timeline_type = timeline_slot_type.get(ttype.lower(), -1)
+                writer.write_varint(timeline_type)
+                frames_count = len(frames)
+                writer.write_varint(frames_count)
+
+                if frames_count == 0:
+                    continue
+
+                # attachment
+                if timeline_type == 0:
+                    for frame in frames:
+                        writer.write_float(frame.get('time', 0.0))
+                        self.write_string_ref(writer, frame.get('name'))
+                # rgba
+                elif timeline_type == 1:
+                    bezier = int(sum(len(f.get('curve')) for f in frames if f.get('curve') and not isinstance(f.get('curve'), str)) / 4)
+                    writer.write_varint(bezier)
+                    for index in range(len(frames)):
+                        frame = frames[index]
+                        writer.write_float(frame.get('time', 0.0))
+                        writer.write_rgba(frame.get('color'))
+                        if index == 0:
+                            continue
+                        previous_frame = frames[index - 1]
+                        curve = previous_frame.get('curve', 'linear')
+                        writer.write_curve(curve)
+                # rgb
+                elif timeline_type == 2:
+                    bezier = int(sum(len(f.get('curve')) for f in frames if f.get('curve') and not isinstance(f.get('curve'), str)) / 4)
+                    writer.write_varint(bezier)
+                    for index in range(len(frames)):
+                        frame = frames[index]
+                        writer.write_float(frame.get('time', 0.0))
+                        writer.write_rgb(frame.get('color'))
+                        if index == 0:
+                            continue
+                        previous_frame = frames[index - 1]
+                        curve = previous_frame.get('curve', 'linear')
+                        writer.write_curve(curve)
+                # rgba2
+                elif timeline_type == 3:
+                    bezier = int(sum(len(f.get('curve')) for f in frames if f.get('curve') and not isinstance(f.get('curve'), str)) / 4)
+                    writer.write_varint(bezier)
+                    for index in range(len(frames)):
+                        frame = frames[index]
+                        writer.write_float(frame.get('time', 0.0))
+                        writer.write_rgba(frame.get('light'))
+                        writer.write_rgb(frame.get('dark'))
+                        if index == 0:
+                            continue
+                        previous_frame = frames[index - 1]
+                        curve = previous_frame.get('curve', 'linear')
+                        writer.write_curve(curve)
+
+                # rgb2 (RGB + RGB)
+                elif timeline_type == 4:
+                    bezier = int(sum(len(f.get('curve')) for f in frames if f.get('curve') and not isinstance(f.get('curve'), str)) / 4)
+                    writer.write_varint(bezier)
+                    for index in range(len(frames)):
+                        frame = frames[index]
+                        writer.write_float(frame.get('time', 0.0))
+                        writer.write_rgb(frame.get('light'))
+                        writer.write_rgb(frame.get('dark'))
+                        if index == 0:
+                            continue
+                        previous_frame = frames[index - 1]
+                        curve = previous_frame.get('curve', 'linear')
+                        writer.write_curve(curve)
+
+                # alpha (binary stores values as 1 byte 0..255)
+                elif timeline_type == 5:
+                    bezier = int(sum(len(f.get('curve')) for f in frames if f.get('curve') and not isinstance(f.get('curve'), str)) / 4)
+                    writer.write_varint(bezier)
+                    for index in range(len(frames)):
+                        frame = frames[index]
+                        writer.write_float(frame.get('time', 0.0))
+                        val = frame.get('value', 0.0)
+                        try:
+                            b = int(max(0.0, min(1.0, float(val))) * 255 + 0.5)
+                        except Exception:
+                            b = 0
+                        writer.write_byte(b)
+                        if index == 0:
+                            continue
+                        previous_frame = frames[index - 1]
+                        curve = previous_frame.get('curve', 'linear')
+                        writer.write_curve(curve)
+
+        # Bones timelines
+        bones = animation.get('bones', {})
+        writer.write_varint(len(bones))
+        for name, bone in bones.items():
+            bone_index = self.bones_name_to_index.get(name)
+            writer.write_varint(bone_index)
+            writer.write_varint(len(bone))
+            for ttype, frames in bone.items():
+                timeline_type = timeline_bone_type.get(ttype.lower(), -1)
+                writer.write_varint(timeline_type)
+                frames_count = len(frames)
+                writer.write_varint(frames_count)
+
+                bezier = int(sum(len(f.get('curve')) for f in frames if f.get('curve') and not isinstance(f.get('curve'), str)) / 4)
+                writer.write_varint(bezier)
+                if frames_count == 0:
+                    continue          
+
+                # default for scale, scaleX and scaleY is 1.0
+                default_value = 1.0 if timeline_type in [4, 5, 6] else 0.0
+                # translate, scale or shear will use both "x" and "y"
+                two_values = timeline_type in [1, 4, 7]
+
+                for index in range(len(frames)):
+                    frame = frames[index]
+                    if two_values:
+                        writer.write_floats((frame.get('time', 0.0), frame.get('x', default_value), frame.get('y', default_value)))
+                    # rest uses "value"
+                    else:
+                        writer.write_floats((frame.get('time', 0.0), frame.get('value', default_value)))
+
+                    # first frame, no curve
+                    if index == 0:
+                        continue
+
+                    previous_frame = frames[index - 1]
+                    curve = previous_frame.get('curve', 'linear')
+                    writer.write_curve(curve)
+
+        # IK constraint timelines
+        iks = animation.get('ik', {})
+        writer.write_varint(len(iks))
+        for name, ik in iks.items():
+            ik_index = self.iks_name_to_index.get(name)
+            writer.write_varint(ik_index)
+            frames_count = len(ik)
+            writer.write_varint(frames_count)
+
+            bezier = int(sum(len(f.get('curve')) for f in ik if f.get('curve') and not isinstance(f.get('curve'), str)) / 4)
+            writer.write_varint(bezier)
+
+            writer.write_float(ik[0].get('time', 0.0))
+            writer.write_float(ik[0].get('mix', 1.0))
+            writer.write_float(ik[0].get('softness', 0.0))
+            for index in range(frames_count):
+                frame = ik[index]
+                writer.write_sbyte(1 if frame.get('bendPositive', True) else -1)
+                writer.write_bool(frame.get('compress', False))
+                writer.write_bool(frame.get('stretch', False))
+
+                if index == frames_count - 1:
+                    break
+
+                next_frame = ik[index + 1]
+                writer.write_float(next_frame.get('time', 0.0))
+                writer.write_float(next_frame.get('mix', 1.0))
+                writer.write_float(next_frame.get('softness', 0.0))
+
+                curve = frame.get('curve', 'linear')
+                writer.write_curve(curve)
+
+        # Transform constraint timelines
+        transforms = animation.get('transform', {})
+        writer.write_varint(len(transforms))
+        for name, transform in transforms.items():
+            transform_index = self.transforms_name_to_index.get(name)
+            writer.write_varint(transform_index)
+            frames_count = len(transform)
+            writer.write_varint(frames_count)
+
+            bezier = int(sum(len(f.get('curve')) for f in transform if f.get('curve') and not isinstance(f.get('curve'), str)) / 4)
+            writer.write_varint(bezier)
+
+            writer.write_float(transform[0].get('time', 0.0))
+            writer.write_float(transform[0].get('mixRotate', 1.0))
+            writer.write_float(transform[0].get('mixX', 1.0))
+            writer.write_float(transform[0].get('mixY', transform[0].get('mixX', 1.0)))
+            writer.write_float(transform[0].get('mixScaleX', 1.0))
+            writer.write_float(transform[0].get('mixScaleY', transform[0].get('mixScaleX', 1.0)))
+            writer.write_float(transform[0].get('mixShearY', 1.0))
+
+            for index in range(frames_count):
+                frame = transform[index]
+
+                if index == frames_count - 1:
+                    break
+
+                next_frame = transform[index + 1]
+                writer.write_float(next_frame.get('time', 0.0))
+                writer.write_float(next_frame.get('mixRotate', 1.0))
+                writer.write_float(next_frame.get('mixX', 1.0))
+                writer.write_float(next_frame.get('mixY', next_frame.get('mixX', 1.0)))
+                writer.write_float(next_frame.get('mixScaleX', 1.0))
+                writer.write_float(next_frame.get('mixScaleY', next_frame.get('mixScaleX', 1.0)))
+                writer.write_float(next_frame.get('mixShearY', 1.0))
+
+                curve = frame.get('curve', 'linear')
+                writer.write_curve(curve)
+
+        # Path constraint timelines
+        paths = animation.get('path', {})
+        writer.write_varint(len(paths))
+        for name, path in paths.items():
+            path_index = self.paths_name_to_index.get(name)
+            writer.write_varint(path_index)
+            writer.write_varint(len(path))
+            for ttype, frames in path.items():
+                timeline_type = timeline_path_type.get(ttype.lower(), -1)
+                writer.write_varint(timeline_type)
+                frames_count = len(frames)
+                writer.write_varint(frames_count)
+
+                bezier = int(sum(len(f.get('curve')) for f in frames if f.get('curve') and not isinstance(f.get('curve'), str)) / 4)
+                writer.write_varint(bezier)
+
+                for index in range(len(frames)):
+                    frame = frames[index]
+
+                    # Position or Spacing
+                    if timeline_type == 0 or timeline_type == 1:
+                        writer.write_float(frame.get('time', 0.0))
+                        writer.write_float(frame.get('value', 0.0))
+
+                    # Mix
+                    elif timeline_type == 2:
+                        writer.write_float(frame.get('time', 0.0))
+                        writer.write_float(frame.get('mixRotate', 1.0))
+                        writer.write_float(frame.get('mixX', 1.0))
+                        writer.write_float(frame.get('mixY', frame.get('mixX', 1.0)))
+
+                    # first frame, no curve
+                    if index == 0:
+                        continue
+
+                    previous_frame = frames[index - 1]
+                    curve = previous_frame.get('curve', 'linear')
+                    writer.write_curve(curve)
+
+        # Attachment timelines
+        attachments = animation.get('attachments', {})
+        writer.write_varint(len(attachments))
+        for skin_name, skin in attachments.items():
+            skin_index = self.skins_name_to_index.get(skin_name, 0)
+            writer.write_varint(skin_index)
+            writer.write_varint(len(skin))
+            for slot_name, slot in skin.items():
+                slot_index = self.slots_name_to_index.get(slot_name)
+                writer.write_varint(slot_index)
+                writer.write_varint(len(slot))
+                for name, attachment in slot.items():
+                    for ttype, frames in attachment.items():
+                        self.write_string_ref(writer, name)
+                        timeline_type = timeline_attachment_type.get(ttype.lower(), -1)
+                        writer.write_varint(timeline_type)
+                        frames_count = len(frames)
+                        writer.write_varint(frames_count)
+
+                        # Deform
+                        if timeline_type == 0:
+                            bezier = int(sum(len(f.get('curve')) for f in frames if f.get('curve') and not isinstance(f.get('curve'), str)) / 4)
+                            writer.write_varint(bezier)
+
+                            writer.write_float(frames[0].get('time', 0.0))
+                            for index in range(len(frames)):
+                                frame = frames[index]
+                                vertices = frame.get('vertices', [])
+                                end = len(vertices)
+
+                                writer.write_varint(end)
+
+                                if end != 0:
+                                    start = frame.get('offset', 0)
+                                    writer.write_varint(start)
+                                    writer.write_floats(vertices)
+
+                                if index == frames_count - 1:
+                                    break
+
+                                writer.write_float(frames[index + 1].get('time', 0.0))
+
+                                curve = frame.get('curve', 'linear')
+                                writer.write_curve(curve)
+
+        # Draw order timelines
+        draw_order = animation.get('drawOrder', {})
+        writer.write_varint(len(draw_order))
+        for draw in draw_order:
+            writer.write_float(draw.get('time', 0.0))
+            offsets = draw.get('offsets', [])
+            writer.write_varint(len(offsets))
+
+            for offset in offsets:
+                slot_index = self.slots_name_to_index.get(offset.get('slot'))
+                writer.write_varint(slot_index)
+                writer.write_varint(int(offset.get('offset')))
+
+        # Event timelines
+        draw_order = animation.get('events', {})
+        writer.write_varint(len(draw_order))
+
+    def write_attachment(self, writer, attachment, name):
+        self.write_string_ref(writer, attachment.get('name'))
+        attach_type = attachment_type.get(attachment.get('type', 'region').lower())
+        writer.write_byte(attach_type)
+
+        # Region
+        if attach_type == 0:
+            self.write_string_ref(writer, attachment.get('path'))
+            writer.write_float(attachment.get('rotation', 0.0))
+            writer.write_float(attachment.get('x', 0.0))
+            writer.write_float(attachment.get('y', 0.0))
+            writer.write_float(attachment.get('scaleX', 1.0))
+            writer.write_float(attachment.get('scaleY', 1.0))
+            writer.write_float(attachment.get('width', 32.0))
+            writer.write_float(attachment.get('height', 32.0))
+            writer.write_rgba(attachment.get('color'))
+            writer.write_sequence(attachment.get('sequence'))
+
+        # Boundingbox
+        elif attach_type == 1:
+            vertex_count = attachment.get('vertexCount', 0)
+            writer.write_varint(vertex_count)
+            writer.write_vertices(attachment, vertex_count)
+
+        # Mesh
+        elif attach_type == 2:
+            self.write_string_ref(writer, attachment.get('path'))
+            writer.write_rgba(attachment.get('color'))
+
+            uvs = attachment.get('uvs', [])
+            vertex_count = int(len(uvs) / 2)
+            writer.write_varint(vertex_count)
+            writer.write_floats(uvs)
+            triangles = attachment.get('triangles', [])
+            writer.write_short_array(triangles)
+            writer.write_vertices(attachment, vertex_count)
+            writer.write_varint(attachment.get('hull', 0))
+            writer.write_sequence(attachment.get('sequence'))
+
+        # Linkedmesh
+        elif attach_type == 3:
+            self.write_string_ref(writer, attachment.get('path'))
+            writer.write_rgba(attachment.get('color'))
+            self.write_string_ref(writer, attachment.get('skin'))
+            self.write_string_ref(writer, attachment.get('parent'))
+
+            writer.write_bool(attachment.get('timelines', True))
+            writer.write_sequence(attachment.get('sequence'))
+
+        # Path
+        elif attach_type == 4:
+            writer.write_bool(attachment.get('closed', False))
+            writer.write_bool(attachment.get('constantSpeed', True))
+            vertex_count = attachment.get('vertexCount', 0)
+            writer.write_varint(vertex_count)
+            writer.write_vertices(attachment, vertex_count)
+            for length in attachment.get('lengths', []):
+                writer.write_float(length)
+
+        # Point
+        elif attach_type == 5:
+            writer.write_float(attachment.get('rotation', 0.0))
+            writer.write_float(attachment.get('x', 0.0))
+            writer.write_float(attachment.get('y', 0.0))
+
+        # Clipping
+        elif attach_type == 6:
+            writer.write_varint(self.slots_name_to_index.get(attachment.get('end'), 0))
+            vertex_count = attachment.get('vertexCount', 0)
+            writer.write_varint(vertex_count)
+            writer.write_vertices(attachment, vertex_count)
+
+    # Write index to the string dictionary
+    def write_string_ref(self, writer, string):
+        if string is None:
+            writer.write_varint(0)
+        else:
+            index = self.strings_name_to_index.get(string, -1) + 1
+            if index == 0 and self._unresolved_refs is not None:
+                self._unresolved_refs.add(string)
+            writer.write_varint(index)
+
+
+# Main function to convert JSON file to binary
+def json_to_skel(json_file, output_file):
+    """
+    Convert a JSON Spine file to binary .skel format.
+
+    Thread-safe: every call uses its own SkelConverter.
+    """
+    skel_data = SkelConverter().convert_file(json_file)
+    with open(output_file, 'wb') as binary_file:
+        binary_file.write(skel_data)
+
+
+def open_skel_cache(cache_root=None):
+    """
+    Return the shared .skel cache under cache_root (DEFAULT_CACHE_ROOT if None).
+
+    One instance is kept per cache root, so its running byte total is reused
+    instead of rescanning the cache directory for every converted skeleton.
+    """
+    root = os.path.join(cache_root or DEFAULT_CACHE_ROOT, SKEL_CACHE_SUBDIR)
+    with _skel_caches_lock:
+        cache = _skel_caches.get(root)
+        if cache is None:
+            cache = _skel_caches[root] = DiskCache(root, SKEL_CACHE_MAX_BYTES)
+        return cache
+
+
+def skel_cache_key(json_digest):
+    return make_key("skel", json_digest, CONVERTER_VERSION)
+
+
+def convert_json_cached(json_file, cache, max_workers=None):
+    """
+    Convert a Spine JSON file, reusing the cached .skel for identical content.
+
+    cache: DiskCache from open_skel_cache()
+    Returns a tuple: (skel bytes, whether it came from the cache)
+    """
+    key = skel_cache_key(hash_mod_file(json_file))
+    skel_data = cache.get(key)
+    if skel_data is not None:
+        return skel_data, True
+
+    skel_data = SkelConverter(max_workers).convert_file(json_file)
+    cache.put(key, skel_data)
+    return skel_data, False
+
+
+# Function to write skeleton data into binary
+def write_skeleton_data_to_binary(skeleton_data, output_file):
+    writer = SkelWriter()
+    SkelConverter().write_skeleton_data(writer, skeleton_data)
+    with open(output_file, 'wb') as binary_file:
+        binary_file.write(writer.getvalue())
+
+
+def _animation_attachment_names(animation):
+    """Attachment names set by an animation's slot attachment timelines, in order."""
+    for timelines in animation.get('slots', {}).values():
+        for frame in timelines.get('attachment', []):
+            name = frame.get('name')
+            if name:
+                yield name
+
+
+class _JsonStream:
+    """
+    Incremental reader for the outer levels of a JSON document.
+
+    Text is read in chunks; iter_object() walks the keys of an object and
+    read_value() parses one complete value with JSONDecoder.raw_decode, reading
+    more input when the value is cut off at the end of the buffer.
+    """
+
+    CHUNK_SIZE = 1 << 20
+    _WHITESPACE = re.compile(r'[ \t\n\r]*')
+
+    def __init__(self, f):
+        self._file = f
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+        self._decoder = json.JSONDecoder()
+
+    def _fill(self, size):
+        data = self._file.read(size)
+        if not data:
+            self._eof = True
+            return False
+        # Drop the consumed text so the buffer only holds the value being parsed
+        self._buffer = self._buffer[self._pos:] + data
+        self._pos = 0
+        return True
+
+    def _peek(self):
+        """Skip whitespace and return the next character ('' at the end of the input)."""
+        while True:
+            self._pos = self._WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill(self.CHUNK_SIZE):
+                return ''
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise json.JSONDecodeError(f"Expecting '{char}'", self._buffer, self._pos)
+        self._pos += 1
+
+    def read_value(self):
+        self._peek()
+        size = self.CHUNK_SIZE
+        while True:
+            try:
+                value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                # A number that ends the buffer may continue in the next chunk
+                if end < len(self._buffer) or self._eof or type(value) not in (int, float):
+                    self._pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self._eof:
+                    raise
+            # Grow the read size so a large value is re-parsed only a few times
+            self._fill(size)
+            size *= 2
+
+    def iter_object(self):
+        """Yield each key of the object at the current position; the caller must read its value."""
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self._expect(':')
+            yield key
+            if self._peek() == ',':
+                self._pos += 1
+                continue
+            self._expect('}')
+            return
+
 
 def count_animation_timelines(animation):
     count = 0
@@ -415,579 +1143,167 @@ def count_animation_timelines(animation):
 
     return count
 
-def write_animation(binary_file, name, animation):
-    timeline_count = count_animation_timelines(animation)
-    write_varint(binary_file, timeline_count)
 
-    # Slots timelines
-    slots = animation.get('slots', {})
-    write_varint(binary_file, len(slots))
-    for name, slot in slots.items():
-        slot_index = slots_name_to_index.get(name)
-        write_varint(binary_file, slot_index)
-        write_varint(binary_file, len(slot))
-        for ttype, frames in slot.items():
-            timeline_type = timeline_slot_type.get(ttype.lower(), -1)
-            write_varint(binary_file, timeline_type)
-            frames_count = len(frames)
-            write_varint(binary_file, frames_count)
-            
-            if frames_count == 0:
-                continue
-            
-            # attachment
-            if timeline_type == 0:
-                for frame in frames:
-                    write_float(binary_file, frame.get('time', 0.0))
-                    write_string_ref(binary_file, frame.get('name'))
-            # rgba
-            elif timeline_type == 1:
-                bezier = int(sum(len(f.get('curve')) for f in frames if f.get('curve') and not isinstance(f.get('curve'), str)) / 4)
-                write_varint(binary_file, bezier)
-                for index in range(len(frames)):
-                    frame = frames[index]
-                    write_float(binary_file, frame.get('time', 0.0))
-                    write_rgba(binary_file, frame.get('color'))
-                    if index == 0:
-                        continue
-                    previous_frame = frames[index - 1]
-                    curve = previous_frame.get('curve', 'linear')
-                    if isinstance(curve, str):
-                        write_byte(binary_file, timeline_curve_type.get(curve, 0))
-                    else:
-                        write_byte(binary_file, timeline_curve_type.get('bezier'))
-                        for c in curve:
-                            write_float(binary_file, c)
-            # rgb
-            elif timeline_type == 2:
-                bezier = int(sum(len(f.get('curve')) for f in frames if f.get('curve') and not isinstance(f.get('curve'), str)) / 4)
-                write_varint(binary_file, bezier)
-                for index in range(len(frames)):
-                    frame = frames[index]
-                    write_float(binary_file, frame.get('time', 0.0))
-                    write_rgb(binary_file, frame.get('color'))
-                    if index == 0:
-                        continue
-                    previous_frame = frames[index - 1]
-                    curve = previous_frame.get('curve', 'linear')
-                    if isinstance(curve, str):
-                        write_byte(binary_file, timeline_curve_type.get(curve, 0))
-                    else:
-                        write_byte(binary_file, timeline_curve_type.get('bezier'))
-                        for c in curve:
-                            write_float(binary_file, c)
-            # rgba2
-            elif timeline_type == 3:
-                bezier = int(sum(len(f.get('curve')) for f in frames if f.get('curve') and not isinstance(f.get('curve'), str)) / 4)
-                write_varint(binary_file, bezier)
-                for index in range(len(frames)):
-                    frame = frames[index]
-                    write_float(binary_file, frame.get('time', 0.0))
-                    write_rgba(binary_file, frame.get('light'))
-                    write_rgb(binary_file, frame.get('dark'))
-                    if index == 0:
-                        continue
-                    previous_frame = frames[index - 1]
-                    curve = previous_frame.get('curve', 'linear')
-                    if isinstance(curve, str):
-                        write_byte(binary_file, timeline_curve_type.get(curve, 0))
-                    else:
-                        write_byte(binary_file, timeline_curve_type.get('bezier'))
-                        for c in curve:
-                            write_float(binary_file, c)
 
-            # rgb2 (RGB + RGB)
-            elif timeline_type == 4:
-                bezier = int(sum(len(f.get('curve')) for f in frames if f.get('curve') and not isinstance(f.get('curve'), str)) / 4)
-                write_varint(binary_file, bezier)
-                for index in range(len(frames)):
-                    frame = frames[index]
-                    write_float(binary_file, frame.get('time', 0.0))
-                    write_rgb(binary_file, frame.get('light'))
-                    write_rgb(binary_file, frame.get('dark'))
-                    if index == 0:
-                        continue
-                    previous_frame = frames[index - 1]
-                    curve = previous_frame.get('curve', 'linear')
-                    if isinstance(curve, str):
-                        write_byte(binary_file, timeline_curve_type.get(curve, 0))
-                    else:
-                        write_byte(binary_file, timeline_curve_type.get('bezier'))
-                        for c in curve:
-                            write_float(binary_file, c)
 
-            # alpha (binary stores values as 1 byte 0..255)
-            elif timeline_type == 5:
-                bezier = int(sum(len(f.get('curve')) for f in frames if f.get('curve') and not isinstance(f.get('curve'), str)) / 4)
-                write_varint(binary_file, bezier)
-                for index in range(len(frames)):
-                    frame = frames[index]
-                    write_float(binary_file, frame.get('time', 0.0))
-                    val = frame.get('value', 0.0)
-                    try:
-                        b = int(max(0.0, min(1.0, float(val))) * 255 + 0.5)
-                    except Exception:
-                        b = 0
-                    write_byte(binary_file, b)
-                    if index == 0:
-                        continue
-                    previous_frame = frames[index - 1]
-                    curve = previous_frame.get('curve', 'linear')
-                    if isinstance(curve, str):
-                        write_byte(binary_file, timeline_curve_type.get(curve, 0))
-                    else:
-                        write_byte(binary_file, timeline_curve_type.get('bezier'))
-                        for c in curve:
-                            write_float(binary_file, c)
-                            
-    # Bones timelines
-    bones = animation.get('bones', {})
-    write_varint(binary_file, len(bones))
-    for name, bone in bones.items():
-        bone_index = bones_name_to_index.get(name)
-        write_varint(binary_file, bone_index)
-        write_varint(binary_file, len(bone))
-        for ttype, frames in bone.items():
-            timeline_type = timeline_bone_type.get(ttype.lower(), -1)
-            write_varint(binary_file, timeline_type)
-            frames_count = len(frames)
-            write_varint(binary_file, frames_count)
-            
-            bezier = int(sum(len(f.get('curve')) for f in frames if f.get('curve') and not isinstance(f.get('curve'), str)) / 4)
-            write_varint(binary_file, bezier)
-            if frames_count == 0:
-                continue          
-            
-            for index in range(len(frames)):
-                frame = frames[index]
-                write_float(binary_file, frame.get('time', 0.0))
-                
-                # default for scale, scaleX and scaleY is 1.0
-                default_value = 1.0 if timeline_type in [4, 5, 6] else 0.0
-                
-                # translate, scale or shear will use both "x" and "y"
-                if timeline_type in [1, 4, 7]:
-                    write_float(binary_file, frame.get('x', default_value))
-                    write_float(binary_file, frame.get('y', default_value))
-                # rest uses "value"
-                else:
-                    write_float(binary_file, frame.get('value', default_value))
-                
-                # first frame, no curve
-                if index == 0:
-                    continue
-                
-                previous_frame = frames[index - 1]
-                curve = previous_frame.get('curve', 'linear')
-                if isinstance(curve, str):
-                    write_byte(binary_file, timeline_curve_type.get(curve, 0))
-                else:
-                    write_byte(binary_file, timeline_curve_type.get('bezier'))
-                    for c in curve:
-                        write_float(binary_file, c)
-        
-    # IK constraint timelines
-    iks = animation.get('ik', {})
-    write_varint(binary_file, len(iks))
-    for name, ik in iks.items():
-        ik_index = iks_name_to_index.get(name)
-        write_varint(binary_file, ik_index)
-        frames_count = len(ik)
-        write_varint(binary_file, frames_count)
-        
-        bezier = int(sum(len(f.get('curve')) for f in ik if f.get('curve') and not isinstance(f.get('curve'), str)) / 4)
-        write_varint(binary_file, bezier)
-        
-        write_float(binary_file, ik[0].get('time', 0.0))
-        write_float(binary_file, ik[0].get('mix', 1.0))
-        write_float(binary_file, ik[0].get('softness', 0.0))
-        for index in range(frames_count):
-            frame = ik[index]
-            write_sbyte(binary_file, 1 if frame.get('bendPositive', True) else -1)
-            write_bool(binary_file, frame.get('compress', False))
-            write_bool(binary_file, frame.get('stretch', False))
-            
-            if index == frames_count - 1:
-                break
-            
-            next_frame = ik[index + 1]
-            write_float(binary_file, next_frame.get('time', 0.0))
-            write_float(binary_file, next_frame.get('mix', 1.0))
-            write_float(binary_file, next_frame.get('softness', 0.0))
-            
-            curve = frame.get('curve', 'linear')
-            if isinstance(curve, str):
-                write_byte(binary_file, timeline_curve_type.get(curve, 0))
-            else:
-                write_byte(binary_file, timeline_curve_type.get('bezier'))
-                for c in curve:
-                    write_float(binary_file, c)
-                    
-    # Transform constraint timelines
-    transforms = animation.get('transform', {})
-    write_varint(binary_file, len(transforms))
-    for name, transform in transforms.items():
-        transform_index = transforms_name_to_index.get(name)
-        write_varint(binary_file, transform_index)
-        frames_count = len(transform)
-        write_varint(binary_file, frames_count)
-        
-        bezier = int(sum(len(f.get('curve')) for f in transform if f.get('curve') and not isinstance(f.get('curve'), str)) / 4)
-        write_varint(binary_file, bezier)
-        
-        write_float(binary_file, transform[0].get('time', 0.0))
-        write_float(binary_file, transform[0].get('mixRotate', 1.0))
-        write_float(binary_file, transform[0].get('mixX', 1.0))
-        write_float(binary_file, transform[0].get('mixY', transform[0].get('mixX', 1.0)))
-        write_float(binary_file, transform[0].get('mixScaleX', 1.0))
-        write_float(binary_file, transform[0].get('mixScaleY', transform[0].get('mixScaleX', 1.0)))
-        write_float(binary_file, transform[0].get('mixShearY', 1.0))
-        
-        for index in range(frames_count):
-            frame = transform[index]
-            
-            if index == frames_count - 1:
-                break
-            
-            next_frame = transform[index + 1]
-            write_float(binary_file, next_frame.get('time', 0.0))
-            write_float(binary_file, next_frame.get('mixRotate', 1.0))
-            write_float(binary_file, next_frame.get('mixX', 1.0))
-            write_float(binary_file, next_frame.get('mixY', next_frame.get('mixX', 1.0)))
-            write_float(binary_file, next_frame.get('mixScaleX', 1.0))
-            write_float(binary_file, next_frame.get('mixScaleY', next_frame.get('mixScaleX', 1.0)))
-            write_float(binary_file, next_frame.get('mixShearY', 1.0))
-            
-            curve = frame.get('curve', 'linear')
-            if isinstance(curve, str):
-                write_byte(binary_file, timeline_curve_type.get(curve, 0))
-            else:
-                write_byte(binary_file, timeline_curve_type.get('bezier'))
-                for c in curve:
-                    write_float(binary_file, c)
-                    
-    # Path constraint timelines
-    paths = animation.get('path', {})
-    write_varint(binary_file, len(paths))
-    for name, path in paths.items():
-        path_index = paths_name_to_index.get(name)
-        write_varint(binary_file, path_index)
-        write_varint(binary_file, len(path))
-        for ttype, frames in path.items():
-            timeline_type = timeline_path_type.get(ttype.lower(), -1)
-            write_varint(binary_file, timeline_type)
-            frames_count = len(frames)
-            write_varint(binary_file, frames_count)
-            
-            bezier = int(sum(len(f.get('curve')) for f in frames if f.get('curve') and not isinstance(f.get('curve'), str)) / 4)
-            write_varint(binary_file, bezier)
-            
-            for index in range(len(frames)):
-                frame = frames[index]
-                
-                # Position or Spacing
-                if timeline_type == 0 or timeline_type == 1:
-                    write_float(binary_file, frame.get('time', 0.0))
-                    write_float(binary_file, frame.get('value', 0.0))
-                    
-                # Mix
-                elif timeline_type == 2:
-                    write_float(binary_file, frame.get('time', 0.0))
-                    write_float(binary_file, frame.get('mixRotate', 1.0))
-                    write_float(binary_file, frame.get('mixX', 1.0))
-                    write_float(binary_file, frame.get('mixY', frame.get('mixX', 1.0)))
-                    
-                # first frame, no curve
-                if index == 0:
-                    continue
-                
-                previous_frame = frames[index - 1]
-                curve = previous_frame.get('curve', 'linear')
-                if isinstance(curve, str):
-                    write_byte(binary_file, timeline_curve_type.get(curve, 0))
-                else:
-                    write_byte(binary_file, timeline_curve_type.get('bezier'))
-                    for c in curve:
-                        write_float(binary_file, c)
-    
-    # Attachment timelines
-    attachments = animation.get('attachments', {})
-    write_varint(binary_file, len(attachments))
-    for skin_name, skin in attachments.items():
-        skin_index = skins_name_to_index.get(skin_name, 0)
-        write_varint(binary_file, skin_index)
-        write_varint(binary_file, len(skin))
-        for slot_name, slot in skin.items():
-            slot_index = slots_name_to_index.get(slot_name)
-            write_varint(binary_file, slot_index)
-            write_varint(binary_file, len(slot))
-            for name, attachment in slot.items():
-                for ttype, frames in attachment.items():
-                    write_string_ref(binary_file, name)
-                    timeline_type = timeline_attachment_type.get(ttype.lower(), -1)
-                    write_varint(binary_file, timeline_type)
-                    frames_count = len(frames)
-                    write_varint(binary_file, frames_count)
-                    
-                    # Deform
-                    if timeline_type == 0:
-                        bezier = int(sum(len(f.get('curve')) for f in frames if f.get('curve') and not isinstance(f.get('curve'), str)) / 4)
-                        write_varint(binary_file, bezier)
-            
-                        write_float(binary_file, frames[0].get('time', 0.0))
-                        for index in range(len(frames)):
-                            frame = frames[index]
-                            vertices = frame.get('vertices', [])
-                            end = len(vertices)
-                            
-                            write_varint(binary_file, end)
-                            
-                            if end != 0:
-                                start = frame.get('offset', 0)
-                                write_varint(binary_file, start)
-                                for vertex in vertices:
-                                    write_float(binary_file, vertex)
-                                    
-                            if index == frames_count - 1:
-                                break
-                            
-                            write_float(binary_file, frames[index + 1].get('time', 0.0))
-                
-                            curve = frame.get('curve', 'linear')
-                            if isinstance(curve, str):
-                                write_byte(binary_file, timeline_curve_type.get(curve, 0))
-                            else:
-                                write_byte(binary_file, timeline_curve_type.get('bezier'))
-                                for c in curve:
-                                    write_float(binary_file, c)
-                                    
-    # Draw order timelines
-    draw_order = animation.get('drawOrder', {})
-    write_varint(binary_file, len(draw_order))
-    for draw in draw_order:
-        write_float(binary_file, draw.get('time', 0.0))
-        offsets = draw.get('offsets', [])
-        write_varint(binary_file, len(offsets))
-        
-        for offset in offsets:
-            slot_index = slots_name_to_index.get(offset.get('slot'))
-            write_varint(binary_file, slot_index)
-            write_varint(binary_file, int(offset.get('offset')))
-            
-    # Event timelines
-    draw_order = animation.get('events', {})
-    write_varint(binary_file, len(draw_order))
-
-
-
-
-def write_attachment(binary_file, attachment, name):
-    write_string_ref(binary_file, attachment.get('name'))
-    attach_type = attachment_type.get(attachment.get('type', 'region').lower())
-    write_byte(binary_file, attach_type)
-    
-    # Region
-    if attach_type == 0:
-        write_string_ref(binary_file, attachment.get('path'))
-        write_float(binary_file, attachment.get('rotation', 0.0))
-        write_float(binary_file, attachment.get('x', 0.0))
-        write_float(binary_file, attachment.get('y', 0.0))
-        write_float(binary_file, attachment.get('scaleX', 1.0))
-        write_float(binary_file, attachment.get('scaleY', 1.0))
-        write_float(binary_file, attachment.get('width', 32.0))
-        write_float(binary_file, attachment.get('height', 32.0))
-        write_rgba(binary_file, attachment.get('color'))
-        write_sequence(binary_file, attachment.get('sequence'))
-
-    # Boundingbox
-    elif attach_type == 1:
-        vertex_count = attachment.get('vertexCount', 0)
-        write_varint(binary_file, vertex_count)
-        write_vertices(binary_file, attachment, vertex_count)
-    
-    # Mesh
-    elif attach_type == 2:
-        write_string_ref(binary_file, attachment.get('path'))
-        write_rgba(binary_file, attachment.get('color'))
-        
-        uvs = attachment.get('uvs', [])
-        vertex_count = int(len(uvs) / 2)
-        write_varint(binary_file, vertex_count)
-        for uv in uvs:
-            write_float(binary_file, uv)
-        triangles = attachment.get('triangles', [])
-        write_short_array(binary_file, triangles)
-        write_vertices(binary_file, attachment, vertex_count)
-        write_varint(binary_file, attachment.get('hull', 0))
-        write_sequence(binary_file, attachment.get('sequence'))
-        
-    # Linkedmesh
-    elif attach_type == 3:
-        write_string_ref(binary_file, attachment.get('path'))
-        write_rgba(binary_file, attachment.get('color'))
-        write_string_ref(binary_file, attachment.get('skin'))
-        write_string_ref(binary_file, attachment.get('parent'))
-            
-        write_bool(binary_file, attachment.get('timelines', True))
-        write_sequence(binary_file, attachment.get('sequence'))
-    
-    # Path
-    elif attach_type == 4:
-        write_bool(binary_file, attachment.get('closed', False))
-        write_bool(binary_file, attachment.get('constantSpeed', True))
-        vertex_count = attachment.get('vertexCount', 0)
-        write_varint(binary_file, vertex_count)
-        write_vertices(binary_file, attachment, vertex_count)
-        for length in attachment.get('lengths', []):
-            write_float(binary_file, length)
-
-    # Point
-    elif attach_type == 5:
-        write_float(binary_file, attachment.get('rotation', 0.0))
-        write_float(binary_file, attachment.get('x', 0.0))
-        write_float(binary_file, attachment.get('y', 0.0))
-        
-    # Clipping
-    elif attach_type == 6:
-        write_varint(binary_file, slots_name_to_index.get(attachment.get('end'), 0))
-        vertex_count = attachment.get('vertexCount', 0)
-        write_varint(binary_file, vertex_count)
-        write_vertices(binary_file, attachment, vertex_count)
-
-
-
-
-def write_sequence(binary_file, sequence):
-    if sequence == None:
-        write_bool(binary_file, False)
-        return
-    
-    write_bool(binary_file, True)
-    write_varint(binary_file, sequence.get('count'))
-    write_varint(binary_file, sequence.get('start', 1))
-    write_varint(binary_file, sequence.get('digits', 0))
-    write_varint(binary_file, sequence.get('setup', 0))
-    
-
-def write_vertices(binary_file, attachment, vertex_count):
-    vertex_length = vertex_count * 2
-    vertices = attachment.get('vertices', [])
-    if (len(vertices) == vertex_length):
-        write_bool(binary_file, False)
-        for vertex in vertices:
-            write_float(binary_file, vertex)
-    else:
-        write_bool(binary_file, True)
-        i = 0
-        l = len(vertices)
-        while i < l:
-            bone_count = int(vertices[i])
-            i += 1
-            write_varint(binary_file, bone_count)
-            ll = i + bone_count * 4
-            while i < ll:
-                write_varint(binary_file, int(vertices[i]))
-                i += 1
-                write_float(binary_file, vertices[i])
-                i += 1
-                write_float(binary_file, vertices[i])
-                i += 1
-                write_float(binary_file, vertices[i])
-                i += 1
+
+# Precompiled big-endian packers for the binary writer
+_SBYTE = struct.Struct('>b')
+_INT = struct.Struct('>i')
+_LONG = struct.Struct('>q')
+_FLOAT = struct.Struct('>f')
+_FLOAT3 = struct.Struct('>fff')
+# Float run packers by length (curves, frames), created on first use
+_FLOAT_RUNS = {}
+_FLOAT_RUNS_MAX = 64
 
 
-def write_rgba(binary_file, color, default='ffffffff'):
-    color = int(color or default, 16)  # Parse the color as a 32-bit hex value
-    r = (color >> 24) & 0xFF  # Extract the red byte
-    g = (color >> 16) & 0xFF  # Extract the green byte
-    b = (color >> 8) & 0xFF   # Extract the blue byte
-    a = color & 0xFF          # Extract the alpha byte
-
-    # Write each byte as a separate value
-    write_byte(binary_file, r)
-    write_byte(binary_file, g)
-    write_byte(binary_file, b)
-    write_byte(binary_file, a)
-    
-def write_rgb(binary_file, color, default='ffffff'):
-    color = int(color or default, 16)  # Parse the color as a 24-bit hex value
-    
-    # Extract RGB components
-    r = (color >> 16) & 0xFF  # Extract the red byte
-    g = (color >> 8) & 0xFF   # Extract the green byte
-    b = color & 0xFF          # Extract the blue byte
-
-    # Write each byte as a separate value
-    write_byte(binary_file, r)
-    write_byte(binary_file, g)
-    write_byte(binary_file, b)
-
-    
-# Write strings with length prefix
-def write_string(binary_file, string):
-    if string is None:
-        write_varint(binary_file, 0)
-    elif string == "":
-        write_varint(binary_file, 1)
-    else:
-        byte_string = string.encode('utf-8')
-        write_varint(binary_file, len(byte_string) + 1)
-        binary_file.write(byte_string)
-        
-# Write index to the string dictionary
-def write_string_ref(binary_file, string):
-    if string is None:
-        write_varint(binary_file, 0)
-    else:
-        index = strings_name_to_index.get(string, -1) + 1
-        write_varint(binary_file, index)
-    
-def write_byte(binary_file, value):
-    binary_file.write(struct.pack('B', value))
-    
-def write_sbyte(binary_file, value):
-    if not -128 <= value <= 127:
-        raise ValueError("Value out of range for sbyte: must be between -128 and 127")
-    binary_file.write(struct.pack('b', value))
-    
-def write_bool(binary_file, value):
-    binary_file.write(struct.pack('>?', value))
-    
-def write_int(binary_file, value):
-    if value > 0x7FFFFFFF:
-        value -= 0x100000000
-    binary_file.write(struct.pack('>i', value))
-        
-def write_varint(binary_file, value, optimize_positive=True):
-    if not optimize_positive:
-        value = (value << 1) ^ (value >> 31)
-    value &= 0xFFFFFFFF
-
-    while True:
-        byte = value & 0x7F
-        value >>= 7
-        if value:
-            binary_file.write(struct.pack('B', byte | 0x80))
+class SkelWriter:
+    """
+    Big-endian binary writer for .skel output, backed by a bytearray.
+
+    Writing into one growing buffer with precompiled structs avoids a
+    struct.pack + file write per primitive, and float runs (curves, uvs,
+    deform vertices) are packed with a single call.
+    """
+
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def getvalue(self):
+        return bytes(self._buffer)
+
+    def write_bytes(self, data):
+        self._buffer += data
+
+    def write_sequence(self, sequence):
+        if sequence == None:
+            self.write_bool(False)
+            return
+
+        self.write_bool(True)
+        self.write_varint(sequence.get('count'))
+        self.write_varint(sequence.get('start', 1))
+        self.write_varint(sequence.get('digits', 0))
+        self.write_varint(sequence.get('setup', 0))
+
+    def write_vertices(self, attachment, vertex_count):
+        vertex_length = vertex_count * 2
+        vertices = attachment.get('vertices', [])
+        if (len(vertices) == vertex_length):
+            self.write_bool(False)
+            self.write_floats(vertices)
+        else:
+            self.write_bool(True)
+            i = 0
+            l = len(vertices)
+            while i < l:
+                bone_count = int(vertices[i])
+                i += 1
+                self.write_varint(bone_count)
+                ll = i + bone_count * 4
+                while i < ll:
+                    # bone index, x, y, weight
+                    self.write_varint(int(vertices[i]))
+                    self._buffer += _FLOAT3.pack(vertices[i + 1], vertices[i + 2], vertices[i + 3])
+                    i += 4
+
+    def write_curve(self, curve):
+        # Curve to the next frame: a curve type name, or bezier control points
+        if isinstance(curve, str):
+            self.write_byte(timeline_curve_type.get(curve, 0))
         else:
-            binary_file.write(struct.pack('B', byte))
-            break
-
-def write_short_array(binary_file, short_array):
-    # Write the length of the array as a varint
-    write_varint(binary_file, len(short_array))
-
-    for value in short_array:
-        if not -32768 <= value <= 32767:
-            raise ValueError(f"Value out of range for short: {value}")
-        binary_file.write(struct.pack('>H', value & 0xFFFF))
-        
-def write_long(binary_file, value):
-    if value >= (1 << 63):
-        value -= (1 << 64)
-    binary_file.write(struct.pack('>q', value))
-    
-# Helper function to write floats
-# Spine doesn't save floats with the same precision between JSON and Skel
-# So out file will be a little bit different than if it was actually exported with Spine      
-def write_float(binary_file, value):
-    binary_file.write(struct.pack('>f', value))
+            self.write_byte(timeline_curve_type['bezier'])
+            self.write_floats(curve)
+
+    def write_rgba(self, color, default='ffffffff'):
+        color = int(color or default, 16)  # Parse the color as a 32-bit hex value
+        # r, g, b, a as separate bytes
+        self._buffer += (color & 0xFFFFFFFF).to_bytes(4, 'big')
+
+    def write_rgb(self, color, default='ffffff'):
+        color = int(color or default, 16)  # Parse the color as a 24-bit hex value
+        # r, g, b as separate bytes
+        self._buffer += (color & 0xFFFFFF).to_bytes(3, 'big')
+
+    # Write strings with length prefix
+    def write_string(self, string):
+        if string is None:
+            self.write_varint(0)
+        elif string == "":
+            self.write_varint(1)
+        else:
+            byte_string = string.encode('utf-8')
+            self.write_varint(len(byte_string) + 1)
+            self._buffer += byte_string
+
+    def write_byte(self, value):
+        self._buffer.append(value)
+
+    def write_sbyte(self, value):
+        if not -128 <= value <= 127:
+            raise ValueError("Value out of range for sbyte: must be between -128 and 127")
+        self._buffer += _SBYTE.pack(value)
+
+    def write_bool(self, value):
+        self._buffer.append(1 if value else 0)
+
+    def write_int(self, value):
+        if value > 0x7FFFFFFF:
+            value -= 0x100000000
+        self._buffer += _INT.pack(value)
+
+    def write_varint(self, value, optimize_positive=True):
+        if not optimize_positive:
+            value = (value << 1) ^ (value >> 31)
+        value &= 0xFFFFFFFF
+
+        # Most values (indices, counts) fit in one byte
+        if value < 0x80:
+            self._buffer.append(value)
+            return
+
+        encoded = bytearray()
+        while True:
+            byte = value & 0x7F
+            value >>= 7
+            if value:
+                encoded.append(byte | 0x80)
+            else:
+                encoded.append(byte)
+                break
+        self._buffer += encoded
+
+    def write_short_array(self, short_array):
+        # Write the length of the array as a varint
+        self.write_varint(len(short_array))
+        if not short_array:
+            return
+
+        for value in short_array:
+            if not -32768 <= value <= 32767:
+                raise ValueError(f"Value out of range for short: {value}")
+        self._buffer += struct.pack('>%dH' % len(short_array), *[value & 0xFFFF for value in short_array])
+
+    def write_long(self, value):
+        if value >= (1 << 63):
+            value -= (1 << 64)
+        self._buffer += _LONG.pack(value)
+
+    # Spine doesn't save floats with the same precision between JSON and Skel
+    # So out file will be a little bit different than if it was actually exported with Spine
+    def write_float(self, value):
+        self._buffer += _FLOAT.pack(value)
+
+    def write_floats(self, values):
+        """Pack a run of floats with a single struct call."""
+        count = len(values)
+        if not count:
+            return
+        packer = _FLOAT_RUNS.get(count)
+        if packer is None:
+            if count > _FLOAT_RUNS_MAX:
+                self._buffer += struct.pack('>%df' % count, *values)
+                return
+            packer = _FLOAT_RUNS[count] = struct.Struct('>%df' % count)
+        self._buffer += packer.pack(*values)
@@ -1,158 +1,181 @@
 from PIL import Image
 import os
-import ctypes
-from ctypes import *
-from .json_to_skel import json_to_skel
-import tempfile
+from .json_to_skel import CONVERTER_VERSION, convert_json_cached, open_skel_cache, skel_cache_key
 import gc
 import re
 import shutil
-import glob
-from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+import fnmatch
+import posixpath
+import struct
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
 import sys
 
 # 平行處理設定
-# 限制同時處理的紋理數量，避免記憶體過載
-MAX_PARALLEL_TEXTURES = min(4, max(1, (os.cpu_count() or 4) // 2))
+# 同時處理的紋理數量上限；實際並行度由記憶體預算控制（見 TEXTURE_MEMORY_FRACTION）
+MAX_PARALLEL_TEXTURES = max(1, os.cpu_count() or 4)
+
+# 紋理壓縮的記憶體預算：預設為可用記憶體的一半
+# 依 PNG 標頭的尺寸估算每張紋理的峰值用量，小紋理可大量並行，大紋理自動序列化
+TEXTURE_MEMORY_FRACTION = 0.5
 
 # 檢測是否在 Android 環境 (Chaquopy)
 # Android 上 ProcessPoolExecutor 可能無法正常工作，改用 ThreadPoolExecutor
 IS_ANDROID = hasattr(sys, 'getandroidapilevel') or 'ANDROID_ROOT' in os.environ
 
-from UnityPy.helpers import TypeTreeHelper
+# 儲存 Bundle 時平行壓縮 LZ4 區塊的執行緒數（lz4 會釋放 GIL）
+SAVE_COMPRESSION_WORKERS = max(1, os.cpu_count() or 1)
+
+# 儲存 Bundle 的 LZ4 壓縮等級：0 為快速 LZ4（檔案稍大、速度快數倍），1-12 為 LZ4HC 等級
+DEFAULT_COMPRESSION_LEVEL = 9
+
+# ASTC 壓縮快取設定
+# 以 PNG 內容雜湊為鍵，重複安裝相同 mod 時可直接取用已壓縮的資料
+ASTC_CACHE_SUBDIR = "astc"
+ASTC_CACHE_MAX_BYTES = 512 * 1024 * 1024
+
+# 完整 repack 結果快取：相同的原始 Bundle、mod 檔案與選項直接沿用上次的輸出
+RESULT_CACHE_SUBDIR = "result"
+DEFAULT_RESULT_CACHE_MAX_BYTES = 1024 * 1024 * 1024
+# 相同輸入的輸出內容改變時遞增，讓舊的快取結果失效
+REPACKER_VERSION = 1
+
+# ASTC 編碼設定：區塊大小 -> (block_x, block_y, m_TextureFormat)
+# 區塊越大壓縮越快、資料越小，但畫質越低
+ASTC_BLOCK_SIZES = {
+    "4x4": (4, 4, 48),  # ASTC_RGB_4x4
+    "5x5": (5, 5, 49),  # ASTC_RGB_5x5
+    "6x6": (6, 6, 50),  # ASTC_RGB_6x6
+    "8x8": (8, 8, 51),  # ASTC_RGB_8x8
+}
+DEFAULT_ASTC_BLOCK_SIZE = "4x4"
+DEFAULT_ASTC_PRESET = "medium"
+# 沿用目標 Texture2D 原本的 ASTC 格式
+ASTC_BLOCK_SIZE_ORIGINAL = "original"
+
+# 壓縮紋理的編碼後端（每個 repack 各自選擇）
+# astc：libastcenc（預設）；etcpak：輸出 ETC2_RGBA8，比 ASTC medium 快約一個數量級但畫質較低，需另外安裝 etcpak
+TEXTURE_ENCODER_ASTC = "astc"
+TEXTURE_ENCODER_ETCPAK = "etcpak"
+TEXTURE_ENCODERS = (TEXTURE_ENCODER_ASTC, TEXTURE_ENCODER_ETCPAK)
+DEFAULT_TEXTURE_ENCODER = TEXTURE_ENCODER_ASTC
+
+# repacker 只會修改這些類型的物件
+MODDABLE_TYPES = frozenset({"Texture2D", "TextAsset"})
+
+# Spine 多頁紋理的命名規則：base、base_2、base_3 ...
+_SPINE_PAGE_SUFFIX = re.compile(r"^(.*)_\d+$")
+
+# m_TextureFormat -> 區塊大小 (ASTC_RGB_* 與 ASTC_RGBA_*)
+_ASTC_FORMAT_BLOCKS = {
+    48: (4, 4), 49: (5, 5), 50: (6, 6), 51: (8, 8), 52: (10, 10), 53: (12, 12),
+    54: (4, 4), 55: (5, 5), 56: (6, 6), 57: (8, 8), 58: (10, 10), 59: (12, 12),
+}
+
+# plan_repack 的單核心成本係數（大略的實測值，用於估算與比較，不是精確預測）
+# ASTC 編碼速度（百萬像素/秒，4x4 區塊；區塊越大越快，依像素密度換算）
+_PLAN_ASTC_MPIX_PER_SEC = {"fastest": 1.5, "fast": 0.8, "medium": 0.25, "thorough": 0.12}
+# etcpak ETC2_RGBA8 編碼速度（百萬像素/秒）
+_PLAN_ETCPAK_MPIX_PER_SEC = 20.0
+_PLAN_PNG_DECODE_MPIX_PER_SEC = 30.0
+_PLAN_JSON_MB_PER_SEC = 10.0
+# 解析後的 JSON 物件約為檔案大小的數倍
+_PLAN_JSON_MEMORY_FACTOR = 10
+
+from UnityPy.helpers import CompressionHelper, TypeTreeHelper
 TypeTreeHelper.read_typetree_boost = False
 import UnityPy
 
 UnityPy.config.FALLBACK_UNITY_VERSION = '2022.3.22f1'
 
-_astcenc_lib = None
-_astcenc_structures = {}
-
-def _load_astcenc_library():
-    global _astcenc_lib
-    if _astcenc_lib is not None:
-        return _astcenc_lib if _astcenc_lib else None
-
-    try:
-        lib = ctypes.cdll.LoadLibrary("libastcenc.so")
-    except OSError as e:
-        print(f"FATAL: Could not load libastcenc.so. Make sure it's in jniLibs. Error: {e}")
-        _astcenc_lib = False
-        return None
-
-    _astcenc_structures['ASTCENC_SUCCESS'] = 0
-    _astcenc_structures['ASTCENC_PRF_LDR_SRGB'] = 0
-    _astcenc_structures['ASTCENC_PRE_MEDIUM'] = 60.0
-    _astcenc_structures['ASTCENC_TYPE_U8'] = 0
-    _astcenc_structures['ASTCENC_FLG_USE_DECODE_UNORM8'] = 1 << 1
-
-    class astcenc_swizzle(Structure):
-        _fields_ = [("r", c_uint), ("g", c_uint), ("b", c_uint), ("a", c_uint)]
-    _astcenc_structures['astcenc_swizzle'] = astcenc_swizzle
-
-    class astcenc_config(Structure):
-        _fields_ = [
-            ("profile", c_uint), ("flags", c_uint), ("block_x", c_uint),
-            ("block_y", c_uint), ("block_z", c_uint), ("cw_r_weight", c_float),
-            ("cw_g_weight", c_float), ("cw_b_weight", c_float), ("cw_a_weight", c_float),
-            ("a_scale_radius", c_uint), ("rgbm_m_scale", c_float),
-            ("tune_partition_count_limit", c_uint), ("tune_2partition_index_limit", c_uint),
-            ("tune_3partition_index_limit", c_uint), ("tune_4partition_index_limit", c_uint),
-            ("tune_block_mode_limit", c_uint), ("tune_refinement_limit", c_uint),
-            ("tune_candidate_limit", c_uint), ("tune_2partitioning_candidate_limit", c_uint),
-            ("tune_3partitioning_candidate_limit", c_uint), ("tune_4partitioning_candidate_limit", c_uint),
-            ("tune_db_limit", c_float), ("tune_mse_overshoot", c_float),
-            ("tune_2partition_early_out_limit_factor", c_float), ("tune_3partition_early_out_limit_factor", c_float),
-            ("tune_2plane_early_out_limit_correlation", c_float), ("tune_search_mode0_enable", c_float),
-            ("progress_callback", c_void_p),
-        ]
-    _astcenc_structures['astcenc_config'] = astcenc_config
-
-    class astcenc_image(Structure):
-        _fields_ = [
-            ("dim_x", c_uint), ("dim_y", c_uint), ("dim_z", c_uint),
-            ("data_type", c_uint), ("data", POINTER(c_void_p)),
-        ]
-    _astcenc_structures['astcenc_image'] = astcenc_image
-    
-    lib.astcenc_config_init.argtypes = [c_uint, c_uint, c_uint, c_uint, c_float, c_uint, POINTER(astcenc_config)]
-    lib.astcenc_config_init.restype = c_int
-
-    lib.astcenc_context_alloc.argtypes = [POINTER(astcenc_config), c_uint, POINTER(c_void_p)]
-    lib.astcenc_context_alloc.restype = c_int
-
-    lib.astcenc_compress_image.argtypes = [c_void_p, POINTER(astcenc_image), POINTER(astcenc_swizzle), POINTER(c_ubyte), c_size_t, c_uint]
-    lib.astcenc_compress_image.restype = c_int
-
-    lib.astcenc_context_free.argtypes = [c_void_p]
-    lib.astcenc_context_free.restype = None
-
-    lib.astcenc_get_error_string.argtypes = [c_int]
-    lib.astcenc_get_error_string.restype = c_char_p
-
-    _astcenc_lib = lib
-    return _astcenc_lib
-
-def get_error_string(astcenc_lib, status):
-    return astcenc_lib.astcenc_get_error_string(status).decode('utf-8')
 
-
-def _build_file_index(working_dir: str) -> dict:
+def _build_file_index(mod_sources) -> dict:
     """
     一次遍歷建立完整的檔案索引，避免重複 os.walk 操作。
+    mod_sources 可為目錄、zip 封存檔或其列表；封存檔內的檔案以 "<封存檔>!/<項目>" 路徑表示，不會解壓到磁碟。
     
     Returns:
         dict with keys:
-        - 'skel_json': {base_name: (type, filepath, directory)}
+        - 'skel_json': {base_name: (type, filepath, relative directory)}
         - 'all_files': [filepath, ...]
+        - 'relative_paths': {filepath: 相對於 mod 來源的路徑（'/' 分隔）}
     """
     index = {
-        'skel_json': {},   # base_name -> (type, path, directory)
-        'all_files': []    # [path]
+        'skel_json': {},       # base_name -> (type, path, relative directory)
+        'all_files': [],       # [path]
+        'relative_paths': {}   # path -> relative path
     }
     
-    for root, _, files in os.walk(working_dir):
-        if '.old' in root:
-            continue
-        for f in files:
-            filepath = os.path.join(root, f)
-            index['all_files'].append(filepath)
-            f_lower = f.lower()
-            
-            if f_lower.endswith(('.skel', '.json')):
-                base_name = os.path.splitext(f)[0]
-                file_type = 'skel' if f_lower.endswith('.skel') else 'json'
-                if base_name not in index['skel_json']:
-                    index['skel_json'][base_name] = (file_type, filepath, root)
+    for relative_path, filepath in list_mod_files(mod_sources):
+        index['all_files'].append(filepath)
+        index['relative_paths'][filepath] = relative_path
+        f = os.path.basename(filepath)
+        f_lower = f.lower()
+        
+        if f_lower.endswith(('.skel', '.json')):
+            base_name = os.path.splitext(f)[0]
+            file_type = 'skel' if f_lower.endswith('.skel') else 'json'
+            if base_name not in index['skel_json']:
+                index['skel_json'][base_name] = (file_type, filepath, posixpath.dirname(relative_path))
     
     return index
 
 
-from utils.atlas_operations import parse_atlas_file
+def _spine_mod_files(file_index, mod_files, relative_dir, base_name):
+    """
+    找出 Spine 的頁面（{base_name}*.png）與 atlas。
+    以相對目錄比對，多個 mod 來源時頁面與 atlas 可分別來自不同封存檔。
 
-def _merge_spine_assets(mod_dir_path, base_name, target_count, report_progress):
-    report_progress(f"Starting Spine asset merge for '{base_name}' in temporary directory.")
+    Returns:
+        tuple of (依檔名排序的頁面路徑列表, atlas 路徑或 None)
+    """
+    pattern = f'{base_name}*.png'
+    atlas_name = f'{base_name}.atlas'
+    page_files, atlas_path = [], None
+    for filepath in mod_files:
+        file_dir, filename = posixpath.split(file_index['relative_paths'][filepath])
+        if file_dir != relative_dir:
+            continue
+        if filename == atlas_name:
+            atlas_path = filepath
+        elif fnmatch.fnmatchcase(filename, pattern):
+            page_files.append(filepath)
+    page_files.sort(key=os.path.basename)
+    return page_files, atlas_path
 
-    original_png_files = sorted(glob.glob(os.path.join(mod_dir_path, f'{base_name}*.png')))
-    original_atlas_path = os.path.join(mod_dir_path, f"{base_name}.atlas")
 
-    if not original_png_files or not os.path.exists(original_atlas_path):
-        return f"SKIPPING: Missing png or atlas files for {base_name} in the working directory."
+from utils.atlas_operations import Atlas, layout_atlas_pages, load_atlas, render_atlas_pages
+from utils.mod_source import close_archives, hash_mod_file, list_mod_files, mod_file_size, open_mod_file, read_mod_file, split_archive_path
 
-    atlas_db, err = parse_atlas_file(original_atlas_path)
+def _merge_spine_assets(original_atlas_path, original_png_files, base_name, target_count, report_progress, save_merged_png=False):
+    """
+    將 Spine 頁面合併為 target_count 張，並改寫 atlas 的 bounds。
+    只讀取 mod 檔案、不修改 mod 目錄；合併後的頁面與 atlas 留在記憶體中直接交給後續流程。
+    save_merged_png 為 True 且 mod 來源為一般目錄時，另存 PNG 與 atlas 供除錯。
+
+    Returns:
+        tuple of (error message or None, {合併後頁面路徑: RGBA 影像}, 合併後的 Atlas 或 None)
+    """
+    report_progress(f"Starting Spine asset merge for '{base_name}' in memory.")
+
+    if not original_png_files or not original_atlas_path:
+        return f"SKIPPING: Missing png or atlas files for {base_name} in the working directory.", {}, None
+
+    atlas, err = load_atlas(original_atlas_path)
     if err:
-        return f"FAILED: Could not parse atlas file: {err}"
+        return f"FAILED: Could not parse atlas file: {err}", {}, None
 
     # Sort pngs correctly (_2 before _10)
     def sort_key(filename):
         if filename.endswith(f"{base_name}.png"): return 1
         match = re.search(r'_(\d+)\.png$', filename)
         return int(match.group(1)) if match else float('inf')
-    original_png_files.sort(key=lambda x: sort_key(os.path.basename(x)))
+    original_png_files = sorted(original_png_files, key=lambda x: sort_key(os.path.basename(x)))
 
     if len(original_png_files) <= target_count:
         # This case should be handled by the calling function, but as a safeguard:
-        return "Merge not needed, texture count is already at or below target."
+        return "Merge not needed, texture count is already at or below target.", {}, None
 
     from PIL import ImageFile
     ImageFile.LOAD_TRUNCATED_IMAGES = True
@@ -162,189 +185,268 @@ def _merge_spine_assets(mod_dir_path, base_name, target_count, report_progress):
     images = {}
     for p in original_png_files:
         try:
-            img = Image.open(p)
-            img.load()  # Force reading the entire image immediately to catch corruption early
+            with open_mod_file(p) as f:
+                img = Image.open(f)
+                img.load()  # Force reading the entire image immediately to catch corruption early
             images[os.path.basename(p)] = img
         except OSError as e:
             # Clean up what we opened so far
             for opened_img in images.values():
                 opened_img.close()
-            return f"FAILED: Could not decode image file '{os.path.basename(p)}'. The PNG stream might be corrupted or in an unsupported format. Error: {e}"
-    merging_plan = {i: [] for i in range(target_count)}
-    for i, png_path in enumerate(original_png_files):
-        merging_plan[i % target_count].append(os.path.basename(png_path))
-    
-    final_atlas_blocks = []
+            return f"FAILED: Could not decode image file '{os.path.basename(p)}'. The PNG stream might be corrupted or in an unsupported format. Error: {e}", {}, None
 
-    for i in range(target_count):
-        target_pngs = merging_plan[i]
-        if not target_pngs: continue
-
-        base_image_name = target_pngs[0]
-        base_image = images[base_image_name].copy()
-        
-        merged_offsets = {base_image_name: (0, 0)}
-        
-        current_width = base_image.width
-        max_height = base_image.height
-        
-        for extra_image_name in target_pngs[1:]:
-            extra_image = images[extra_image_name]
-            merged_offsets[extra_image_name] = (current_width, 0)
-            
-            new_width = current_width + extra_image.width
-            max_height = max(max_height, extra_image.height)
-            
-            new_base_image = Image.new('RGBA', (new_width, max_height))
-            new_base_image.paste(base_image, (0, 0))
-            new_base_image.paste(extra_image, (current_width, 0))
-            
-            # Clean up old base_image to free memory
-            base_image.close()
-            base_image = new_base_image
-            current_width = new_width
-
-        output_image_name = f"{base_name}.png" if i == 0 else f"{base_name}_{i+1}.png"
-        output_path = os.path.join(mod_dir_path, output_image_name)
-        base_image.save(output_path)
-        base_image.close()  # Close after saving
-        report_progress(f"Saved merged image: {output_path}")
-
-        all_sprites_for_block = []
-        filter_line = None
-        for original_png_name in target_pngs:
-            atlas_data = atlas_db.get(original_png_name)
-            if not atlas_data:
-                report_progress(f"WARNING: Missing atlas entry for {original_png_name}; skipping atlas block data during merge.")
-                continue
-
-            if filter_line is None:
-                filter_line = atlas_data['filter_line']
-
-            offset_x, offset_y = merged_offsets[original_png_name]
-            
-            if offset_x == 0 and offset_y == 0:
-                all_sprites_for_block.append(atlas_data['sprites'])
-            else:
-                modified_sprites = []
-                for line in atlas_data['sprites'].split('\n'):
-                    if line.strip().startswith('bounds:'):
-                        try:
-                            parts = line.strip().split(':')
-                            coords = parts[1].strip().split(',')
-                            x, y, w, h = [int(c.strip()) for c in coords]
-                            x += offset_x
-                            y += offset_y
-                            modified_sprites.append(f" bounds: {x},{y},{w},{h}")
-                        except: modified_sprites.append(line)
-                    else: modified_sprites.append(line)
-                all_sprites_for_block.append('\n'.join(modified_sprites))
-
-        if filter_line is None:
-            report_progress(f"WARNING: No atlas blocks matched merged texture group {target_pngs}; skipping output atlas block for {output_image_name}.")
-            continue
-
-        new_block = [
-            output_image_name,
-            f" size: {base_image.width},{base_image.height}",
-            filter_line,
-            '\n'.join(all_sprites_for_block)
-        ]
-        final_atlas_blocks.append('\n'.join(new_block))
-    
-    final_atlas_path = os.path.join(mod_dir_path, f"{base_name}.atlas")
-    with open(final_atlas_path, 'w', encoding='utf-8') as f:
-        f.write('\n\n'.join(final_atlas_blocks))
-    report_progress(f"Wrote final atlas file to: {final_atlas_path}")
+    # 以 MaxRects 將所有頁面的區域重新排入 target_count 張接近正方形的頁面
+    page_sizes = {name: img.size for name, img in images.items()}
+    output_names = [f"{base_name}.png" if i == 0 else f"{base_name}_{i+1}.png" for i in range(target_count)]
+    layout, err = layout_atlas_pages(atlas, page_sizes, output_names)
+    if err:
+        for img in images.values():
+            img.close()
+        return f"FAILED: Could not pack atlas regions: {err}", {}, None
+
+    # 封存檔內無法另存，除錯輸出只寫到一般目錄
+    save_to_disk = save_merged_png and not split_archive_path(original_atlas_path)[1]
+    if save_merged_png and not save_to_disk:
+        report_progress("Mod source is an archive, merged PNGs are not saved.")
+
+    merged_pages = {}
+
+    for page, page_image in zip(layout['atlas'].pages, render_atlas_pages(layout, images)):
+        output_path = os.path.join(os.path.dirname(original_atlas_path), page.name)
+        if save_to_disk:
+            page_image.save(output_path)
+            report_progress(f"Saved merged image: {output_path}")
+        # 不寫回 PNG，直接以記憶體中的影像交給壓縮流程，省去一次 PNG 編碼與解碼
+        merged_pages[output_path] = page_image
+        report_progress(f"Packed page {page.name}: {page_image.width}x{page_image.height}")
+
+    if save_to_disk:
+        layout['atlas'].save(original_atlas_path)
+        report_progress(f"Wrote final atlas file to: {original_atlas_path}")
+        # 移除未被合併頁面覆蓋的原始頁面，讓除錯輸出與新的 atlas 一致
+        for png_path in original_png_files:
+            if png_path not in merged_pages:
+                try:
+                    os.remove(png_path)
+                except OSError as e:
+                    report_progress(f"Could not delete old file {png_path}: {e}")
     
     # Clean up images dict to free memory
     for img in images.values():
         img.close()
     del images
-    
-    # Clean up old, unmerged png files
-    report_progress("Cleaning up original, unmerged texture files...")
-    for png_path in original_png_files:
-        try:
-            # Check if the file is one of the NEWLY created merged files.
-            # If so, don't delete it.
-            if os.path.basename(png_path) not in [f"{base_name}.png" if i == 0 else f"{base_name}_{i+1}.png" for i in range(target_count)]:
-                os.remove(png_path)
-        except OSError as e:
-            report_progress(f"Could not delete old file {png_path}: {e}")
             
-    return None
+    return None, merged_pages, layout['atlas']
+
+
+def _merged_page_pixels(image):
+    """
+    將合併後的頁面轉為壓縮用的上下翻轉 RGBA 像素，並釋放影像。
+
+    Returns:
+        tuple of (pixels, width, height)
+    """
+    try:
+        if image.mode != "RGBA":
+            rgba_image = image.convert("RGBA")
+            image.close()
+            image = rgba_image
+        return image.tobytes("raw", "RGBA", 0, -1), image.width, image.height
+    finally:
+        image.close()
 
 from utils.file_operations import find_file_case_insensitive
+from utils.asset_operations import read_object_name
+from utils.disk_cache import DEFAULT_CACHE_ROOT, DiskCache, hash_bytes, hash_file, make_key
+from utils.memory_budget import FALLBACK_AVAILABLE_BYTES, MemoryBudget, get_available_memory
+from utils import astc_operations, etcpak_operations
 
+_ASTC_CACHE_HEADER = struct.Struct('<II')  # width, height
+
+
+def _astc_cache_key(png_digest, block_x, block_y, quality, flip, encoder=TEXTURE_ENCODER_ASTC):
+    return make_key(encoder, png_digest, f"{block_x}x{block_y}", quality, flip)
 
-def compress_image_astc(image_bytes, width, height, block_x, block_y):
-    astcenc = _load_astcenc_library()
-    if not astcenc:
-        return None, "libastcenc.so could not be loaded."
-        
-    ASTCENC_SUCCESS = _astcenc_structures['ASTCENC_SUCCESS']
-    ASTCENC_PRF_LDR_SRGB = _astcenc_structures['ASTCENC_PRF_LDR_SRGB']
-    ASTCENC_PRE_MEDIUM = _astcenc_structures['ASTCENC_PRE_MEDIUM']
-    ASTCENC_TYPE_U8 = _astcenc_structures['ASTCENC_TYPE_U8']
-    ASTCENC_FLG_USE_DECODE_UNORM8 = _astcenc_structures['ASTCENC_FLG_USE_DECODE_UNORM8']
-    astcenc_config = _astcenc_structures['astcenc_config']
-    astcenc_image = _astcenc_structures['astcenc_image']
-    astcenc_swizzle = _astcenc_structures['astcenc_swizzle']
-
-    config = astcenc_config()
-    quality = ASTCENC_PRE_MEDIUM
-    profile = ASTCENC_PRF_LDR_SRGB
-    flags = ASTCENC_FLG_USE_DECODE_UNORM8
-    status = astcenc.astcenc_config_init(profile, block_x, block_y, 1, quality, flags, byref(config))
-    if status != ASTCENC_SUCCESS:
-        return None, f"astcenc_config_init failed: {get_error_string(astcenc, status)}"
-
-    context = c_void_p()
-    thread_count = os.cpu_count() or 1
-    status = astcenc.astcenc_context_alloc(byref(config), thread_count, byref(context))
-    if status != ASTCENC_SUCCESS:
-        return None, f"astcenc_context_alloc failed: {get_error_string(astcenc, status)}"
-
-    image_data_p = (c_void_p * 1)()
-    image_data_p[0] = ctypes.cast(image_bytes, c_void_p)
-
-    image = astcenc_image()
-    image.dim_x = width
-    image.dim_y = height
-    image.dim_z = 1
-    image.data_type = ASTCENC_TYPE_U8
-    image.data = image_data_p
-
-    swizzle = astcenc_swizzle(r=0, g=1, b=2, a=3)
-
-    blocks_x = (width + block_x - 1) // block_x
-    blocks_y = (height + block_y - 1) // block_y
-    buf_size = blocks_x * blocks_y * 16
-    comp_buf = (c_ubyte * buf_size)()
-
-    status = astcenc.astcenc_compress_image(context, byref(image), byref(swizzle), comp_buf, buf_size, 0)
-    
-    astcenc.astcenc_context_free(context)
 
-    if status != ASTCENC_SUCCESS:
-        return None, f"astcenc_compress_image failed: {get_error_string(astcenc, status)}"
+def _astc_cache_get(cache, key):
+    payload = cache.get(key)
+    if payload is None or len(payload) < _ASTC_CACHE_HEADER.size:
+        return None
+    width, height = _ASTC_CACHE_HEADER.unpack_from(payload)
+    return payload[_ASTC_CACHE_HEADER.size:], width, height
+
+
+def _astc_cache_put(cache, key, compressed_data, width, height):
+    cache.put(key, _ASTC_CACHE_HEADER.pack(width, height) + compressed_data)
+
+
+
+def open_result_cache(cache_dir=None, max_bytes=DEFAULT_RESULT_CACHE_MAX_BYTES):
+    return DiskCache(os.path.join(cache_dir or DEFAULT_CACHE_ROOT, RESULT_CACHE_SUBDIR), max_bytes)
+
+
+def _effective_texture_encoder(texture_encoder):
+    """etcpak 為選用套件（Chaquopy 沒有提供），未安裝時改用 ASTC。"""
+    if texture_encoder == TEXTURE_ENCODER_ETCPAK and not etcpak_operations.is_available():
+        return TEXTURE_ENCODER_ASTC
+    return texture_encoder
 
-    return bytes(comp_buf), None
+
+def repack_result_key(original_bundle_path, modded_assets_folder, use_astc, astc_block_size=DEFAULT_ASTC_BLOCK_SIZE,
+                      astc_preset=DEFAULT_ASTC_PRESET, compression_level=DEFAULT_COMPRESSION_LEVEL, max_texture_size=None,
+                      texture_encoder=DEFAULT_TEXTURE_ENCODER):
+    """
+    完整 repack 結果的快取鍵：原始 Bundle 雜湊、排序後的 mod 檔案雜湊、編碼選項與版本。
+    modded_assets_folder 可為目錄、zip 封存檔或其列表；同一份內容不論來源為何都得到相同的鍵。
+    """
+    mod_digests = sorted(
+        f"{relative_path}:{hash_mod_file(filepath)}"
+        for relative_path, filepath in list_mod_files(modded_assets_folder)
+    )
+    return make_key(
+        "repack", REPACKER_VERSION, CONVERTER_VERSION, hash_file(original_bundle_path),
+        use_astc, astc_block_size, astc_preset, compression_level, max_texture_size,
+        _effective_texture_encoder(texture_encoder), *mod_digests,
+    )
+
+
+def compress_image_astc(image_bytes, width, height, block_x, block_y, quality=astc_operations.ASTCENC_PRE_MEDIUM):
+    return astc_operations.compress_image(image_bytes, width, height, block_x, block_y, quality)
+
+
+def compress_texture(image_bytes, width, height, block_x, block_y, quality, encoder=DEFAULT_TEXTURE_ENCODER):
+    """
+    以指定的編碼後端壓縮翻轉後的 RGBA 像素。
+    etcpak 固定輸出 ETC2_RGBA8（4x4 區塊），忽略 block_x、block_y 與 quality。
+
+    Returns:
+        tuple of (compressed data, error message)
+    """
+    if encoder == TEXTURE_ENCODER_ETCPAK:
+        return etcpak_operations.compress_image(image_bytes, width, height)
+    return compress_image_astc(image_bytes, width, height, block_x, block_y, quality)
+
+
+_texture_memory_budget = None
+_texture_memory_budget_lock = threading.Lock()
+
+
+def _get_texture_memory_budget():
+    """取得行程內共用的紋理記憶體預算（批次模式下多個 repack 共用）。"""
+    global _texture_memory_budget
+    with _texture_memory_budget_lock:
+        if _texture_memory_budget is None:
+            available = get_available_memory() or FALLBACK_AVAILABLE_BYTES
+            _texture_memory_budget = MemoryBudget(int(available * TEXTURE_MEMORY_FRACTION))
+        return _texture_memory_budget
+
+
+def _read_png_header(mod_filepath):
+    """只讀取影像標頭，回傳 (width, height, mode)；無法讀取時回傳 None。"""
+    try:
+        with open_mod_file(mod_filepath) as f, Image.open(f) as img:
+            return img.width, img.height, img.mode
+    except Exception:
+        return None
+
+
+def _capped_texture_size(width, height, max_texture_size):
+    """
+    依 max_texture_size 限制紋理最長邊，等比例縮小。
+
+    Returns:
+        縮小後的 (width, height)；不需縮小時回傳 None
+    """
+    if not max_texture_size or max(width, height) <= max_texture_size:
+        return None
+    factor = max_texture_size / max(width, height)
+    return max(1, round(width * factor)), max(1, round(height * factor))
+
+
+def _downscale_image(image, size):
+    """以 LANCZOS 重新取樣縮小影像，並關閉原影像。"""
+    resized = image.resize(size, Image.LANCZOS, reducing_gap=3.0)
+    image.close()
+    return resized
+
+
+def _texture_digest(mod_filepath, target_size=None):
+    """ASTC 快取用的紋理雜湊；縮小的紋理另加上目標尺寸。"""
+    digest = hash_mod_file(mod_filepath)
+    return f"{digest}@{target_size[0]}x{target_size[1]}" if target_size else digest
+
+
+def _rescale_mod_atlases(text_files, file_index, page_scales, mod_overrides, report_progress):
+    """
+    縮放 atlas 中紋理被縮小的頁面（size、bounds、offsets），結果寫入 mod_overrides。
+    頁面以 atlas 所在的相對目錄加上頁面檔名比對 page_scales。
+    """
+    for mod_filepath, _ in text_files:
+        if not mod_filepath.lower().endswith('.atlas'):
+            continue
+        try:
+            if mod_filepath in mod_overrides:
+                atlas = Atlas.parse(mod_overrides[mod_filepath].decode("utf-8"))
+            else:
+                atlas = Atlas.parse(read_mod_file(mod_filepath).decode("utf-8"))
+        except Exception as e:
+            report_progress(f"  Could not parse {os.path.basename(mod_filepath)} for downscaling: {e}")
+            continue
+        atlas_dir = posixpath.dirname(file_index['relative_paths'][mod_filepath])
+        scaled_pages = 0
+        for page in atlas.pages:
+            factors = page_scales.get(posixpath.join(atlas_dir, page.name))
+            if factors:
+                atlas.scale(factors[0], factors[1], (page.name,))
+                scaled_pages += 1
+        if scaled_pages:
+            mod_overrides[mod_filepath] = atlas.serialize().encode("utf-8")
+            report_progress(f"  Rescaled {scaled_pages} page(s) in {os.path.basename(mod_filepath)}")
+
+
+def _estimate_texture_memory(mod_filepath, block_x, block_y, header=None, target_size=None):
+    """
+    只讀取 PNG 標頭，估算壓縮一張紋理的峰值記憶體（bytes）。
+    解碼後影像 + 翻轉後的原始像素 + ASTC 輸出；非 RGBA 影像另需 convert 的複本。
+    需要縮小時，翻轉後的像素與 ASTC 輸出以縮小後的尺寸計算，另加縮小後的影像。
+    """
+    header = header or _read_png_header(mod_filepath)
+    if header is None:
+        return 0
+    width, height, mode = header
+    rgba_bytes = width * height * 4
+    estimate = rgba_bytes
+    if mode != "RGBA":
+        estimate += rgba_bytes
+    if target_size:
+        width, height = target_size
+        estimate += width * height * 4
+    astc_bytes = ((width + block_x - 1) // block_x) * ((height + block_y - 1) // block_y) * 16
+    return estimate + width * height * 4 + astc_bytes
+
+
+def _estimate_worker_memory(args):
+    """估算一個壓縮任務的峰值記憶體；記憶體中的合併頁面以其尺寸估算，不讀取檔案。"""
+    mod_filepath, _, block_x, block_y, _, pixels, target_size, _ = args
+    header = (pixels[1], pixels[2], "RGBA") if pixels is not None else None
+    return _estimate_texture_memory(mod_filepath, block_x, block_y, header, target_size)
 
 
 def _compress_texture_worker(args):
     """
-    Worker 函數，用於在子進程中執行 ASTC 壓縮。
+    Worker 函數，用於在子進程中執行紋理壓縮（ASTC 或 ETC2）。
     
     Args:
-        args: tuple of (mod_filepath, target_asset_name, block_x, block_y)
+        args: tuple of (mod_filepath, target_asset_name, block_x, block_y, quality, pixels, target_size, encoder)
+              pixels 為記憶體中合併頁面的 (翻轉後的 RGBA 像素, width, height)，None 則從 PNG 解碼
+              target_size 為縮小後的 (width, height)，None 則維持原尺寸（只用於從 PNG 解碼的紋理）
+              encoder 為編碼後端（TEXTURE_ENCODERS）
     
     Returns:
         dict with keys: 'success', 'target_asset_name', 'mod_filepath', 
                        'compressed_data', 'width', 'height', 'error'
     """
-    mod_filepath, target_asset_name, block_x, block_y = args
+    mod_filepath, target_asset_name, block_x, block_y, quality, pixels, target_size, encoder = args
     result = {
         'success': False,
         'target_asset_name': target_asset_name,
@@ -356,20 +458,41 @@ def _compress_texture_worker(args):
     }
     
     pil_img = None
-    flipped_img = None
+    image_bytes = None
     try:
-        pil_img = Image.open(mod_filepath).convert("RGBA")
-        result['width'] = pil_img.width
-        result['height'] = pil_img.height
-        
-        flipped_img = pil_img.transpose(Image.FLIP_TOP_BOTTOM)
-        
-        compressed_data, err = compress_image_astc(
-            flipped_img.tobytes(), 
-            pil_img.width, 
-            pil_img.height, 
-            block_x, 
-            block_y
+        if pixels is not None:
+            # 記憶體中的合併頁面已是翻轉後的 RGBA 像素，不需解碼
+            image_bytes, width, height = pixels
+            pixels = None
+        else:
+            # 封存檔內的 PNG 邊讀邊解壓，不需先解壓到磁碟
+            with open_mod_file(mod_filepath) as f:
+                pil_img = Image.open(f)
+                # 已是 RGBA 的 PNG 不需要 convert，省下一份完整複本
+                if pil_img.mode != "RGBA":
+                    rgba_img = pil_img.convert("RGBA")
+                    pil_img.close()
+                    pil_img = rgba_img
+                if target_size:
+                    pil_img = _downscale_image(pil_img, target_size)
+                width, height = pil_img.size
+
+                # 以 orientation -1 直接輸出上下翻轉的列順序，取代 transpose(FLIP_TOP_BOTTOM) 的整張複本
+                image_bytes = pil_img.tobytes("raw", "RGBA", 0, -1)
+            # 壓縮前先釋放解碼後的影像，峰值只剩原始像素與壓縮輸出
+            pil_img.close()
+            pil_img = None
+        result['width'] = width
+        result['height'] = height
+
+        compressed_data, err = compress_texture(
+            image_bytes,
+            width,
+            height,
+            block_x,
+            block_y,
+            quality,
+            encoder
         )
         
         if err:
@@ -381,9 +504,7 @@ def _compress_texture_worker(args):
     except Exception as e:
         result['error'] = str(e)
     finally:
-        if flipped_img:
-            flipped_img.close()
-            del flipped_img
+        del image_bytes
         if pil_img:
             pil_img.close()
             del pil_img
@@ -392,6 +513,105 @@ def _compress_texture_worker(args):
     return result
 
 
+def _build_asset_map(env):
+    """
+    建立 名稱(小寫) -> ObjectReader 列表 的對照表。
+    只讀取可修改類型的名稱欄位，不做完整反序列化；實際修改時才 obj.read()。
+    """
+    asset_map = {}
+    for obj in env.objects:
+        if obj.type.name not in MODDABLE_TYPES:
+            continue
+        name = read_object_name(obj)
+        if name:
+            asset_map.setdefault(name.lower(), []).append(obj)
+    return asset_map
+
+
+def _count_spine_textures(asset_map):
+    """
+    一次統計所有 Spine 頁面紋理數量：名稱(小寫) -> 符合 ^name(_N)?$ 的 Texture2D 數量。
+    """
+    counts = {}
+    for name, objects in asset_map.items():
+        texture_count = sum(1 for obj in objects if obj.type.name == "Texture2D")
+        if not texture_count:
+            continue
+        counts[name] = counts.get(name, 0) + texture_count
+        match = _SPINE_PAGE_SUFFIX.match(name)
+        if match:
+            stem = match.group(1)
+            counts[stem] = counts.get(stem, 0) + texture_count
+    return counts
+
+
+def _convert_json_worker(mod_filepath, max_workers=None, cache_dir=None):
+    """
+    Worker 函數：將 Spine JSON 轉換為 .skel 二進位資料（直接在記憶體中轉換，不經暫存檔）。
+    相同內容的 JSON 直接取用 .skel 快取。
+    max_workers: 動畫平行編碼的 worker 數；在 executor 內執行時傳 1，避免巢狀的工作池
+    Returns a tuple: (skel_bytes, cache_hit)
+    """
+    return convert_json_cached(mod_filepath, open_skel_cache(cache_dir), max_workers)
+
+
+def create_worker_executor(max_workers: int = MAX_PARALLEL_TEXTURES):
+    """
+    建立 JSON 轉換與紋理壓縮用的 executor。
+    Android 使用執行緒並共用 astcenc 執行緒預算；其他平台使用子進程並平分 CPU 核心。
+    """
+    if IS_ANDROID:
+        return ThreadPoolExecutor(max_workers=max_workers)
+    per_process_threads = max(1, (os.cpu_count() or 1) // max_workers)
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=astc_operations.set_thread_budget,
+        initargs=(per_process_threads,),
+    )
+
+
+def _needs_spine_merge(mod_texture_count, original_texture_count):
+    """mod 的頁數多於原始紋理數時，需要先合併頁面。"""
+    return mod_texture_count > original_texture_count and original_texture_count > 0
+
+
+def _categorize_mod_files(mod_files, asset_map, use_astc):
+    """
+    依目標資產類型分類 mod 檔案，沒有對應資產的檔案會被略過。
+
+    Returns:
+        tuple of (json_files, png_astc_files, png_rgba_files, text_files)
+        每個元素為 (mod_filepath, target_asset_name) 的列表
+    """
+    json_files = []      # JSON -> SKEL 轉換
+    png_astc_files = []  # PNG -> ASTC 壓縮 (需平行處理)
+    png_rgba_files = []  # PNG -> RGBA32 (不需壓縮)
+    text_files = []      # TextAsset 替換
+    
+    for mod_filepath in mod_files:
+        mod_filename = os.path.basename(mod_filepath)
+        
+        if mod_filename.lower().endswith('.json'):
+            base_name, _ = os.path.splitext(mod_filename)
+            target_asset_name = (base_name + ".skel").lower()
+            if _asset_objects(asset_map, target_asset_name, "TextAsset"):
+                json_files.append((mod_filepath, target_asset_name))
+                
+        elif mod_filename.lower().endswith('.png'):
+            target_asset_name = os.path.splitext(mod_filename)[0].lower()
+            if _asset_objects(asset_map, target_asset_name, "Texture2D"):
+                if use_astc:
+                    png_astc_files.append((mod_filepath, target_asset_name))
+                else:
+                    png_rgba_files.append((mod_filepath, target_asset_name))
+        else:
+            target_asset_name = mod_filename.lower()
+            if _asset_objects(asset_map, target_asset_name, "TextAsset"):
+                text_files.append((mod_filepath, target_asset_name))
+
+    return json_files, png_astc_files, png_rgba_files, text_files
+
+
 def _asset_objects(asset_map, target_asset_name: str, type_name: str = None):
     objects = list(asset_map.get(target_asset_name, []))
     if type_name:
@@ -399,9 +619,78 @@ def _asset_objects(asset_map, target_asset_name: str, type_name: str = None):
     return objects
 
 
-def repack_bundle(original_bundle_path: str, modded_assets_folder: str, output_path: str, use_astc: bool, progress_callback=None):
+def _resolve_astc_format(asset_map, target_asset_name, astc_block_size):
+    """
+    決定紋理使用的 ASTC 區塊大小與格式。
+
+    Returns:
+        tuple of (block_x, block_y, texture_format)
+    """
+    if astc_block_size != ASTC_BLOCK_SIZE_ORIGINAL:
+        return ASTC_BLOCK_SIZES[astc_block_size]
+
+    for obj in _asset_objects(asset_map, target_asset_name, "Texture2D"):
+        original_format = int(obj.read().m_TextureFormat)
+        if original_format in _ASTC_FORMAT_BLOCKS:
+            block_x, block_y = _ASTC_FORMAT_BLOCKS[original_format]
+            return block_x, block_y, original_format
+        break
+    # 原始格式不是 ASTC 時退回預設值
+    return ASTC_BLOCK_SIZES[DEFAULT_ASTC_BLOCK_SIZE]
+
+
+def _resolve_texture_format(asset_map, target_asset_name, astc_block_size, texture_encoder):
+    """
+    決定紋理的區塊大小與格式；etcpak 固定為 ETC2_RGBA8，其餘依 _resolve_astc_format。
+
+    Returns:
+        tuple of (block_x, block_y, texture_format)
+    """
+    if texture_encoder == TEXTURE_ENCODER_ETCPAK:
+        return etcpak_operations.ETC2_BLOCK_SIZE, etcpak_operations.ETC2_BLOCK_SIZE, etcpak_operations.ETC2_RGBA8_FORMAT
+    return _resolve_astc_format(asset_map, target_asset_name, astc_block_size)
+
+
+def _write_compressed_texture(asset_map, target_asset_name, compressed_data, width, height, texture_format):
+    """將壓縮結果（ASTC 或 ETC2）寫入所有同名的 Texture2D，回傳寫入的物件數量。"""
+    target_objects = _asset_objects(asset_map, target_asset_name, "Texture2D")
+    for obj in target_objects:
+        data = obj.read()
+
+        data.m_TextureFormat = texture_format
+        data.image_data = compressed_data
+        data.m_CompleteImageSize = len(compressed_data)
+        data.m_Width = width
+        data.m_Height = height
+        data.m_MipCount = 1
+
+        if hasattr(data, 'm_StreamData'):
+            data.m_StreamData.offset = 0
+            data.m_StreamData.size = 0
+            data.m_StreamData.path = ""
+
+        data.save()
+    return len(target_objects)
+
+
+def repack_bundle(original_bundle_path: str, modded_assets_folder: str, output_path: str, use_astc: bool, progress_callback=None, cache_dir=None,
+                  astc_block_size: str = DEFAULT_ASTC_BLOCK_SIZE, astc_preset: str = DEFAULT_ASTC_PRESET,
+                  compression_level: int = DEFAULT_COMPRESSION_LEVEL, executor=None, memory_budget_mb: int = None,
+                  save_merged_pngs: bool = False, max_texture_size: int = None,
+                  texture_encoder: str = DEFAULT_TEXTURE_ENCODER):
     """
     Repack a unity bundle with modded assets.
+    cache_dir: 持久快取的根目錄，None 則使用預設位置
+    astc_block_size: "4x4"、"5x5"、"6x6"、"8x8" 或 "original"（沿用原始紋理格式）
+    astc_preset: astcenc 速度預設 "fastest"、"fast"、"medium"、"thorough"
+    compression_level: 輸出 Bundle 的 LZ4 等級，0 為快速 LZ4，1-12 為 LZ4HC
+    executor: 批次模式共用的 executor（JSON 轉換與 ASTC 壓縮），None 則自行建立
+    memory_budget_mb: ASTC 壓縮的記憶體預算（MiB），None 則使用可用記憶體的 TEXTURE_MEMORY_FRACTION
+    modded_assets_folder: mod 目錄、zip 封存檔或其列表（後面的來源覆蓋前面的同名檔案）；封存檔直接讀取不解壓
+    save_merged_pngs: 除錯用，將合併後的 Spine 頁面與 atlas 另存到 mod 目錄（預設只保留在記憶體中）
+    max_texture_size: 紋理最長邊上限（像素），超過時等比例縮小並同步縮放對應 atlas 的 size 與 bounds；None 則不限制
+    texture_encoder: use_astc 時的編碼後端，"astc"（libastcenc）或 "etcpak"（ETC2_RGBA8，忽略 astc_block_size 與 astc_preset）；
+                     未安裝 etcpak 時改用 "astc" 並在進度訊息中說明
     Returns a tuple: (success: bool, message: str)
     """
     def report_progress(message):
@@ -409,11 +698,25 @@ def repack_bundle(original_bundle_path: str, modded_assets_folder: str, output_p
             progress_callback(message)
         print(message)
         
+    if astc_block_size not in ASTC_BLOCK_SIZES and astc_block_size != ASTC_BLOCK_SIZE_ORIGINAL:
+        return False, f"Unsupported ASTC block size: {astc_block_size}"
+    if astc_preset not in astc_operations.ASTC_PRESETS:
+        return False, f"Unsupported ASTC preset: {astc_preset}"
+    if not 0 <= compression_level <= CompressionHelper.LZ4HC_MAX_LEVEL:
+        return False, f"Unsupported compression level: {compression_level}"
+    if max_texture_size is not None and max_texture_size < 1:
+        return False, f"Unsupported max texture size: {max_texture_size}"
+    if texture_encoder not in TEXTURE_ENCODERS:
+        return False, f"Unsupported texture encoder: {texture_encoder}"
+    if use_astc and _effective_texture_encoder(texture_encoder) != texture_encoder:
+        report_progress(f"Texture encoder {texture_encoder} is not installed, falling back to {TEXTURE_ENCODER_ASTC}.")
+        texture_encoder = TEXTURE_ENCODER_ASTC
+
     env = None
     try:
-        # 直接使用 Kotlin 層已準備好的 mod 目錄，避免重複複製
+        # 直接讀取 mod 目錄或 zip 封存檔，避免重複複製或解壓
         working_dir = modded_assets_folder
-        report_progress(f"Using mod directory: {working_dir}")
+        report_progress(f"Using mod source: {working_dir}")
 
         report_progress("Loading original game file...")
         env = UnityPy.load(original_bundle_path)
@@ -422,6 +725,7 @@ def repack_bundle(original_bundle_path: str, modded_assets_folder: str, output_p
         # --- 建立檔案索引，一次遍歷取代多次 os.walk ---
         report_progress("Building file index...")
         file_index = _build_file_index(working_dir)
+        mod_files = file_index['all_files']
         
         # 從索引中取得 spine mods
         spine_mods_to_process = {
@@ -429,96 +733,82 @@ def repack_bundle(original_bundle_path: str, modded_assets_folder: str, output_p
             for base_name, (file_type, filepath, directory) in file_index['skel_json'].items()
         }
 
+        report_progress("Scanning for moddable assets...")
+        asset_map = _build_asset_map(env)
+
+        # 合併後的 Spine 頁面：路徑 -> (翻轉後的 RGBA 像素, width, height)，直接交給壓縮流程
+        merged_pages = {}
+        # 記憶體中取代 mod 檔案內容的資料（合併後的 atlas）：路徑 -> bytes
+        mod_overrides = {}
         if spine_mods_to_process:
+            spine_texture_counts = _count_spine_textures(asset_map)
             report_progress(f"Detected {len(spine_mods_to_process)} unique Spine mods for pre-processing: {list(spine_mods_to_process.keys())}")
             for spine_base_name, mod_dir_path in spine_mods_to_process.items():
                 report_progress(f"--- Processing: {spine_base_name} ---")
-                pattern = re.compile(f"^{re.escape(spine_base_name)}(_\\d+)?$", re.IGNORECASE)
-
-                original_texture_count = 0
-                for obj in env.objects:
-                    if obj.type.name == "Texture2D":
-                        try:
-                            asset_name = obj.read().m_Name
-                            if pattern.match(asset_name):
-                                original_texture_count += 1
-                        except Exception as e:
-                            report_progress(f"Couldn't read asset name, skipping. Error: {e}")
-
+                original_texture_count = spine_texture_counts.get(spine_base_name.lower(), 0)
                 report_progress(f"Found {original_texture_count} matching textures in the original game file for {spine_base_name}.")
 
-                mod_texture_count = len(glob.glob(os.path.join(mod_dir_path, f'{spine_base_name}*.png')))
-                report_progress(f"Mod has {mod_texture_count} textures for {spine_base_name}.")
+                mod_page_files, atlas_path = _spine_mod_files(file_index, mod_files, mod_dir_path, spine_base_name)
+                report_progress(f"Mod has {len(mod_page_files)} textures for {spine_base_name}.")
 
-                if mod_texture_count > original_texture_count and original_texture_count > 0:
-                    report_progress("Mod texture count exceeds original, starting merge process into temp directory...")
-                    merge_error = _merge_spine_assets(mod_dir_path, spine_base_name, original_texture_count, report_progress)
+                if _needs_spine_merge(len(mod_page_files), original_texture_count):
+                    report_progress("Mod texture count exceeds original, starting merge process in memory...")
+                    merge_error, merged_images, merged_atlas = _merge_spine_assets(
+                        atlas_path, mod_page_files, spine_base_name, original_texture_count, report_progress,
+                        save_merged_pngs)
 
                     if merge_error:
                         report_progress(f"ERROR during merge for {spine_base_name}: {merge_error}.")
                     else:
                         report_progress(f"Merge successful for {spine_base_name}.")
-                        # 合併後需要重新建立索引以包含新檔案
-                        file_index = _build_file_index(working_dir)
+                        # 以合併後的頁面與 atlas 取代原始頁面，mod 來源本身不被修改
+                        for page_path, page_image in merged_images.items():
+                            target_size = _capped_texture_size(page_image.width, page_image.height, max_texture_size)
+                            if target_size:
+                                report_progress(f"Downscaling merged page {os.path.basename(page_path)} to {target_size[0]}x{target_size[1]}")
+                                merged_atlas.scale(target_size[0] / page_image.width, target_size[1] / page_image.height,
+                                                   (os.path.basename(page_path),))
+                                page_image = _downscale_image(page_image, target_size)
+                            merged_pages[page_path] = _merged_page_pixels(page_image)
+                            file_index['relative_paths'][page_path] = posixpath.join(mod_dir_path, os.path.basename(page_path))
+                        mod_overrides[atlas_path] = merged_atlas.serialize().encode("utf-8")
+                        replaced_files = set(mod_page_files)
+                        mod_files = [path for path in mod_files if path not in replaced_files] + list(merged_images)
+                        del replaced_files
+                    del merged_images, merged_atlas
                 else:
                     report_progress("Texture count matches or is lower, no merge needed.")
-
-        report_progress("Scanning for moddable assets...")
-        
-        # Build asset_map more efficiently
-        total_objects = len(env.objects)
-        asset_map = {}
-        for obj in env.objects:
-            try:
-                data = obj.read()
-                if hasattr(data, 'm_Name') and data.m_Name:
-                    key = data.m_Name.lower()
-                    asset_map.setdefault(key, []).append(obj)
-            except Exception:
-                pass  # Skip objects that can't be read
-
-        # 直接使用索引中的檔案列表
-        mod_files = file_index['all_files']
-        total_assets = len(mod_files)
         
         # ========== 階段一：分類所有 mod 檔案 ==========
         report_progress("Phase 1: Categorizing mod files...")
-        
-        json_files = []      # JSON -> SKEL 轉換
-        png_astc_files = []  # PNG -> ASTC 壓縮 (需平行處理)
-        png_rgba_files = []  # PNG -> RGBA32 (不需壓縮)
-        text_files = []      # TextAsset 替換
-        
-        for mod_filepath in mod_files:
-            mod_filename = os.path.basename(mod_filepath)
-            
-            if mod_filename.lower().endswith('.json'):
-                base_name, _ = os.path.splitext(mod_filename)
-                target_asset_name = (base_name + ".skel").lower()
-                if _asset_objects(asset_map, target_asset_name, "TextAsset"):
-                    json_files.append((mod_filepath, target_asset_name))
-                    
-            elif mod_filename.lower().endswith('.png'):
-                target_asset_name = os.path.splitext(mod_filename)[0].lower()
-                if _asset_objects(asset_map, target_asset_name, "Texture2D"):
-                    if use_astc:
-                        png_astc_files.append((mod_filepath, target_asset_name))
-                    else:
-                        png_rgba_files.append((mod_filepath, target_asset_name))
-            else:
-                target_asset_name = mod_filename.lower()
-                if _asset_objects(asset_map, target_asset_name, "TextAsset"):
-                    text_files.append((mod_filepath, target_asset_name))
+        json_files, png_astc_files, png_rgba_files, text_files = _categorize_mod_files(mod_files, asset_map, use_astc)
         
         report_progress(f"  - JSON animations: {len(json_files)}")
         report_progress(f"  - ASTC textures: {len(png_astc_files)}")
         report_progress(f"  - RGBA32 textures: {len(png_rgba_files)}")
         report_progress(f"  - Text assets: {len(text_files)}")
+
+        # 超過 max_texture_size 的紋理：路徑 -> 縮小後的 (width, height)；合併頁面已在合併時縮小
+        texture_sizes = {}
+        if max_texture_size:
+            page_scales = {}  # 相對路徑 -> (x 縮放, y 縮放)，用來改寫 atlas
+            for mod_filepath, _ in png_astc_files + png_rgba_files:
+                header = None if mod_filepath in merged_pages else _read_png_header(mod_filepath)
+                target_size = header and _capped_texture_size(header[0], header[1], max_texture_size)
+                if target_size:
+                    texture_sizes[mod_filepath] = target_size
+                    page_scales[file_index['relative_paths'][mod_filepath]] = (target_size[0] / header[0], target_size[1] / header[1])
+            if texture_sizes:
+                report_progress(f"  - Textures above {max_texture_size}px to downscale: {len(texture_sizes)}")
+                _rescale_mod_atlases(text_files, file_index, page_scales, mod_overrides, report_progress)
+            del page_scales
         
         # ========== 階段二：處理 JSON 和 TextAsset (序列) ==========
         report_progress("Phase 2: Processing JSON and TextAsset files...")
         
         # 處理 JSON -> SKEL
+        # 有共用 executor 時，JSON 轉換也交給同一個工作池
+        json_futures = [executor.submit(_convert_json_worker, mod_filepath, 1, cache_dir) for mod_filepath, _ in json_files] if executor else None
         for i, (mod_filepath, target_asset_name) in enumerate(json_files):
             mod_filename = os.path.basename(mod_filepath)
             current_progress = f"(JSON {i+1}/{len(json_files)}) "
@@ -527,23 +817,19 @@ def repack_bundle(original_bundle_path: str, modded_assets_folder: str, output_p
                 report_progress(f"{current_progress}Converting animation: {mod_filename}")
                 target_objects = _asset_objects(asset_map, target_asset_name, "TextAsset")
 
-                with tempfile.NamedTemporaryFile(delete=False, suffix=".skel") as tmp_skel_file:
-                    temp_skel_path = tmp_skel_file.name
-                
-                try:
-                    json_to_skel(mod_filepath, temp_skel_path)
-                    with open(temp_skel_path, 'rb') as f:
-                        skel_binary_data = f.read()
+                if json_futures:
+                    skel_binary_data, cache_hit = json_futures[i].result()
+                else:
+                    skel_binary_data, cache_hit = _convert_json_worker(mod_filepath, cache_dir=cache_dir)
+                if cache_hit:
+                    report_progress(f"{current_progress}Reused cached skel for {mod_filename}")
 
-                    for obj in target_objects:
-                        data = obj.read()
-                        data.m_Script = skel_binary_data.decode("utf-8", "surrogateescape")
-                        data.save()
-                        edited = True
-                    report_progress(f"{current_progress}Successfully replaced: {mod_filename} -> {len(target_objects)} object(s)")
-                finally:
-                    if os.path.exists(temp_skel_path):
-                        os.remove(temp_skel_path)
+                for obj in target_objects:
+                    data = obj.read()
+                    data.m_Script = skel_binary_data.decode("utf-8", "surrogateescape")
+                    data.save()
+                    edited = True
+                report_progress(f"{current_progress}Successfully replaced: {mod_filename} -> {len(target_objects)} object(s)")
                         
             except Exception as e:
                 import traceback
@@ -557,8 +843,10 @@ def repack_bundle(original_bundle_path: str, modded_assets_folder: str, output_p
             try:
                 report_progress(f"{current_progress}Replacing asset: {mod_filename}")
                 target_objects = _asset_objects(asset_map, target_asset_name, "TextAsset")
-                with open(mod_filepath, "rb") as f:
-                    new_script = f.read().decode("utf-8", "surrogateescape")
+                if mod_filepath in mod_overrides:
+                    new_script = mod_overrides[mod_filepath].decode("utf-8", "surrogateescape")
+                else:
+                    new_script = read_mod_file(mod_filepath).decode("utf-8", "surrogateescape")
 
                 for obj in target_objects:
                     data = obj.read()
@@ -573,123 +861,189 @@ def repack_bundle(original_bundle_path: str, modded_assets_folder: str, output_p
         # ========== 階段三：平行處理 ASTC 紋理壓縮 ==========
         # 優化策略：單一 Executor + 完成一個就立即寫入，控制記憶體峰值
         if png_astc_files:
-            executor_type = "Thread" if IS_ANDROID else "Process"
             total_textures = len(png_astc_files)
             
-            report_progress(f"Phase 3: Parallel ASTC compression ({total_textures} textures, {MAX_PARALLEL_TEXTURES} {executor_type} workers)...")
-            
-            block_x, block_y = 4, 4
+            astc_quality = astc_operations.ASTC_PRESETS[astc_preset]
+            # etcpak 沒有品質預設，快取鍵不含 preset
+            cache_quality = astc_preset if texture_encoder == TEXTURE_ENCODER_ASTC else None
             total_success = 0
             total_failed = 0
             completed_count = 0
             
-            # 準備所有 worker 參數
-            worker_args = [
-                (mod_filepath, target_asset_name, block_x, block_y)
-                for mod_filepath, target_asset_name in png_astc_files
-            ]
+            # 先查詢 ASTC 快取，命中的紋理不需解碼與壓縮
+            astc_cache = DiskCache(os.path.join(cache_dir or DEFAULT_CACHE_ROOT, ASTC_CACHE_SUBDIR), ASTC_CACHE_MAX_BYTES)
+            cache_keys = {}
+            texture_formats = {}
+            pending_files = []
+            cache_hits = 0
+            for mod_filepath, target_asset_name in png_astc_files:
+                mod_filename = os.path.basename(mod_filepath)
+                try:
+                    block_x, block_y, texture_format = _resolve_texture_format(asset_map, target_asset_name, astc_block_size, texture_encoder)
+                except Exception as e:
+                    total_failed += 1
+                    report_progress(f"  FAILED: {mod_filename} - could not read original format: {e}")
+                    continue
+
+                try:
+                    if mod_filepath in merged_pages:
+                        pixels, width, height = merged_pages[mod_filepath]
+                        texture_digest = f"{hash_bytes(pixels)}:{width}x{height}"
+                        del pixels
+                    else:
+                        texture_digest = _texture_digest(mod_filepath, texture_sizes.get(mod_filepath))
+                    cache_key = _astc_cache_key(texture_digest, block_x, block_y, cache_quality, True, texture_encoder)
+                    cached = _astc_cache_get(astc_cache, cache_key)
+                except OSError as e:
+                    report_progress(f"  Cache lookup failed for {mod_filename}: {e}")
+                    cache_key, cached = None, None
+
+                if cached is None:
+                    cache_keys[mod_filepath] = cache_key
+                    texture_formats[mod_filepath] = texture_format
+                    pending_files.append((mod_filepath, target_asset_name, block_x, block_y))
+                    continue
+
+                merged_pages.pop(mod_filepath, None)
+                compressed_data, width, height = cached
+                try:
+                    written = _write_compressed_texture(asset_map, target_asset_name, compressed_data, width, height, texture_format)
+                    if written:
+                        edited = True
+                    total_success += written
+                    cache_hits += 1
+                except Exception as e:
+                    total_failed += 1
+                    report_progress(f"  Write error {mod_filename}: {e}")
+                del cached, compressed_data
+
+            if cache_hits:
+                report_progress(f"  ASTC cache: {cache_hits}/{total_textures} textures reused")
+
+            if texture_encoder == TEXTURE_ENCODER_ETCPAK:
+                encoder_label = "ETC2_RGBA8 (etcpak)"
+            else:
+                encoder_label = f"ASTC, block {astc_block_size}, preset {astc_preset}"
+
+            def handle_result(result):
+                nonlocal edited, total_success, total_failed
+                mod_filename = os.path.basename(result['mod_filepath'])
+                if not result['success']:
+                    total_failed += 1
+                    report_progress(f"  FAILED: {mod_filename} - {result['error']}")
+                    return
+
+                cache_key = cache_keys.get(result['mod_filepath'])
+                if cache_key:
+                    _astc_cache_put(astc_cache, cache_key, result['compressed_data'], result['width'], result['height'])
+
+                # 立即寫入 Bundle
+                try:
+                    written = _write_compressed_texture(
+                        asset_map,
+                        result['target_asset_name'],
+                        result['compressed_data'],
+                        result['width'],
+                        result['height'],
+                        texture_formats[result['mod_filepath']],
+                    )
+                    if written:
+                        edited = True
+                    total_success += written
+                except Exception as e:
+                    total_failed += 1
+                    report_progress(f"  Write error {mod_filename}: {e}")
             
-            # 根據環境選擇 Executor
-            ExecutorClass = ThreadPoolExecutor if IS_ANDROID else ProcessPoolExecutor
+            # 準備所有 worker 參數與估算的峰值記憶體；合併頁面的像素隨參數移交，不再經過 PNG
+            # 以路徑為鍵保存尚未完成的參數，完成後即移除，讓合併頁面的像素盡早釋放
+            worker_args = {
+                mod_filepath: (mod_filepath, target_asset_name, block_x, block_y, astc_quality,
+                               merged_pages.pop(mod_filepath, None), texture_sizes.get(mod_filepath), texture_encoder)
+                for mod_filepath, target_asset_name, block_x, block_y in pending_files
+            }
+            budget = MemoryBudget(memory_budget_mb * 1024 * 1024) if memory_budget_mb else _get_texture_memory_budget()
+            estimates = {mod_filepath: _estimate_worker_memory(args) for mod_filepath, args in worker_args.items()}
+            total_pending = len(worker_args)
+
+            # 回報實際的 worker 數（批次模式為共用 executor 的大小），以及記憶體預算下平均可同時執行的數量
+            if executor is not None:
+                worker_count = executor._max_workers
+                executor_type = "Thread" if isinstance(executor, ThreadPoolExecutor) else "Process"
+            else:
+                worker_count = MAX_PARALLEL_TEXTURES
+                executor_type = "Thread" if IS_ANDROID else "Process"
+            worker_count = min(worker_count, max(1, total_pending))
+            average_estimate = sum(estimates.values()) // max(1, total_pending)
+            concurrency = min(worker_count, max(1, budget.total // max(1, average_estimate)))
+            workers_label = f"{worker_count} {executor_type} workers"
+            if concurrency < worker_count:
+                workers_label += f", ~{concurrency} at a time within the memory budget"
+            report_progress(f"Phase 3: Parallel texture compression ({len(pending_files)} textures, {workers_label}, {encoder_label})...")
+            if worker_args:
+                report_progress(f"  Memory budget: {budget.total // (1024 * 1024)} MiB")
             
             try:
-                with ExecutorClass(max_workers=MAX_PARALLEL_TEXTURES) as executor:
-                    # 一次提交所有任務
-                    future_to_args = {
-                        executor.submit(_compress_texture_worker, args): args 
-                        for args in worker_args
-                    }
-                    
-                    # 完成一個就立即處理（寫入 + 清理）
-                    for future in as_completed(future_to_args):
-                        completed_count += 1
-                        args = future_to_args[future]
-                        mod_filename = os.path.basename(args[0])
-                        
-                        try:
-                            result = future.result()
-                            
-                            if result['success']:
-                                # 立即寫入 Bundle
-                                target_asset_name = result['target_asset_name']
+                if worker_args:
+                    # 批次模式使用呼叫端共用的 executor，否則自行建立
+                    active_executor = executor or create_worker_executor()
+                    queue = deque((args, estimates.pop(mod_filepath)) for mod_filepath, args in worker_args.items())
+                    in_flight = {}
+                    try:
+                        while queue or in_flight:
+                            # 在記憶體預算內盡量提交；沒有進行中的任務時等待預算釋出，確保至少一張能執行
+                            while queue:
+                                args, estimate = queue[0]
+                                if in_flight:
+                                    if not budget.try_acquire(estimate):
+                                        break
+                                else:
+                                    budget.acquire(estimate)
+                                queue.popleft()
+                                in_flight[active_executor.submit(_compress_texture_worker, args)] = (args, estimate)
+
+                            # 完成一個就立即處理（寫入 + 清理）
+                            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                            for future in done:
+                                args, estimate = in_flight.pop(future)
+                                budget.release(estimate)
+                                completed_count += 1
+                                mod_filename = os.path.basename(args[0])
+                                del worker_args[args[0]], args
+
                                 try:
-                                    target_objects = _asset_objects(asset_map, target_asset_name, "Texture2D")
-                                    for obj in target_objects:
-                                        data = obj.read()
-                                        
-                                        data.m_TextureFormat = 48  # ASTC_RGB_4x4
-                                        data.image_data = result['compressed_data']
-                                        data.m_CompleteImageSize = len(result['compressed_data'])
-                                        data.m_Width = result['width']
-                                        data.m_Height = result['height']
-                                        data.m_MipCount = 1
-                                        
-                                        if hasattr(data, 'm_StreamData'):
-                                            data.m_StreamData.offset = 0
-                                            data.m_StreamData.size = 0
-                                            data.m_StreamData.path = ""
-                                        
-                                        data.save()
-                                        edited = True
-                                    total_success += len(target_objects)
-                                    
+                                    result = future.result()
+                                    handle_result(result)
+
+                                    # 立即清理這個結果的記憶體
+                                    del result
+
                                 except Exception as e:
                                     total_failed += 1
-                                    report_progress(f"  Write error {mod_filename}: {e}")
-                            else:
-                                total_failed += 1
-                                report_progress(f"  FAILED: {mod_filename} - {result['error']}")
-                            
-                            # 立即清理這個結果的記憶體
-                            del result
-                                
-                        except Exception as e:
-                            total_failed += 1
-                            report_progress(f"  ERROR: {mod_filename} - {str(e)}")
-                        
-                        # 定期報告進度（每 25% 或每 10 個）
-                        if total_textures <= 10 or completed_count == total_textures or completed_count % max(1, total_textures // 4) == 0:
-                            report_progress(f"  Progress: {completed_count}/{total_textures} ({100*completed_count//total_textures}%)")
-                        
-                        # 定期執行 gc（每處理 10 個紋理）
-                        if completed_count % 10 == 0:
-                            gc.collect()
+                                    report_progress(f"  ERROR: {mod_filename} - {str(e)}")
+
+                                # 定期報告進度（每 25% 或每 10 個）
+                                if total_pending <= 10 or completed_count == total_pending or completed_count % max(1, total_pending // 4) == 0:
+                                    report_progress(f"  Progress: {completed_count}/{total_pending} ({100*completed_count//total_pending}%)")
+
+                                # 定期執行 gc（每處理 10 個紋理）
+                                if completed_count % 10 == 0:
+                                    gc.collect()
+                    finally:
+                        for _, estimate in in_flight.values():
+                            budget.release(estimate)
+                        if active_executor is not executor:
+                            active_executor.shutdown()
                             
             except Exception as e:
                 report_progress(f"Executor failed, falling back to sequential: {e}")
-                # 回退到序列處理
-                for args in worker_args:
+                # 回退到序列處理（只處理尚未完成的紋理）
+                for mod_filepath in list(worker_args):
+                    args = worker_args.pop(mod_filepath)
                     completed_count += 1
                     result = _compress_texture_worker(args)
+                    handle_result(result)
                     
-                    if result['success']:
-                        target_asset_name = result['target_asset_name']
-                        mod_filename = os.path.basename(result['mod_filepath'])
-                        try:
-                            target_objects = _asset_objects(asset_map, target_asset_name, "Texture2D")
-                            for obj in target_objects:
-                                data = obj.read()
-                                data.m_TextureFormat = 48
-                                data.image_data = result['compressed_data']
-                                data.m_CompleteImageSize = len(result['compressed_data'])
-                                data.m_Width = result['width']
-                                data.m_Height = result['height']
-                                data.m_MipCount = 1
-                                if hasattr(data, 'm_StreamData'):
-                                    data.m_StreamData.offset = 0
-                                    data.m_StreamData.size = 0
-                                    data.m_StreamData.path = ""
-                                data.save()
-                                edited = True
-                            total_success += len(target_objects)
-                        except Exception as e:
-                            total_failed += 1
-                    else:
-                        total_failed += 1
-                        mod_filename = os.path.basename(args[0])
-                        report_progress(f"  FAILED (seq): {mod_filename} - {result['error']}")
-                    
-                    del result
+                    del result, args
                     if completed_count % 10 == 0:
                         gc.collect()
             
@@ -698,7 +1052,7 @@ def repack_bundle(original_bundle_path: str, modded_assets_folder: str, output_p
             gc.collect()
             
             # 最終報告
-            report_progress(f"  ASTC compression complete: {total_success} success, {total_failed} failed")
+            report_progress(f"  Texture compression complete: {total_success} success, {total_failed} failed")
         
         # ========== 處理 RGBA32 紋理 (不需壓縮，序列處理) ==========
         if png_rgba_files:
@@ -712,7 +1066,15 @@ def repack_bundle(original_bundle_path: str, modded_assets_folder: str, output_p
                 try:
                     report_progress(f"{current_progress}Processing: {mod_filename}")
                     target_objects = _asset_objects(asset_map, target_asset_name, "Texture2D")
-                    pil_img = Image.open(mod_filepath).convert("RGBA")
+                    if mod_filepath in merged_pages:
+                        pixels, width, height = merged_pages.pop(mod_filepath)
+                        pil_img = Image.frombuffer("RGBA", (width, height), pixels, "raw", "RGBA", 0, -1)
+                        del pixels
+                    else:
+                        with open_mod_file(mod_filepath) as f, Image.open(f) as src_img:
+                            pil_img = src_img.convert("RGBA")
+                        if mod_filepath in texture_sizes:
+                            pil_img = _downscale_image(pil_img, texture_sizes[mod_filepath])
 
                     for obj in target_objects:
                         data = obj.read()
@@ -740,14 +1102,37 @@ def repack_bundle(original_bundle_path: str, modded_assets_folder: str, output_p
         
         del asset_map
         del mod_files
+        del merged_pages
         gc.collect()
 
-        if edited:
+        if edited and not getattr(env.file, "is_changed", True):
+            # 所有 mod 內容都與 bundle 中的資料相同（例如重複安裝同一個 mod），略過重新壓縮
+            report_progress("All modded assets already match the bundle, reusing the original file...")
+            try:
+                if os.path.abspath(original_bundle_path) != os.path.abspath(output_path):
+                    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+                    shutil.copyfile(original_bundle_path, output_path)
+                report_progress("Saved successfully!")
+                return True, "Bundle already contains these mod files; original file reused."
+            except Exception as e:
+                error_msg = f"Error saving bundle: {e}"
+                report_progress(error_msg)
+                return False, error_msg
+        elif edited:
             report_progress("Saving modified game file...")
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
             try:
+                # delta 存檔時會邊寫邊讀取原始檔案，輸出到原檔時改為完整重新壓縮
+                delta = not (os.path.exists(output_path) and os.path.samefile(original_bundle_path, output_path))
                 with open(output_path, "wb") as f:
-                    env.file.save(f, packer="lz4")
+                    # delta: 未修改的檔案（如 .resS、未動到的 CAB）直接沿用原始壓縮區塊
+                    env.file.save(
+                        f,
+                        packer="lz4",
+                        max_workers=SAVE_COMPRESSION_WORKERS,
+                        compression_level=compression_level,
+                        delta=delta,
+                    )
                 report_progress("Saved successfully!")
                 return True, "Repack completed successfully."
             except Exception as e:
@@ -767,4 +1152,222 @@ def repack_bundle(original_bundle_path: str, modded_assets_folder: str, output_p
     finally:
         if env is not None:
             del env
+        # 批次模式下其他工作可能仍在讀取同一封存檔，由 repack_batch 結束時統一關閉
+        if executor is None:
+            close_archives(modded_assets_folder)
+        gc.collect()
+
+
+def _plan_texture_cost(pixels, block_x, block_y, astc_preset, use_astc, texture_encoder=DEFAULT_TEXTURE_ENCODER):
+    """依像素數估算單張紋理的 CPU 時間（毫秒）。"""
+    decode_ms = pixels / (_PLAN_PNG_DECODE_MPIX_PER_SEC * 1e6) * 1000
+    if not use_astc:
+        return decode_ms
+    if texture_encoder == TEXTURE_ENCODER_ETCPAK:
+        return decode_ms + pixels / (_PLAN_ETCPAK_MPIX_PER_SEC * 1e6) * 1000
+    # 編碼成本大致與區塊數成正比，以 4x4 為基準換算
+    block_scale = (block_x * block_y) / 16
+    encode_ms = pixels / (_PLAN_ASTC_MPIX_PER_SEC[astc_preset] * 1e6 * block_scale) * 1000
+    return decode_ms + encode_ms
+
+
+def _plan_texture_memory(pixels, block_x, block_y, is_rgba, use_astc):
+    """與 _estimate_texture_memory 相同的估算方式，但只需像素數。"""
+    rgba_bytes = pixels * 4
+    estimate = rgba_bytes * 2
+    if use_astc:
+        estimate += (pixels // (block_x * block_y) + 1) * 16
+    if not is_rgba:
+        estimate += rgba_bytes
+    return estimate
+
+
+def plan_repack(original_bundle_path: str, modded_assets_folder: str, use_astc: bool = True, cache_dir=None,
+                astc_block_size: str = DEFAULT_ASTC_BLOCK_SIZE, astc_preset: str = DEFAULT_ASTC_PRESET,
+                max_texture_size: int = None, texture_encoder: str = DEFAULT_TEXTURE_ENCODER):
+    """
+    不解碼、不壓縮，只規劃 repack_bundle 會做的工作並估算成本。
+
+    執行與 repack_bundle 相同的 Spine 合併判斷與檔案分類，紋理尺寸只讀取 PNG 標頭，
+    並查詢 ASTC 與 .skel 快取標示可直接沿用的結果。mod 來源與 repack_bundle 相同，不會被修改。
+    指定 max_texture_size 時，紋理尺寸與成本以縮小後的尺寸計算；texture_encoder 與 repack_bundle 相同，
+    實際使用的編碼後端記錄在 plan 的 texture_encoder。
+
+    Returns a tuple: (success: bool, plan: dict or error message: str)
+    plan 包含：
+        items: 每個工作項目 {type, file, target, objects, width, height, pixels, cached,
+               estimated_cpu_ms, estimated_memory_bytes}，type 為 json/astc/etc2/rgba/text
+        spine_merges: 每個 Spine mod 的 {name, mod_textures, original_textures, merge}
+        unmatched: 找不到對應資產、會被略過的檔案
+        totals: 總 CPU 時間、以 cpu_cores 平行時的預估時間、單項最大記憶體用量
+    """
+    if astc_block_size not in ASTC_BLOCK_SIZES and astc_block_size != ASTC_BLOCK_SIZE_ORIGINAL:
+        return False, f"Unsupported ASTC block size: {astc_block_size}"
+    if astc_preset not in astc_operations.ASTC_PRESETS:
+        return False, f"Unsupported ASTC preset: {astc_preset}"
+    if texture_encoder not in TEXTURE_ENCODERS:
+        return False, f"Unsupported texture encoder: {texture_encoder}"
+    texture_encoder = _effective_texture_encoder(texture_encoder)
+    compressed_type = "etc2" if texture_encoder == TEXTURE_ENCODER_ETCPAK else "astc"
+    cache_quality = astc_preset if texture_encoder == TEXTURE_ENCODER_ASTC else None
+
+    env = None
+    try:
+        env = UnityPy.load(original_bundle_path)
+        file_index = _build_file_index(modded_assets_folder)
+        asset_map = _build_asset_map(env)
+
+        # --- Spine 合併判斷：合併後的頁面尚不存在，依 atlas 試排版得出頁面尺寸 ---
+        spine_merges = []
+        merged_pages = {}  # 原始頁面資產名稱 -> 估算的像素數
+        merged_sources = set()
+        if file_index['skel_json']:
+            spine_texture_counts = _count_spine_textures(asset_map)
+            for spine_base_name, (_, _, mod_dir_path) in file_index['skel_json'].items():
+                original_texture_count = spine_texture_counts.get(spine_base_name.lower(), 0)
+                mod_pages, atlas_path = _spine_mod_files(file_index, file_index['all_files'], mod_dir_path, spine_base_name)
+                needs_merge = _needs_spine_merge(len(mod_pages), original_texture_count)
+                spine_merges.append({
+                    "name": spine_base_name,
+                    "mod_textures": len(mod_pages),
+                    "original_textures": original_texture_count,
+                    "merge": needs_merge,
+                })
+                if not needs_merge:
+                    continue
+                page_sizes = {}
+                for page_path in mod_pages:
+                    header = _read_png_header(page_path)
+                    if header:
+                        page_sizes[os.path.basename(page_path)] = header[:2]
+                    merged_sources.add(page_path)
+                atlas, err = load_atlas(atlas_path) if atlas_path else (None, "Atlas file not found")
+                layout = None
+                if not err:
+                    layout, err = layout_atlas_pages(atlas, page_sizes, [f"page_{i}" for i in range(original_texture_count)])
+                if layout:
+                    page_pixels = []
+                    for page in layout['atlas'].pages:
+                        width, height = (_capped_texture_size(page.width, page.height, max_texture_size)
+                                         or (page.width, page.height))
+                        page_pixels.append(width * height)
+                else:
+                    # 無法排版時以原始頁數平分總像素估算
+                    total_pixels = sum(width * height for width, height in page_sizes.values())
+                    page_pixels = [total_pixels // original_texture_count] * original_texture_count
+                for i, pixels in enumerate(page_pixels):
+                    page_name = spine_base_name if i == 0 else f"{spine_base_name}_{i + 1}"
+                    merged_pages[page_name.lower()] = pixels
+
+        mod_files = [
+            path for path in file_index['all_files']
+            if path not in merged_sources
+        ]
+        json_files, png_astc_files, png_rgba_files, text_files = _categorize_mod_files(mod_files, asset_map, use_astc)
+
+        items = []
+
+        skel_cache = open_skel_cache(cache_dir)
+        for mod_filepath, target_asset_name in json_files:
+            size = mod_file_size(mod_filepath)
+            cached = skel_cache.contains(skel_cache_key(hash_mod_file(mod_filepath)))
+            items.append({
+                "type": "json",
+                "file": mod_filepath,
+                "target": target_asset_name,
+                "objects": len(_asset_objects(asset_map, target_asset_name, "TextAsset")),
+                "cached": cached,
+                "estimated_cpu_ms": 0.0 if cached else round(size / (_PLAN_JSON_MB_PER_SEC * 1024 * 1024) * 1000, 1),
+                "estimated_memory_bytes": 0 if cached else size * _PLAN_JSON_MEMORY_FACTOR,
+            })
+
+        for mod_filepath, target_asset_name in text_files:
+            size = mod_file_size(mod_filepath)
+            items.append({
+                "type": "text",
+                "file": mod_filepath,
+                "target": target_asset_name,
+                "objects": len(_asset_objects(asset_map, target_asset_name, "TextAsset")),
+                "estimated_cpu_ms": 0.0,
+                "estimated_memory_bytes": size,
+            })
+
+        astc_cache = None
+        if use_astc:
+            astc_cache = DiskCache(os.path.join(cache_dir or DEFAULT_CACHE_ROOT, ASTC_CACHE_SUBDIR), ASTC_CACHE_MAX_BYTES)
+
+        def add_texture_item(mod_filepath, target_asset_name, width, height, pixels, is_rgba, cached):
+            block_x, block_y = 4, 4
+            if use_astc:
+                block_x, block_y, _ = _resolve_texture_format(asset_map, target_asset_name, astc_block_size, texture_encoder)
+            items.append({
+                "type": compressed_type if use_astc else "rgba",
+                "file": mod_filepath,
+                "target": target_asset_name,
+                "objects": len(_asset_objects(asset_map, target_asset_name, "Texture2D")),
+                "width": width,
+                "height": height,
+                "pixels": pixels,
+                "cached": cached,
+                "estimated_cpu_ms": 0.0 if cached else round(_plan_texture_cost(pixels, block_x, block_y, astc_preset, use_astc, texture_encoder), 1),
+                "estimated_memory_bytes": 0 if cached else _plan_texture_memory(pixels, block_x, block_y, is_rgba, use_astc),
+            })
+            return block_x, block_y
+
+        for mod_filepath, target_asset_name in png_astc_files + png_rgba_files:
+            header = _read_png_header(mod_filepath)
+            width, height, mode = header if header else (0, 0, None)
+            target_size = _capped_texture_size(width, height, max_texture_size)
+            if target_size:
+                width, height = target_size
+            cached = False
+            if astc_cache is not None:
+                block_x, block_y, _ = _resolve_texture_format(asset_map, target_asset_name, astc_block_size, texture_encoder)
+                cached = astc_cache.contains(_astc_cache_key(_texture_digest(mod_filepath, target_size), block_x, block_y,
+                                                             cache_quality, True, texture_encoder))
+            add_texture_item(mod_filepath, target_asset_name, width, height, width * height, mode == "RGBA", cached)
+
+        # 合併後的頁面：尺寸在合併前無法得知，只提供像素數
+        for target_asset_name, pixels in merged_pages.items():
+            if _asset_objects(asset_map, target_asset_name, "Texture2D"):
+                add_texture_item(None, target_asset_name, None, None, pixels, True, False)
+
+        matched = {item["file"] for item in items}
+        unmatched = [path for path in mod_files if path not in matched]
+
+        # JSON 與紋理在 worker 中平行處理；文字替換在主執行緒
+        cpu_cores = MAX_PARALLEL_TEXTURES
+        total_cpu_ms = sum(item["estimated_cpu_ms"] for item in items)
+        parallel_costs = [item["estimated_cpu_ms"] for item in items if item["type"] in ("json", "astc", "etc2")]
+        parallel_ms = sum(parallel_costs)
+        longest_ms = max(parallel_costs, default=0.0)
+        plan = {
+            "bundle": original_bundle_path,
+            "use_astc": use_astc,
+            "astc_block_size": astc_block_size,
+            "astc_preset": astc_preset,
+            "texture_encoder": texture_encoder,
+            "items": items,
+            "spine_merges": spine_merges,
+            "unmatched": unmatched,
+            "totals": {
+                "items": len(items),
+                "cached_textures": sum(1 for item in items if item.get("cached") and item["type"] in ("astc", "etc2", "rgba")),
+                "cached_skeletons": sum(1 for item in items if item.get("cached") and item["type"] == "json"),
+                "estimated_cpu_ms": round(total_cpu_ms, 1),
+                # 平行部分受限於最長的單一項目
+                "estimated_wall_ms": round(max(longest_ms, parallel_ms / cpu_cores) + (total_cpu_ms - parallel_ms), 1),
+                "peak_item_memory_bytes": max((item["estimated_memory_bytes"] for item in items), default=0),
+                "cpu_cores": cpu_cores,
+            },
+        }
+        return True, plan
+
+    except Exception:
+        import traceback
+        return False, traceback.format_exc()
+    finally:
+        if env is not None:
+            del env
+        close_archives(modded_assets_folder)
         gc.collect()
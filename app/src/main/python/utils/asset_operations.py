@@ -0,0 +1,30 @@
+"""Unity object helpers shared by the repacker and the bundle indexer."""
+from typing import Optional
+
+
+def read_object_name(obj) -> Optional[str]:
+    """
+    Read m_Name directly from the raw object data, skipping full deserialization.
+
+    For Texture2D, TextAsset and Sprite, m_Name is the first serialized field.
+    Unity string format: [int32 length][UTF-8 bytes][padding to 4-byte align]
+
+    Reading only the name skips parsing texture image data, script content,
+    sprite meshes, etc., which is the vast majority of the data.
+
+    Args:
+        obj: UnityPy ObjectReader
+
+    Returns:
+        The object name, or None if it could not be read
+    """
+    try:
+        obj.reset()  # seek reader to object's byte_start
+        return obj.reader.read_aligned_string()
+    except Exception:
+        # Fallback: full deserialization (slow but guaranteed correct)
+        try:
+            data = obj.read()
+            return getattr(data, "m_Name", None)
+        except Exception:
+            return None
@@ -0,0 +1,393 @@
+"""Shared libastcenc bindings with a reusable context pool for BDroid_X."""
+import ctypes
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from ctypes import POINTER, Structure, byref, c_char_p, c_float, c_int, c_size_t, c_ubyte, c_uint, c_void_p
+from typing import Optional, Tuple
+
+ASTCENC_SUCCESS = 0
+ASTCENC_PRF_LDR_SRGB = 0
+ASTCENC_PRE_FASTEST = 0.0
+ASTCENC_PRE_FAST = 10.0
+ASTCENC_PRE_MEDIUM = 60.0
+ASTCENC_PRE_THOROUGH = 98.0
+ASTCENC_TYPE_U8 = 0
+ASTCENC_FLG_USE_DECODE_UNORM8 = 1 << 1
+ASTCENC_FLG_DECOMPRESS_ONLY = 1 << 4
+
+# Speed presets selectable from the repack API
+ASTC_PRESETS = {
+    "fastest": ASTCENC_PRE_FASTEST,
+    "fast": ASTCENC_PRE_FAST,
+    "medium": ASTCENC_PRE_MEDIUM,
+    "thorough": ASTCENC_PRE_THOROUGH,
+}
+
+# Idle contexts kept per (profile, block size, quality, flags, threads) key.
+# Each context owns per-thread working buffers, so the pool is kept small.
+MAX_IDLE_CONTEXTS_PER_KEY = 2
+
+
+class astcenc_swizzle(Structure):
+    _fields_ = [("r", c_uint), ("g", c_uint), ("b", c_uint), ("a", c_uint)]
+
+
+class astcenc_config(Structure):
+    _fields_ = [
+        ("profile", c_uint), ("flags", c_uint), ("block_x", c_uint),
+        ("block_y", c_uint), ("block_z", c_uint), ("cw_r_weight", c_float),
+        ("cw_g_weight", c_float), ("cw_b_weight", c_float), ("cw_a_weight", c_float),
+        ("a_scale_radius", c_uint), ("rgbm_m_scale", c_float),
+        ("tune_partition_count_limit", c_uint), ("tune_2partition_index_limit", c_uint),
+        ("tune_3partition_index_limit", c_uint), ("tune_4partition_index_limit", c_uint),
+        ("tune_block_mode_limit", c_uint), ("tune_refinement_limit", c_uint),
+        ("tune_candidate_limit", c_uint), ("tune_2partitioning_candidate_limit", c_uint),
+        ("tune_3partitioning_candidate_limit", c_uint), ("tune_4partitioning_candidate_limit", c_uint),
+        ("tune_db_limit", c_float), ("tune_mse_overshoot", c_float),
+        ("tune_2partition_early_out_limit_factor", c_float), ("tune_3partition_early_out_limit_factor", c_float),
+        ("tune_2plane_early_out_limit_correlation", c_float), ("tune_search_mode0_enable", c_float),
+        ("progress_callback", c_void_p),
+    ]
+
+
+class astcenc_image(Structure):
+    _fields_ = [
+        ("dim_x", c_uint), ("dim_y", c_uint), ("dim_z", c_uint),
+        ("data_type", c_uint), ("data", POINTER(c_void_p)),
+    ]
+
+
+_astcenc_lib = None
+_load_lock = threading.Lock()
+
+
+def load_library():
+    """
+    Load libastcenc.so once per process and declare the used signatures.
+
+    Returns:
+        The ctypes library handle, or None if it cannot be loaded
+    """
+    global _astcenc_lib
+    with _load_lock:
+        if _astcenc_lib is not None:
+            return _astcenc_lib if _astcenc_lib else None
+
+        try:
+            lib = ctypes.cdll.LoadLibrary("libastcenc.so")
+        except OSError as e:
+            print(f"FATAL: Could not load libastcenc.so. Make sure it's in jniLibs. Error: {e}")
+            _astcenc_lib = False
+            return None
+
+        lib.astcenc_config_init.argtypes = [c_uint, c_uint, c_uint, c_uint, c_float, c_uint, POINTER(astcenc_config)]
+        lib.astcenc_config_init.restype = c_int
+
+        lib.astcenc_context_alloc.argtypes = [POINTER(astcenc_config), c_uint, POINTER(c_void_p)]
+        lib.astcenc_context_alloc.restype = c_int
+
+        lib.astcenc_compress_image.argtypes = [c_void_p, POINTER(astcenc_image), POINTER(astcenc_swizzle), POINTER(c_ubyte), c_size_t, c_uint]
+        lib.astcenc_compress_image.restype = c_int
+
+        lib.astcenc_compress_reset.argtypes = [c_void_p]
+        lib.astcenc_compress_reset.restype = c_int
+
+        lib.astcenc_decompress_image.argtypes = [c_void_p, POINTER(c_ubyte), c_size_t, POINTER(astcenc_image), POINTER(astcenc_swizzle), c_uint]
+        lib.astcenc_decompress_image.restype = c_int
+
+        lib.astcenc_decompress_reset.argtypes = [c_void_p]
+        lib.astcenc_decompress_reset.restype = c_int
+
+        lib.astcenc_context_free.argtypes = [c_void_p]
+        lib.astcenc_context_free.restype = None
+
+        lib.astcenc_get_error_string.argtypes = [c_int]
+        lib.astcenc_get_error_string.restype = c_char_p
+
+        _astcenc_lib = lib
+        return _astcenc_lib
+
+
+def get_error_string(status: int) -> str:
+    lib = load_library()
+    if not lib:
+        return "astcenc library not loaded"
+    return lib.astcenc_get_error_string(status).decode('utf-8')
+
+
+class ThreadBudget:
+    """
+    Process-wide budget of encoder threads shared by concurrent (de)compressions.
+
+    Every caller is granted at least one thread; larger grants are split fairly
+    between the callers that are currently active or waiting.
+    """
+
+    def __init__(self, total: int):
+        self.total = max(1, total)
+        self._in_use = 0
+        self._users = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, wanted: Optional[int] = None) -> int:
+        """
+        Block until at least one thread is free and return the granted count.
+
+        Args:
+            wanted: Upper bound on the threads the caller can use (None = any)
+
+        Returns:
+            Number of granted threads, to be given back with release()
+        """
+        with self._cond:
+            self._users += 1
+            while self._in_use >= self.total:
+                self._cond.wait()
+            fair_share = max(1, self.total // self._users)
+            granted = min(self.total - self._in_use, fair_share, wanted or self.total)
+            self._in_use += granted
+            return granted
+
+    def release(self, granted: int):
+        with self._cond:
+            self._in_use -= granted
+            self._users -= 1
+            self._cond.notify_all()
+
+
+class ContextPool:
+    """
+    Pool of astcenc contexts keyed by (profile, block size, quality, flags, threads).
+
+    astcenc_config_init and astcenc_context_alloc are expensive (the context
+    precomputes block mode tables), so contexts are reset and reused instead of
+    being freed after every texture.
+    """
+
+    def __init__(self):
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, lib, key) -> Tuple[Optional[c_void_p], Optional[str]]:
+        """
+        Take an idle context for key or allocate a new one.
+
+        Returns:
+            Tuple of (context, error message)
+        """
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop(), None
+
+        profile, block_x, block_y, quality, flags, thread_count = key
+        config = astcenc_config()
+        status = lib.astcenc_config_init(profile, block_x, block_y, 1, quality, flags, byref(config))
+        if status != ASTCENC_SUCCESS:
+            return None, f"astcenc_config_init failed: {get_error_string(status)}"
+
+        context = c_void_p()
+        status = lib.astcenc_context_alloc(byref(config), thread_count, byref(context))
+        if status != ASTCENC_SUCCESS:
+            return None, f"astcenc_context_alloc failed: {get_error_string(status)}"
+        return context, None
+
+    def release(self, lib, key, context):
+        """Return a context that has been reset; extra idle contexts are freed."""
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < MAX_IDLE_CONTEXTS_PER_KEY:
+                idle.append(context)
+                return
+        lib.astcenc_context_free(context)
+
+    def discard(self, lib, context):
+        """Free a context that must not be reused (e.g. after a failed call)."""
+        lib.astcenc_context_free(context)
+
+    def clear(self):
+        """Free every idle context."""
+        lib = load_library()
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        if not lib:
+            return
+        for contexts in idle.values():
+            for context in contexts:
+                lib.astcenc_context_free(context)
+
+
+thread_budget = ThreadBudget(os.cpu_count() or 1)
+context_pool = ContextPool()
+_helper_executor = None
+_helper_lock = threading.Lock()
+
+
+def set_thread_budget(total: int):
+    """
+    Replace the process-wide thread budget.
+
+    Used as a ProcessPoolExecutor initializer so that N worker processes
+    split the cores instead of each assuming it owns all of them.
+    """
+    global thread_budget
+    thread_budget = ThreadBudget(total)
+
+
+def _reset_after_fork():
+    """
+    Drop threading state inherited from the parent in a forked child.
+
+    The helper executor's threads do not exist in the child and any lock may
+    have been copied while held, so everything is recreated lazily. Idle
+    contexts are copies of the parent's and are simply forgotten.
+    """
+    global thread_budget, context_pool, _helper_executor, _helper_lock, _load_lock
+    _load_lock = threading.Lock()
+    _helper_lock = threading.Lock()
+    _helper_executor = None
+    context_pool = ContextPool()
+    thread_budget = ThreadBudget(thread_budget.total)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _get_helper_executor():
+    global _helper_executor
+    with _helper_lock:
+        if _helper_executor is None:
+            _helper_executor = ThreadPoolExecutor(max_workers=max(1, (os.cpu_count() or 1) - 1), thread_name_prefix="astcenc")
+        return _helper_executor
+
+
+def _run_on_threads(func, thread_count: int) -> int:
+    """
+    Call func(thread_index) on thread_count threads and return the first error status.
+
+    The calling thread runs index 0; ctypes releases the GIL during the
+    native call, so the helper threads encode in parallel.
+    """
+    if thread_count <= 1:
+        return func(0)
+    executor = _get_helper_executor()
+    futures = [executor.submit(func, i) for i in range(1, thread_count)]
+    statuses = [func(0)] + [f.result() for f in futures]
+    return next((s for s in statuses if s != ASTCENC_SUCCESS), ASTCENC_SUCCESS)
+
+
+def compress_image(image_bytes, width: int, height: int, block_x: int, block_y: int,
+                   quality: float = ASTCENC_PRE_MEDIUM) -> Tuple[Optional[bytearray], Optional[str]]:
+    """
+    Compress an RGBA8 image to ASTC using a pooled context.
+
+    Args:
+        image_bytes: Raw RGBA8 pixels, rows in the order they should be encoded
+        width: Image width in pixels
+        height: Image height in pixels
+        block_x: ASTC block width
+        block_y: ASTC block height
+        quality: astcenc quality preset value
+
+    Returns:
+        Tuple of (compressed bytearray, error message)
+    """
+    lib = load_library()
+    if not lib:
+        return None, "libastcenc.so could not be loaded."
+
+    image_data_p = (c_void_p * 1)()
+    image_data_p[0] = ctypes.cast(image_bytes, c_void_p)
+
+    image = astcenc_image()
+    image.dim_x = width
+    image.dim_y = height
+    image.dim_z = 1
+    image.data_type = ASTCENC_TYPE_U8
+    image.data = image_data_p
+
+    swizzle = astcenc_swizzle(r=0, g=1, b=2, a=3)
+
+    blocks_x = (width + block_x - 1) // block_x
+    blocks_y = (height + block_y - 1) // block_y
+    buf_size = blocks_x * blocks_y * 16
+    # The encoder writes straight into the returned bytearray, so the result
+    # can be stored in Texture2D.image_data without another full-size copy.
+    comp_data = bytearray(buf_size)
+    comp_buf = (c_ubyte * buf_size).from_buffer(comp_data)
+
+    thread_count = thread_budget.acquire()
+    try:
+        key = (ASTCENC_PRF_LDR_SRGB, block_x, block_y, quality, ASTCENC_FLG_USE_DECODE_UNORM8, thread_count)
+        context, err = context_pool.acquire(lib, key)
+        if err:
+            return None, err
+
+        status = _run_on_threads(
+            lambda i: lib.astcenc_compress_image(context, byref(image), byref(swizzle), comp_buf, buf_size, i),
+            thread_count,
+        )
+        if status != ASTCENC_SUCCESS or lib.astcenc_compress_reset(context) != ASTCENC_SUCCESS:
+            context_pool.discard(lib, context)
+        else:
+            context_pool.release(lib, key, context)
+    finally:
+        thread_budget.release(thread_count)
+
+    del comp_buf
+    if status != ASTCENC_SUCCESS:
+        return None, f"astcenc_compress_image failed: {get_error_string(status)}"
+
+    return comp_data, None
+
+
+def decompress_image(image_data, width: int, height: int, block_x: int, block_y: int) -> Tuple[Optional[bytes], Optional[str]]:
+    """
+    Decompress ASTC data to RGBA8 using a pooled decompress-only context.
+
+    Returns:
+        Tuple of (RGBA8 bytes, error message)
+    """
+    lib = load_library()
+    if not lib:
+        return None, "libastcenc.so not loaded."
+
+    decompressed_buffer = (c_ubyte * (width * height * 4))()
+    image_out_p = (c_void_p * 1)()
+    image_out_p[0] = ctypes.cast(decompressed_buffer, c_void_p)
+
+    image_out = astcenc_image()
+    image_out.dim_x = width
+    image_out.dim_y = height
+    image_out.dim_z = 1
+    image_out.data_type = ASTCENC_TYPE_U8
+    image_out.data = image_out_p
+
+    swizzle = astcenc_swizzle(r=0, g=1, b=2, a=3)
+    comp_buf = (c_ubyte * len(image_data)).from_buffer_copy(image_data)
+
+    thread_count = thread_budget.acquire()
+    try:
+        flags = ASTCENC_FLG_USE_DECODE_UNORM8 | ASTCENC_FLG_DECOMPRESS_ONLY
+        key = (ASTCENC_PRF_LDR_SRGB, block_x, block_y, ASTCENC_PRE_MEDIUM, flags, thread_count)
+        context, err = context_pool.acquire(lib, key)
+        if err:
+            return None, err
+
+        status = _run_on_threads(
+            lambda i: lib.astcenc_decompress_image(context, comp_buf, len(image_data), byref(image_out), byref(swizzle), i),
+            thread_count,
+        )
+        if status != ASTCENC_SUCCESS or lib.astcenc_decompress_reset(context) != ASTCENC_SUCCESS:
+            context_pool.discard(lib, context)
+        else:
+            context_pool.release(lib, key, context)
+    finally:
+        thread_budget.release(thread_count)
+
+    if status != ASTCENC_SUCCESS:
+        return None, f"astcenc_decompress_image failed: {get_error_string(status)}"
+
+    return bytes(decompressed_buffer), None
@@ -1,54 +1,420 @@
-"""Atlas file parsing utilities for BDroid_X."""
-import re
-from typing import Dict, Optional, Tuple
-
-
-def parse_atlas_file(atlas_path: str) -> Tuple[Optional[Dict], Optional[str]]:
-    """
-    Parse a .atlas file into a structured dictionary.
-    
-    Args:
-        atlas_path: Path to the .atlas file
-        
-    Returns:
-        Tuple of (atlas_database dict, error message)
-        If successful, returns (dict, None)
-        If failed, returns (None, error_message)
-    """
-    atlas_database = {}
-    
-    try:
-        with open(atlas_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-    except FileNotFoundError:
-        return None, f"Atlas file not found at {atlas_path}"
-    except Exception as e:
-        return None, f"Error reading atlas file: {e}"
-
-    # Split content into blocks (one per PNG image)
-    blocks = re.split(r'\n(?=[^\n]+\.png\n)', content.strip())
-    
-    for block_text in blocks:
-        block_text = block_text.strip()
-        if not block_text:
-            continue
-        
-        lines = block_text.split('\n')
-        block_name = lines[0]
-        
-        data = {'sprites': [], 'filter_line': ' filter: Linear, Linear'}
-        sprite_lines = []
-        
-        for line in lines[1:]:
-            stripped_line = line.strip()
-            if stripped_line.startswith('size:'):
-                data['size_line'] = line
-            elif stripped_line.startswith('filter:'):
-                data['filter_line'] = line
-            else:
-                sprite_lines.append(line)
-
-        data['sprites'] = '\n'.join(sprite_lines)
-        atlas_database[block_name] = data
-    
-    return atlas_database, None
+"""Spine atlas model, parsing and page repacking utilities for BDroid_X."""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils.mod_source import open_mod_text
+from utils.rect_packer import MAX_PAGE_SIZE, pack_rects
+
+# Empty pixels kept between repacked regions so texture filtering and block
+# compression do not bleed neighbouring regions into each other
+REGION_PADDING = 2
+
+# Region properties holding pixel sizes that scale with the page (nine-patch data)
+_SCALED_REGION_PROPERTIES = ('split', 'pad')
+
+# Atlas text formats: Spine 3 (xy/size/orig/offset) and Spine 4 (bounds/offsets)
+ATLAS_FORMAT_SPINE3 = 3
+ATLAS_FORMAT_SPINE4 = 4
+
+
+def _parse_ints(value: str) -> List[int]:
+    # int() ignores the spaces around each number
+    return list(map(int, value.split(',')))
+
+
+def _scale_span(start: int, length: int, factor: float) -> Tuple[int, int]:
+    """Scale a pixel span so that adjacent spans stay adjacent after rounding."""
+    new_start = round(start * factor)
+    new_length = round((start + length) * factor) - new_start
+    return new_start, max(1, new_length) if length else 0
+
+
+class AtlasRegion:
+    """
+    One region of an atlas page.
+
+    x, y, width and height are the Spine 4 bounds; width and height are the
+    unrotated size, so a region rotated by 90 or 270 degrees occupies
+    height x width pixels on the page. offsets is (x, y, original width,
+    original height) or None when the region was not whitespace-stripped.
+    """
+
+    __slots__ = ('name', 'x', 'y', 'width', 'height', 'offsets', 'degrees', 'properties')
+
+    def __init__(self, name: str):
+        self.name = name
+        self.x = self.y = self.width = self.height = None
+        self.offsets = None
+        self.degrees = 0
+        self.properties = []  # other (key, value) pairs, in file order
+
+    @property
+    def has_bounds(self) -> bool:
+        return self.width is not None
+
+    @property
+    def rotated(self) -> bool:
+        return self.degrees % 180 == 90
+
+    def footprint(self) -> Tuple[int, int, int, int]:
+        """Area the region occupies on its page as (x, y, width, height)."""
+        if self.rotated:
+            return self.x, self.y, self.height, self.width
+        return self.x, self.y, self.width, self.height
+
+    def copy(self) -> 'AtlasRegion':
+        region = AtlasRegion(self.name)
+        region.x, region.y, region.width, region.height = self.x, self.y, self.width, self.height
+        region.offsets = self.offsets
+        region.degrees = self.degrees
+        region.properties = list(self.properties)
+        return region
+
+    def _set_property(self, key: str, value: str):
+        if key == 'bounds':
+            self.x, self.y, self.width, self.height = _parse_ints(value)
+        elif key == 'xy':  # Spine 3 format
+            self.x, self.y = _parse_ints(value)
+        elif key == 'size':  # Spine 3 format
+            self.width, self.height = _parse_ints(value)
+        elif key == 'offsets':
+            self.offsets = tuple(_parse_ints(value))
+        elif key == 'orig':  # Spine 3 format
+            original_width, original_height = _parse_ints(value)
+            offset_x, offset_y = self.offsets[:2] if self.offsets else (0, 0)
+            self.offsets = (offset_x, offset_y, original_width, original_height)
+        elif key == 'offset':  # Spine 3 format
+            offset_x, offset_y = _parse_ints(value)
+            original = self.offsets[2:] if self.offsets else (self.width or 0, self.height or 0)
+            self.offsets = (offset_x, offset_y) + tuple(original)
+        elif key == 'rotate':
+            rotate = value.lower()
+            if rotate == 'true':
+                self.degrees = 90
+            elif rotate == 'false':
+                self.degrees = 0
+            else:
+                self.degrees = int(rotate)
+        else:
+            self.properties.append((key, value))
+
+    def _lines(self, atlas_format: int = ATLAS_FORMAT_SPINE4) -> List[str]:
+        if atlas_format == ATLAS_FORMAT_SPINE3:
+            return self._spine3_lines()
+        lines = [self.name]
+        if self.has_bounds:
+            lines.append(f"bounds:{self.x},{self.y},{self.width},{self.height}")
+        if self.offsets is not None:
+            lines.append("offsets:{},{},{},{}".format(*self.offsets))
+        if self.degrees:
+            lines.append(f"rotate:{self.degrees}")
+        lines.extend(f"{key}:{value}" for key, value in self.properties)
+        return lines
+
+    def _spine3_lines(self) -> List[str]:
+        # Spine 3 runtimes read the region properties in this fixed order
+        rotate = {0: 'false', 90: 'true'}.get(self.degrees, str(self.degrees))
+        lines = [self.name, f"  rotate: {rotate}"]
+        if self.has_bounds:
+            lines.append(f"  xy: {self.x}, {self.y}")
+            lines.append(f"  size: {self.width}, {self.height}")
+        others = []
+        index = '-1'
+        for key, value in self.properties:
+            if key in _SCALED_REGION_PROPERTIES:
+                lines.append(f"  {key}: {value}")
+            elif key == 'index':
+                index = value
+            else:
+                others.append(f"  {key}: {value}")
+        offset_x, offset_y, original_width, original_height = self.offsets or (0, 0, self.width or 0, self.height or 0)
+        lines.append(f"  orig: {original_width}, {original_height}")
+        lines.append(f"  offset: {offset_x}, {offset_y}")
+        lines.append(f"  index: {index}")
+        return lines + others
+
+
+class AtlasPage:
+    """One texture page of an atlas and the regions packed into it."""
+
+    __slots__ = ('name', 'width', 'height', 'properties', 'regions')
+
+    def __init__(self, name: str, width: int = 0, height: int = 0, properties=None):
+        self.name = name
+        self.width = width
+        self.height = height
+        self.properties = list(properties or [])  # format, filter, pma, repeat ... in file order
+        self.regions = []
+
+    def _lines(self, atlas_format: int = ATLAS_FORMAT_SPINE4) -> List[str]:
+        separator = ': ' if atlas_format == ATLAS_FORMAT_SPINE3 else ':'
+        lines = [self.name, f"size{separator}{self.width},{self.height}"]
+        lines.extend(f"{key}{separator}{value}" for key, value in self.properties)
+        for region in self.regions:
+            lines.extend(region._lines(atlas_format))
+        return lines
+
+
+class Atlas:
+    """
+    A parsed Spine .atlas file.
+
+    Reads both the Spine 4 format (bounds/offsets) and the older Spine 3
+    format (xy/size/orig/offset) and writes back the format it was read in
+    (atlas_format), since 3.x runtimes can't read the Spine 4 format.
+    Serialization is deterministic: pages, regions and unknown properties
+    keep their order.
+    """
+
+    def __init__(self, pages: Optional[List[AtlasPage]] = None, atlas_format: int = ATLAS_FORMAT_SPINE4):
+        self.pages = pages or []
+        self.atlas_format = atlas_format
+
+    @classmethod
+    def parse(cls, text: str) -> 'Atlas':
+        """
+        Parse atlas text in a single pass over its lines.
+
+        Raises:
+            ValueError: If a numeric property cannot be parsed
+        """
+        atlas = cls()
+        page = None
+        region = None
+        for line in text.splitlines():
+            key, separator, value = line.partition(':')
+            if not separator:
+                stripped = line.strip()
+                if not stripped:
+                    page = region = None
+                    continue
+                if page is None or stripped.lower().endswith('.png'):
+                    page = AtlasPage(stripped)
+                    atlas.pages.append(page)
+                    region = None
+                else:
+                    region = AtlasRegion(stripped)
+                    page.regions.append(region)
+                continue
+            if page is None:
+                continue  # Properties before the first page (none in practice)
+            key, value = key.strip(), value.strip()
+            if region is None:
+                if key == 'size':
+                    page.width, page.height = _parse_ints(value)
+                else:
+                    page.properties.append((key, value))
+            elif key == 'bounds':  # Most common property, set without the method call
+                region.x, region.y, region.width, region.height = _parse_ints(value)
+            else:
+                if key == 'xy':
+                    atlas.atlas_format = ATLAS_FORMAT_SPINE3
+                region._set_property(key, value)
+        return atlas
+
+    @classmethod
+    def load(cls, atlas_path: str) -> 'Atlas':
+        """Load an atlas from a plain file or a mod archive entry."""
+        with open_mod_text(atlas_path, 'utf-8') as f:
+            return cls.parse(f.read())
+
+    def serialize(self) -> str:
+        return '\n\n'.join('\n'.join(page._lines(self.atlas_format)) for page in self.pages) + '\n'
+
+    def save(self, atlas_path: str):
+        with open(atlas_path, 'w', encoding='utf-8') as f:
+            f.write(self.serialize())
+
+    def page(self, name: str) -> Optional[AtlasPage]:
+        for page in self.pages:
+            if page.name == name:
+                return page
+        return None
+
+    def regions(self) -> Iterable[AtlasRegion]:
+        for page in self.pages:
+            yield from page.regions
+
+    @staticmethod
+    def translate_regions(regions: Iterable[AtlasRegion], dx: int, dy: int):
+        """Move regions on their page; regions without bounds are left as they are."""
+        for region in regions:
+            if region.has_bounds:
+                region.x += dx
+                region.y += dy
+
+    def scale(self, factor_x: float, factor_y: Optional[float] = None, page_names: Optional[Iterable[str]] = None):
+        """
+        Scale pages and their regions, e.g. after the page textures were resized.
+
+        Region edges are rounded so that regions touching before scaling still
+        touch afterwards. Offsets and nine-patch values are in the unrotated
+        region space, so rotated regions use the factors swapped. Only the
+        pages named in page_names are scaled when it is given.
+        """
+        factor_y = factor_x if factor_y is None else factor_y
+        page_names = None if page_names is None else set(page_names)
+        for page in self.pages:
+            if page_names is not None and page.name not in page_names:
+                continue
+            page.width = max(1, round(page.width * factor_x))
+            page.height = max(1, round(page.height * factor_y))
+            for region in page.regions:
+                region_fx, region_fy = (factor_y, factor_x) if region.rotated else (factor_x, factor_y)
+                if region.has_bounds:
+                    _, _, page_width, page_height = region.footprint()
+                    region.x, page_width = _scale_span(region.x, page_width, factor_x)
+                    region.y, page_height = _scale_span(region.y, page_height, factor_y)
+                    region.width, region.height = (page_height, page_width) if region.rotated else (page_width, page_height)
+                if region.offsets is not None:
+                    offset_x, offset_y, original_width, original_height = region.offsets
+                    region.offsets = (round(offset_x * region_fx), round(offset_y * region_fy),
+                                      max(1, round(original_width * region_fx)), max(1, round(original_height * region_fy)))
+                region.properties = [
+                    (key, ','.join(str(round(v * (region_fx if i < 2 else region_fy))) for i, v in enumerate(_parse_ints(value))))
+                    if key in _SCALED_REGION_PROPERTIES else (key, value)
+                    for key, value in region.properties
+                ]
+
+
+def load_atlas(atlas_path: str) -> Tuple[Optional[Atlas], Optional[str]]:
+    """
+    Load a .atlas file.
+
+    Args:
+        atlas_path: Path to the .atlas file
+
+    Returns:
+        Tuple of (Atlas, error message)
+        If successful, returns (Atlas, None)
+        If failed, returns (None, error_message)
+    """
+    try:
+        return Atlas.load(atlas_path), None
+    except FileNotFoundError:
+        return None, f"Atlas file not found at {atlas_path}"
+    except Exception as e:
+        return None, f"Error reading atlas file: {e}"
+
+
+def _concat_pages(sizes: List[Tuple[int, int]], max_pages: int):
+    """
+    Place pages side by side, consecutive pages sharing one of at most max_pages output pages.
+
+    Returns:
+        (page sizes, placements) like pack_rects, or None if a row exceeds MAX_PAGE_SIZE
+    """
+    per_page = -(-len(sizes) // max_pages)
+    output_sizes = []
+    placements = []
+    for start in range(0, len(sizes), per_page):
+        group = sizes[start:start + per_page]
+        x = 0
+        for width, _ in group:
+            placements.append((len(output_sizes), x, 0))
+            x += width
+        output_sizes.append((x, max(height for _, height in group)))
+    if any(max(size) > MAX_PAGE_SIZE for size in output_sizes):
+        return None
+    return output_sizes, placements
+
+
+def layout_atlas_pages(atlas: Atlas, page_sizes: Dict[str, Tuple[int, int]], output_names: List[str],
+                       padding: int = REGION_PADDING) -> Tuple[Optional[Dict], Optional[str]]:
+    """
+    Repack the regions of several atlas pages into at most len(output_names) pages.
+
+    Regions are packed into near-square pages of minimal area (see
+    pack_rects); if they do not fit, whole pages are placed side by side
+    instead. Regions keep their rotation: rotated regions are moved as they are stored on
+    the page and their rotate flag is left untouched. Pages whose regions
+    have no bounds are moved as a whole.
+
+    Args:
+        atlas: Atlas describing the source pages
+        page_sizes: Ordered {page image name: (width, height)} of the pages to merge
+        output_names: Image names for the output pages, in order
+        padding: Empty pixels kept between regions
+
+    Returns:
+        Tuple of (layout, error message). layout has 'atlas', the Atlas of the
+        output pages, and 'copies', a list of (source page name,
+        (left, top, right, bottom), output page index, (x, y)) describing the
+        pixels to copy
+    """
+    pieces = []      # (source page name, x, y, width, height)
+    piece_index = {}
+    placed_regions = []  # (piece index, region, offset of the region inside the piece)
+    page_properties = None
+
+    for page_name, (page_width, page_height) in page_sizes.items():
+        page = atlas.page(page_name)
+        regions = page.regions if page else []
+        if page and page_properties is None:
+            page_properties = page.properties
+
+        if regions and all(region.has_bounds for region in regions):
+            for region in regions:
+                key = (page_name,) + region.footprint()
+                if key not in piece_index:
+                    piece_index[key] = len(pieces)
+                    pieces.append(key)
+                placed_regions.append((piece_index[key], region, -region.x, -region.y))
+        else:
+            # Without bounds for every region the page can only be moved as one piece
+            pieces.append((page_name, 0, 0, page_width, page_height))
+            placed_regions.extend((len(pieces) - 1, region, 0, 0) for region in regions)
+
+    packed = pack_rects([(width, height) for _, _, _, width, height in pieces], len(output_names), padding)
+    if packed is None:
+        # Fall back to placing whole pages side by side, as the merger did before region packing
+        pieces = [(page_name, 0, 0, page_width, page_height) for page_name, (page_width, page_height) in page_sizes.items()]
+        placed_regions = []
+        for piece, (page_name, _, _, _, _) in enumerate(pieces):
+            page = atlas.page(page_name)
+            placed_regions.extend((piece, region, 0, 0) for region in (page.regions if page else []))
+        packed = _concat_pages([(width, height) for _, _, _, width, height in pieces], len(output_names))
+    if packed is None:
+        return None, f"Regions do not fit in {len(output_names)} page(s) of at most {MAX_PAGE_SIZE}px"
+    output_sizes, placements = packed
+
+    merged = Atlas([
+        AtlasPage(name, width, height, page_properties)
+        for name, (width, height) in zip(output_names, output_sizes)
+    ], atlas.atlas_format)
+    for piece, region, offset_x, offset_y in placed_regions:
+        page_index, x, y = placements[piece]
+        moved = region.copy()
+        Atlas.translate_regions((moved,), x + offset_x, y + offset_y)
+        merged.pages[page_index].regions.append(moved)
+
+    copies = [
+        (page_name, (x, y, x + width, y + height), page_index, (new_x, new_y))
+        for (page_name, x, y, width, height), (page_index, new_x, new_y) in zip(pieces, placements)
+    ]
+    return {'atlas': merged, 'copies': copies}, None
+
+
+def render_atlas_pages(layout: Dict, images: Dict) -> List:
+    """
+    Draw the pages of a layout from layout_atlas_pages.
+
+    Each output page is allocated once and the regions are copied into it.
+
+    Args:
+        layout: Layout from layout_atlas_pages
+        images: {page image name: PIL image} of the source pages
+
+    Returns:
+        List of RGBA PIL images, one per layout page
+    """
+    from PIL import Image
+
+    canvases = [Image.new('RGBA', (page.width, page.height)) for page in layout['atlas'].pages]
+    for page_name, box, page_index, position in layout['copies']:
+        source = images[page_name]
+        if box == (0, 0) + source.size:
+            canvases[page_index].paste(source, position)
+        else:
+            with source.crop(box) as piece:
+                canvases[page_index].paste(piece, position)
+    return canvases
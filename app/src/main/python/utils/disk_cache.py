@@ -0,0 +1,212 @@
+"""Persistent content-addressed cache utilities for BDroid_X."""
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+from typing import Optional
+
+# Default location for all on-disk caches. Under Chaquopy the temp dir lives in
+# the app's cache directory, so Android may reclaim it when storage runs low.
+DEFAULT_CACHE_ROOT = os.path.join(tempfile.gettempdir(), "bdroid_cache")
+
+
+def hash_bytes(data) -> str:
+    """
+    Return the SHA-256 hex digest of a bytes-like object.
+
+    Args:
+        data: Bytes, bytearray or memoryview to hash
+
+    Returns:
+        Hex digest string
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def hash_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Return the SHA-256 hex digest of a file's content without loading it whole.
+
+    Args:
+        path: Path to the file
+        chunk_size: Read size per iteration
+
+    Returns:
+        Hex digest string
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def make_key(*parts) -> str:
+    """
+    Build a cache key from an ordered sequence of parts.
+
+    Args:
+        *parts: Values identifying the cached item (digests, options, versions)
+
+    Returns:
+        Hex digest string usable as a file name
+    """
+    return hash_bytes("\x1f".join(str(p) for p in parts).encode('utf-8'))
+
+
+class DiskCache:
+    """
+    Size-capped LRU cache that stores one file per entry.
+
+    Entries are written atomically (temp file + rename), so a crash or a
+    concurrent writer never leaves a truncated entry behind. Recency is tracked
+    through the file modification time, which is bumped on every hit.
+    """
+
+    def __init__(self, root: str, max_bytes: int):
+        """
+        Args:
+            root: Directory that holds the cache entries
+            max_bytes: Total size cap; least recently used entries are evicted
+        """
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._total_bytes = None
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Read an entry and mark it as recently used.
+
+        Returns:
+            The stored bytes, or None on a miss or read error
+        """
+        path = self._entry_path(key)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.utime(path, None)
+            return data
+        except OSError:
+            return None
+
+    def contains(self, key: str) -> bool:
+        """Check for an entry without reading it or bumping its recency."""
+        return os.path.exists(self._entry_path(key))
+
+    def get_file(self, key: str, dest_path: str) -> bool:
+        """
+        Copy an entry to a file and mark it as recently used.
+
+        Unlike get(), the entry is never loaded into memory as a whole.
+
+        Args:
+            key: Cache key
+            dest_path: File to write the entry to
+
+        Returns:
+            True on a hit, False on a miss or copy error
+        """
+        path = self._entry_path(key)
+        try:
+            shutil.copyfile(path, dest_path)
+            os.utime(path, None)
+            return True
+        except OSError:
+            return False
+
+    def put(self, key: str, data) -> bool:
+        """
+        Store an entry, evicting old entries if the size cap is exceeded.
+
+        Entries larger than the whole cap are not stored.
+
+        Returns:
+            True if the entry was written, False otherwise
+        """
+        def write(tmp_path):
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+
+        return self._store(key, len(data), write)
+
+    def put_file(self, key: str, src_path: str) -> bool:
+        """
+        Store a copy of a file as an entry, like put() but without reading it into memory.
+
+        Returns:
+            True if the entry was written, False otherwise
+        """
+        try:
+            size = os.path.getsize(src_path)
+        except OSError:
+            return False
+        return self._store(key, size, lambda tmp_path: shutil.copyfile(src_path, tmp_path))
+
+    def _store(self, key: str, size: int, write) -> bool:
+        if size > self.max_bytes:
+            return False
+
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write(tmp_path)
+            previous_size = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Cache write failed for {key}: {e}")
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            return False
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_total_bytes()
+            else:
+                self._total_bytes += size - previous_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+        return True
+
+    def _list_entries(self):
+        entries = []
+        if not os.path.isdir(self.root):
+            return entries
+        for root, _, files in os.walk(self.root):
+            for f in files:
+                if f.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, f)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, path))
+        return entries
+
+    def _scan_total_bytes(self) -> int:
+        return sum(size for _, size, _ in self._list_entries())
+
+    def _evict(self):
+        entries = sorted(self._list_entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._total_bytes = total
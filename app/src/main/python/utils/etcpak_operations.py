@@ -0,0 +1,65 @@
+"""ETC2 texture compression through the optional etcpak package for BDroid_X."""
+from typing import Optional, Tuple
+
+try:
+    import etcpak
+except ImportError:  # Not part of the default app build
+    etcpak = None
+
+# Unity TextureFormat.ETC2_RGBA8
+ETC2_RGBA8_FORMAT = 47
+# ETC2 encodes 4x4 pixel blocks of 16 bytes, like ASTC 4x4
+ETC2_BLOCK_SIZE = 4
+
+
+def is_available() -> bool:
+    """Return True if the etcpak package can be used."""
+    return etcpak is not None
+
+
+def _pad_to_blocks(image_bytes, width: int, height: int) -> Tuple[bytes, int, int]:
+    """
+    Pad RGBA8 pixels to whole 4x4 blocks by repeating the last column and row.
+
+    Returns:
+        Tuple of (pixels, padded width, padded height)
+    """
+    padded_width = -(-width // ETC2_BLOCK_SIZE) * ETC2_BLOCK_SIZE
+    padded_height = -(-height // ETC2_BLOCK_SIZE) * ETC2_BLOCK_SIZE
+    if (padded_width, padded_height) == (width, height):
+        return image_bytes, width, height
+
+    data = memoryview(image_bytes)
+    row_bytes = width * 4
+    extra_pixels = padded_width - width
+    rows = []
+    for start in range(0, row_bytes * height, row_bytes):
+        row = data[start:start + row_bytes]
+        rows.append(row.tobytes() + row[-4:].tobytes() * extra_pixels if extra_pixels else row)
+    rows.extend([rows[-1]] * (padded_height - height))
+    return b''.join(rows), padded_width, padded_height
+
+
+def compress_image(image_bytes, width: int, height: int) -> Tuple[Optional[bytes], Optional[str]]:
+    """
+    Compress an RGBA8 image to ETC2 RGBA8 with etcpak.
+
+    Sizes that are not a multiple of 4 are padded; the texture keeps its
+    real width and height, the extra texels are never sampled.
+
+    Args:
+        image_bytes: Raw RGBA8 pixels, rows in the order they should be encoded
+        width: Image width in pixels
+        height: Image height in pixels
+
+    Returns:
+        Tuple of (compressed bytes, error message)
+    """
+    if etcpak is None:
+        return None, "etcpak is not installed."
+
+    try:
+        image_bytes, padded_width, padded_height = _pad_to_blocks(image_bytes, width, height)
+        return etcpak.compress_etc2_rgba(image_bytes, padded_width, padded_height), None
+    except Exception as e:
+        return None, f"etcpak compression failed: {e}"
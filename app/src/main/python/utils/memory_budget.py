@@ -0,0 +1,68 @@
+"""Memory budget helpers used to admit work without risking an out-of-memory kill."""
+import threading
+from typing import Optional
+
+# Used when the available memory cannot be read (non-Linux hosts)
+FALLBACK_AVAILABLE_BYTES = 1024 * 1024 * 1024
+
+
+def get_available_memory() -> Optional[int]:
+    """
+    Return the memory the kernel considers available for new allocations.
+
+    Returns:
+        MemAvailable from /proc/meminfo in bytes, or None if it can't be read
+    """
+    try:
+        with open('/proc/meminfo', 'r') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    return None
+
+
+class MemoryBudget:
+    """
+    Byte budget shared by concurrent work items.
+
+    Requests larger than the whole budget are clamped to it, so a single huge
+    item can always run once everything else has finished.
+    """
+
+    def __init__(self, total: int):
+        self.total = max(1, total)
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    def _clamp(self, amount: int) -> int:
+        return min(max(0, amount), self.total)
+
+    def try_acquire(self, amount: int) -> bool:
+        """
+        Reserve bytes if they fit right now.
+
+        Returns:
+            True if the bytes were reserved, False otherwise
+        """
+        amount = self._clamp(amount)
+        with self._cond:
+            if self._in_use + amount > self.total:
+                return False
+            self._in_use += amount
+            return True
+
+    def acquire(self, amount: int):
+        """Block until the bytes fit in the budget, then reserve them."""
+        amount = self._clamp(amount)
+        with self._cond:
+            while self._in_use + amount > self.total:
+                self._cond.wait()
+            self._in_use += amount
+
+    def release(self, amount: int):
+        amount = self._clamp(amount)
+        with self._cond:
+            self._in_use -= amount
+            self._cond.notify_all()
@@ -0,0 +1,192 @@
+"""Mod file access for BDroid_X: plain directories and zip archives."""
+import hashlib
+import io
+import os
+import threading
+import zipfile
+from typing import BinaryIO, List, Tuple, Union
+
+# Files inside an archive are addressed as "<archive path>!/<entry name>"
+ARCHIVE_SEPARATOR = "!/"
+
+# Entries the app never installs (same rule as the Kotlin extractor)
+IGNORED_MOD_FILE_SUFFIX = ".modfile"
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def is_archive(path: str) -> bool:
+    """Return True if path is a zip archive rather than a directory."""
+    return os.path.isfile(path) and zipfile.is_zipfile(path)
+
+
+def split_archive_path(path: str) -> Tuple[str, str]:
+    """
+    Split a mod file path into (archive path, entry name).
+
+    Returns:
+        (archive path, entry name) for archive entries, (path, "") for plain files
+    """
+    archive_path, separator, entry_name = path.partition(ARCHIVE_SEPARATOR)
+    if separator and entry_name:
+        return archive_path, entry_name
+    return path, ""
+
+
+def _should_ignore(name: str) -> bool:
+    name = name.rsplit('/', 1)[-1].strip().lower()
+    return not name or name.endswith(IGNORED_MOD_FILE_SUFFIX)
+
+
+def _open_archive(archive_path: str) -> zipfile.ZipFile:
+    """
+    Return a shared ZipFile for the archive, reopened when the file changes.
+
+    ZipFile supports reading several entries at once from different threads,
+    so one instance per archive avoids re-reading the central directory.
+    """
+    stat = os.stat(archive_path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    with _archives_lock:
+        cached = _archives.get(archive_path)
+        if cached and cached[0] == signature:
+            return cached[1]
+        archive = zipfile.ZipFile(archive_path)
+        _archives[archive_path] = (signature, archive)
+    if cached:
+        # Entries already opened from the replaced archive keep its file open until they are closed
+        cached[1].close()
+    return archive
+
+
+def close_archives(sources: Union[str, List[str], None] = None):
+    """
+    Close cached archive handles.
+
+    Args:
+        sources: Archive path or list of mod sources to close (directories are
+                 ignored); None closes every cached archive
+    """
+    if isinstance(sources, str):
+        sources = [sources]
+    with _archives_lock:
+        if sources is None:
+            closed = list(_archives.values())
+            _archives.clear()
+        else:
+            closed = [_archives.pop(source) for source in sources if source in _archives]
+    for _, archive in closed:
+        archive.close()
+
+
+def _reset_after_fork():
+    """
+    Forget the archives inherited from the parent in a forked child.
+
+    The child shares the parent's file descriptors and their file offsets, so
+    reading through an inherited handle would move the parent's offset too.
+    Each process opens its own handles instead.
+    """
+    global _archives, _archives_lock
+    _archives = {}
+    _archives_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def list_mod_files(sources: Union[str, List[str]]) -> List[Tuple[str, str]]:
+    """
+    List the files of one or more mod sources.
+
+    Each source is a directory or a zip archive. When several sources hold a
+    file with the same relative name, the later source wins, matching how
+    the archives used to be extracted into one folder. Backup folders named
+    .old are skipped.
+
+    Args:
+        sources: A directory or archive path, or a list of them
+
+    Returns:
+        List of (relative name with '/' separators, mod file path)
+    """
+    if isinstance(sources, str):
+        sources = [sources]
+
+    files = {}
+    for source in sources:
+        if is_archive(source):
+            for info in _open_archive(source).infolist():
+                if info.is_dir() or _should_ignore(info.filename) or '.old' in info.filename.split('/')[:-1]:
+                    continue
+                files[info.filename] = f"{source}{ARCHIVE_SEPARATOR}{info.filename}"
+        else:
+            for root, _, filenames in os.walk(source):
+                if '.old' in root:
+                    continue
+                for filename in filenames:
+                    filepath = os.path.join(root, filename)
+                    files[os.path.relpath(filepath, source).replace(os.sep, '/')] = filepath
+    return list(files.items())
+
+
+def open_mod_file(path: str) -> BinaryIO:
+    """
+    Open a mod file for binary reading; archive entries are decompressed as they are read.
+
+    Args:
+        path: Plain file path or "<archive>!/<entry>" path
+
+    Returns:
+        Binary file object (seekable for archive entries too)
+    """
+    archive_path, entry_name = split_archive_path(path)
+    if not entry_name:
+        return open(path, 'rb')
+    try:
+        return _open_archive(archive_path).open(entry_name)
+    except KeyError:
+        raise FileNotFoundError(f"No such file in archive: {path}") from None
+
+
+def open_mod_text(path: str, encoding: str = 'utf-8'):
+    """Open a mod file for text reading with the given encoding."""
+    if not split_archive_path(path)[1]:
+        return open(path, 'r', encoding=encoding)
+    return io.TextIOWrapper(open_mod_file(path), encoding=encoding)
+
+
+def read_mod_file(path: str) -> bytes:
+    """Read the whole content of a mod file."""
+    with open_mod_file(path) as f:
+        return f.read()
+
+
+def mod_file_size(path: str) -> int:
+    """Return the uncompressed size of a mod file in bytes."""
+    archive_path, entry_name = split_archive_path(path)
+    if not entry_name:
+        return os.path.getsize(path)
+    try:
+        return _open_archive(archive_path).getinfo(entry_name).file_size
+    except KeyError:
+        raise FileNotFoundError(f"No such file in archive: {path}") from None
+
+
+def hash_mod_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """
+    Return the SHA-256 hex digest of a mod file's content.
+
+    The digest only depends on the content, so the same file hashes the
+    same whether it comes from a directory or an archive.
+    """
+    digest = hashlib.sha256()
+    with open_mod_file(path) as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+    return digest.hexdigest()
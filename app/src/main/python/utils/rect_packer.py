@@ -0,0 +1,263 @@
+"""MaxRects and shelf rectangle bin packing for BDroid_X atlas pages."""
+import math
+import time
+from typing import List, Optional, Tuple
+
+# Largest page side the packer will produce (Unity's Texture2D limit)
+MAX_PAGE_SIZE = 16384
+# Page sides are rounded up to a multiple of this (ASTC 4x4 blocks)
+PAGE_ALIGN = 4
+# Candidate page widths tried per packing run, from square up to this aspect ratio
+WIDTH_CANDIDATES = 8
+MAX_ASPECT_RATIO = 1.5
+# MaxRects costs grow with the square of the rectangle count, so the number of
+# candidate widths shrinks as rectangles are added (rectangles x widths <= budget)
+# and larger sets use shelf packing, which is linear per pass
+MAXRECTS_CANDIDATE_BUDGET = 512
+MAXRECTS_MAX_RECTS = 300
+# Seconds spent searching MaxRects layouts before settling for the best one found
+PACK_TIME_BUDGET = 1.0
+
+
+class MaxRectsBin:
+    """
+    A single page packed with the MaxRects algorithm (best short side fit).
+
+    Free space is kept as a list of maximal, possibly overlapping rectangles
+    stored as (left, top, right, bottom), so placements are near optimal
+    without trying every position.
+    """
+
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.free_rects = [(0, 0, width, height)]
+
+    def insert(self, width: int, height: int) -> Optional[Tuple[int, int]]:
+        """
+        Place a rectangle without rotating it.
+
+        Returns:
+            (x, y) of the placed rectangle, or None if it does not fit
+        """
+        best = None
+        best_score = None
+        for left, top, right, bottom in self.free_rects:
+            leftover_w = right - left - width
+            leftover_h = bottom - top - height
+            if leftover_w >= 0 and leftover_h >= 0:
+                score = (min(leftover_w, leftover_h), max(leftover_w, leftover_h))
+                if best_score is None or score < best_score:
+                    best, best_score = (left, top), score
+        if best is None:
+            return None
+
+        self._split_free_rects(best[0], best[1], best[0] + width, best[1] + height)
+        return best
+
+    def _split_free_rects(self, x: int, y: int, right: int, bottom: int):
+        kept_rects = []
+        new_rects = []
+        for rect in self.free_rects:
+            free_left, free_top, free_right, free_bottom = rect
+            if x >= free_right or right <= free_left or y >= free_bottom or bottom <= free_top:
+                kept_rects.append(rect)
+                continue
+            # Keep the parts of the free rectangle on each side of the placed one
+            if x > free_left:
+                new_rects.append((free_left, free_top, x, free_bottom))
+            if right < free_right:
+                new_rects.append((right, free_top, free_right, free_bottom))
+            if y > free_top:
+                new_rects.append((free_left, free_top, free_right, y))
+            if bottom < free_bottom:
+                new_rects.append((free_left, bottom, free_right, free_bottom))
+        self.free_rects = _prune_contained(kept_rects, new_rects)
+
+
+def _prune_contained(kept_rects, new_rects):
+    """
+    Drop newly split free rectangles that lie entirely inside another one.
+
+    Untouched rectangles were maximal before the split and every new one is
+    part of an old rectangle, so an untouched rectangle can never be inside
+    a new one; only the new rectangles need checking.
+    """
+    new_rects.sort(key=lambda r: (r[2] - r[0]) * (r[3] - r[1]), reverse=True)
+    maximal_rects = kept_rects
+    for rect in new_rects:
+        left, top, right, bottom = rect
+        for other_left, other_top, other_right, other_bottom in maximal_rects:
+            if other_left <= left and other_top <= top and right <= other_right and bottom <= other_bottom:
+                break
+        else:
+            maximal_rects.append(rect)
+    return maximal_rects
+
+
+def _align(value: int) -> int:
+    return -(-value // PAGE_ALIGN) * PAGE_ALIGN
+
+
+def _pack_into(sizes, order, page_width, page_height, max_pages, padding):
+    """
+    Pack every rectangle into at most max_pages pages of the given size.
+
+    Returns:
+        List of (page_index, x, y) in the order of sizes, or None if they do not fit
+    """
+    # Each rectangle reserves its padding on the right and bottom; the page is
+    # padded the same way so the last row and column may touch its edge.
+    pages = []
+    placements = [None] * len(sizes)
+    for index in order:
+        width, height = sizes[index]
+        for page_index, page in enumerate(pages):
+            position = page.insert(width + padding, height + padding)
+            if position:
+                break
+        else:
+            if len(pages) == max_pages:
+                return None
+            page_index = len(pages)
+            pages.append(MaxRectsBin(page_width + padding, page_height + padding))
+            position = pages[-1].insert(width + padding, height + padding)
+            if position is None:
+                return None
+        placements[index] = (page_index, position[0], position[1])
+    return placements
+
+
+def _shelf_pack_into(sizes, order, page_width, page_height, max_pages, padding):
+    """
+    Pack every rectangle into at most max_pages pages using next-fit shelves.
+
+    order should list tall rectangles first so each shelf wastes little height.
+
+    Returns:
+        List of (page_index, x, y) in the order of sizes, or None if they do not fit
+    """
+    page_width += padding
+    page_height += padding
+    placements = [None] * len(sizes)
+    page_index = shelf_y = shelf_height = cursor_x = 0
+    for index in order:
+        width, height = sizes[index]
+        width += padding
+        height += padding
+        if cursor_x + width > page_width:
+            shelf_y += shelf_height
+            shelf_height = cursor_x = 0
+        if shelf_y + height > page_height:
+            page_index += 1
+            shelf_y = shelf_height = cursor_x = 0
+        if page_index == max_pages or width > page_width or height > page_height:
+            return None
+        placements[index] = (page_index, cursor_x, shelf_y)
+        cursor_x += width
+        shelf_height = max(shelf_height, height)
+    return placements
+
+
+def _used_page_sizes(sizes, placements):
+    page_sizes = {}
+    for (width, height), (page_index, x, y) in zip(sizes, placements):
+        used_w, used_h = page_sizes.get(page_index, (0, 0))
+        page_sizes[page_index] = (max(used_w, x + width), max(used_h, y + height))
+    return [(_align(w), _align(h)) for _, (w, h) in sorted(page_sizes.items())]
+
+
+def _pack_min_height(pack, sizes, order, page_width, low, max_pages, padding, max_size, deadline):
+    """
+    Pack at page_width with the smallest page height that still fits.
+
+    The search stops early once deadline (time.monotonic()) has passed.
+
+    Returns:
+        Placements as returned by pack, or None if nothing fits
+    """
+    result = (pack(sizes, order, page_width, _align(2 * low), max_pages, padding)
+              or pack(sizes, order, page_width, max_size, max_pages, padding))
+    if result is None:
+        return None
+    # Binary search (in PAGE_ALIGN steps) for the smallest page height that still fits
+    low_steps = low // PAGE_ALIGN
+    high_steps = max(low_steps, max(h for _, h in _used_page_sizes(sizes, result)) // PAGE_ALIGN)
+    while low_steps < high_steps and time.monotonic() < deadline:
+        middle_steps = (low_steps + high_steps) // 2
+        attempt = pack(sizes, order, page_width, middle_steps * PAGE_ALIGN, max_pages, padding)
+        if attempt is None:
+            low_steps = middle_steps + 1
+        else:
+            high_steps, result = middle_steps, attempt
+    return result
+
+
+def pack_rects(sizes: List[Tuple[int, int]], max_pages: int, padding: int = 0,
+               max_size: int = MAX_PAGE_SIZE,
+               time_budget: float = PACK_TIME_BUDGET) -> Optional[Tuple[List[Tuple[int, int]], List[Tuple[int, int, int]]]]:
+    """
+    Pack rectangles into at most max_pages near-square pages of minimal area.
+
+    Every page shares the same size limit while packing; each page is then
+    cropped to the area it actually uses. Rectangles are never rotated.
+    Up to MAXRECTS_MAX_RECTS rectangles are placed with MaxRects, trying
+    fewer page widths the more rectangles there are; larger sets use shelf
+    packing at a single, square width.
+
+    Args:
+        sizes: (width, height) of each rectangle
+        max_pages: Maximum number of pages to produce
+        padding: Empty pixels kept between rectangles
+        max_size: Largest allowed page side
+        time_budget: Seconds after which the search keeps the best layout found so far
+
+    Returns:
+        Tuple of (page sizes, placements) where placements holds (page_index, x, y)
+        for each rectangle, or None if they cannot fit in max_pages pages
+    """
+    if not sizes:
+        return [], []
+    if max_pages < 1:
+        return None
+
+    deadline = time.monotonic() + time_budget
+    max_w = max(w for w, _ in sizes)
+    max_h = max(h for _, h in sizes)
+    if max_w > max_size or max_h > max_size:
+        return None
+    total_area = sum((w + padding) * (h + padding) for w, h in sizes)
+    min_page_area = math.ceil(total_area / max_pages)
+
+    if len(sizes) <= MAXRECTS_MAX_RECTS:
+        pack = _pack_into
+        width_count = max(1, min(WIDTH_CANDIDATES, MAXRECTS_CANDIDATE_BUDGET // len(sizes)))
+        # Large rectangles first: MaxRects places them best while space is still open
+        order = sorted(range(len(sizes)), key=lambda i: (max(sizes[i]), sizes[i][0] * sizes[i][1]), reverse=True)
+    else:
+        pack = _shelf_pack_into
+        width_count = 1
+        order = sorted(range(len(sizes)), key=lambda i: (sizes[i][1], sizes[i][0]), reverse=True)
+
+    # Widths from a square page up to MAX_ASPECT_RATIO; the height is searched for each
+    square_side = math.isqrt(min_page_area)
+    start_width = _align(max(max_w, square_side))
+    end_width = min(max_size, max(start_width, _align(int(square_side * MAX_ASPECT_RATIO))))
+    step = max(PAGE_ALIGN, _align((end_width - start_width) // WIDTH_CANDIDATES))
+
+    best = None
+    best_score = None
+    for page_width in list(range(start_width, end_width + 1, step))[:width_count]:
+        if best is not None and time.monotonic() >= deadline:
+            break
+        low = _align(max(max_h, math.ceil(min_page_area / page_width), math.ceil(page_width / MAX_ASPECT_RATIO)))
+        result = _pack_min_height(pack, sizes, order, page_width, low, max_pages, padding, max_size, deadline)
+        if result is None:
+            continue
+
+        page_sizes = _used_page_sizes(sizes, result)
+        area = sum(w * h for w, h in page_sizes)
+        score = (area, max(max(w, h) for w, h in page_sizes))
+        if best_score is None or score < best_score:
+            best, best_score = (page_sizes, result), score
+    return best
@@ -0,0 +1,6 @@
+import os
+import sys
+
+# The tested modules are the app's bundled Python sources and vendored packages
+_PYTHON_SRC = os.path.join(os.path.dirname(__file__), "..", "..", "main", "python")
+sys.path[:0] = [_PYTHON_SRC, os.path.join(_PYTHON_SRC, "vendor")]
@@ -0,0 +1,59 @@
+from utils.atlas_operations import ATLAS_FORMAT_SPINE3, ATLAS_FORMAT_SPINE4, Atlas, layout_atlas_pages
+
+SPINE3_ATLAS = """a.png
+size: 128,64
+format: RGBA8888
+filter: Linear,Linear
+repeat: none
+head
+  rotate: true
+  xy: 2, 2
+  size: 40, 20
+  split: 1, 2, 3, 4
+  orig: 44, 24
+  offset: 2, 2
+  index: -1
+
+b.png
+size: 64,64
+format: RGBA8888
+filter: Linear,Linear
+repeat: none
+body
+  rotate: false
+  xy: 10, 4
+  size: 30, 30
+  orig: 30, 30
+  offset: 0, 0
+  index: 3
+"""
+
+SPINE4_ATLAS = """a.png
+size:100,50
+filter:Linear,Linear
+r1
+bounds:0,0,40,40
+offsets:1,1,42,42
+"""
+
+
+def test_spine3_atlas_round_trips_in_its_format():
+    atlas = Atlas.parse(SPINE3_ATLAS)
+    assert atlas.atlas_format == ATLAS_FORMAT_SPINE3
+    assert atlas.serialize() == SPINE3_ATLAS
+
+
+def test_spine4_atlas_round_trips_in_its_format():
+    atlas = Atlas.parse(SPINE4_ATLAS)
+    assert atlas.atlas_format == ATLAS_FORMAT_SPINE4
+    assert atlas.serialize() == SPINE4_ATLAS
+
+
+def test_merged_spine3_atlas_stays_spine3():
+    layout, err = layout_atlas_pages(Atlas.parse(SPINE3_ATLAS), {"a.png": (128, 64), "b.png": (64, 64)}, ["out.png"])
+    assert err is None
+    text = layout['atlas'].serialize()
+    assert "bounds:" not in text and "offsets:" not in text
+    merged = Atlas.parse(text)
+    assert merged.atlas_format == ATLAS_FORMAT_SPINE3
+    assert {region.name for region in merged.regions()} == {"head", "body"}
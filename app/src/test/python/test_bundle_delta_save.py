@@ -0,0 +1,68 @@
+import random
+import struct
+
+import pytest
+import UnityPy
+from UnityPy.streams import EndianBinaryReader
+
+NODE_FLAGS = 4
+
+
+def _raw_bundle(files):
+    """Build an uncompressed UnityFS bundle holding the given (name, data) nodes."""
+    data = b"".join(content for _, content in files)
+    blocks_info = b"\0" * 16 + struct.pack(">i", 1) + struct.pack(">IIH", len(data), len(data), 0)
+    blocks_info += struct.pack(">i", len(files))
+    offset = 0
+    for name, content in files:
+        blocks_info += struct.pack(">qqI", offset, len(content), NODE_FLAGS) + name.encode() + b"\0"
+        offset += len(content)
+    header = b"UnityFS\0" + struct.pack(">I", 6) + b"5.x.x\0" + b"2018.4.0f1\0"
+    total_size = len(header) + 20 + len(blocks_info) + len(data)
+    return header + struct.pack(">qIII", total_size, len(blocks_info), len(blocks_info), 0x40) + blocks_info + data
+
+
+@pytest.fixture
+def lz4_bundle(tmp_path):
+    rng = random.Random(0)
+    files = {
+        "CAB-x.resS": bytes(rng.getrandbits(8) for _ in range(300000)),
+        "CAB-y.resS": bytes(rng.getrandbits(8) for _ in range(200000)),
+    }
+    raw_path = tmp_path / "raw.bundle"
+    raw_path.write_bytes(_raw_bundle(list(files.items())))
+    path = tmp_path / "lz4.bundle"
+    path.write_bytes(UnityPy.load(str(raw_path)).file.save(packer="lz4"))
+    return path, files
+
+
+def _delta_save(env, path):
+    with open(path, "wb") as f:
+        env.file.save(f, packer="lz4", delta=True)
+    return UnityPy.load(str(path)).file.files
+
+
+def test_unchanged_bundle_keeps_original_blocks(lz4_bundle, tmp_path):
+    path, _ = lz4_bundle
+    out_path = tmp_path / "out.bundle"
+    _delta_save(UnityPy.load(str(path)), out_path)
+    assert out_path.read_bytes() == path.read_bytes()
+
+
+def test_replaced_reader_is_written(lz4_bundle, tmp_path):
+    path, files = lz4_bundle
+    env = UnityPy.load(str(path))
+    replacement = EndianBinaryReader(b"N" * 999)
+    replacement.flags = NODE_FLAGS
+    env.file.files["CAB-x.resS"] = replacement
+
+    saved = _delta_save(env, tmp_path / "out.bundle")
+    assert saved["CAB-x.resS"].bytes == b"N" * 999
+    assert saved["CAB-y.resS"].bytes == files["CAB-y.resS"]
+
+
+def test_refuses_to_overwrite_its_source(lz4_bundle):
+    path, _ = lz4_bundle
+    env = UnityPy.load(str(path))
+    with open(path, "r+b") as f, pytest.raises(ValueError):
+        env.file.save(f, packer="lz4", delta=True)
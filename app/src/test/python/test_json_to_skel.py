@@ -0,0 +1,75 @@
+import json
+import random
+
+from repacker.json_to_skel import PARALLEL_MIN_ANIMATIONS, SkelConverter
+
+
+def _skeleton(animation_count, seed=0):
+    """Generate a Spine 4.1 skeleton with bone and slot timelines of varying length."""
+    rng = random.Random(seed)
+    bones = [{"name": "root"}] + [{"name": f"bone{i}", "parent": "root", "x": i * 2.5} for i in range(8)]
+    slots = [{"name": f"slot{i}", "bone": f"bone{i}", "attachment": f"image{i}"} for i in range(8)]
+    skins = [{
+        "name": "default",
+        "attachments": {
+            f"slot{i}": {f"image{i}": {"x": 1.0, "y": 2.0, "width": 32, "height": 16}}
+            for i in range(8)
+        },
+    }]
+
+    def frames(count, value):
+        result = []
+        for frame in range(count):
+            entry = {"time": frame / 30, **value()}
+            if rng.random() < 0.3:
+                entry["curve"] = [rng.random() for _ in range(4)]
+            result.append(entry)
+        return result
+
+    animations = {}
+    for a in range(animation_count):
+        bone_timelines = {
+            f"bone{b}": {
+                "rotate": frames(rng.randint(1, 20), lambda: {"value": rng.uniform(-180, 180)}),
+                "translate": frames(rng.randint(1, 20), lambda: {"x": rng.uniform(-5, 5), "y": rng.uniform(-5, 5)}),
+            }
+            for b in rng.sample(range(8), rng.randint(1, 8))
+        }
+        slot_timelines = {
+            f"slot{s}": {
+                "attachment": [{"time": 0.0, "name": f"image{s}"}, {"time": 0.5, "name": None}],
+                "rgba": frames(rng.randint(1, 10), lambda: {"color": f"{rng.getrandbits(32):08x}"}),
+            }
+            for s in rng.sample(range(8), rng.randint(1, 4))
+        }
+        animations[f"anim{a}"] = {"bones": bone_timelines, "slots": slot_timelines}
+
+    return {
+        "skeleton": {"hash": "test", "spine": "4.1.24", "x": 0, "y": 0, "width": 100, "height": 100},
+        "bones": bones,
+        "slots": slots,
+        "skins": skins,
+        "animations": animations,
+    }
+
+
+def test_parallel_encoding_matches_sequential():
+    skeleton = _skeleton(PARALLEL_MIN_ANIMATIONS * 5)
+    sequential = SkelConverter(max_workers=1).convert(skeleton)
+    assert SkelConverter(max_workers=4).convert(skeleton) == sequential
+
+
+def test_parallel_ranges_concatenate_in_order():
+    skeleton = _skeleton(PARALLEL_MIN_ANIMATIONS * 3, seed=1)
+    converter = SkelConverter(max_workers=4)
+    converter.convert(skeleton)
+    items = list(skeleton["animations"].items())
+    assert converter.encode_animations_parallel(items) == converter.encode_animations(items)
+
+
+def test_streaming_matches_in_memory(tmp_path):
+    skeleton = _skeleton(PARALLEL_MIN_ANIMATIONS * 2, seed=2)
+    path = tmp_path / "skeleton.json"
+    path.write_text(json.dumps(skeleton), encoding="utf-8")
+    expected = SkelConverter(max_workers=1).convert(skeleton)
+    assert SkelConverter(max_workers=1).convert_file(str(path), streaming=True) == expected
@@ -0,0 +1,48 @@
+import random
+import time
+
+from utils.rect_packer import MAXRECTS_MAX_RECTS, pack_rects
+
+
+def _random_sizes(count, seed):
+    rng = random.Random(seed)
+    return [(rng.randint(8, 200), rng.randint(8, 200)) for _ in range(count)]
+
+
+def _assert_valid(sizes, packed, max_pages, padding):
+    page_sizes, placements = packed
+    assert len(page_sizes) <= max_pages
+    rects_by_page = {}
+    for (width, height), (page_index, x, y) in zip(sizes, placements):
+        page_width, page_height = page_sizes[page_index]
+        assert x >= 0 and y >= 0 and x + width <= page_width and y + height <= page_height
+        rects_by_page.setdefault(page_index, []).append((x, y, x + width + padding, y + height + padding))
+    for rects in rects_by_page.values():
+        rects.sort()
+        for i, (left, top, right, bottom) in enumerate(rects):
+            for other_left, other_top, other_right, other_bottom in rects[i + 1:]:
+                if other_left >= right:
+                    break
+                assert other_top >= bottom or other_bottom <= top
+
+
+def test_small_atlas_uses_maxrects():
+    sizes = _random_sizes(MAXRECTS_MAX_RECTS // 2, seed=1)
+    packed = pack_rects(sizes, 2, padding=2)
+    _assert_valid(sizes, packed, 2, 2)
+
+
+def test_large_atlas_packs_quickly():
+    sizes = _random_sizes(3000, seed=2)
+    start = time.monotonic()
+    packed = pack_rects(sizes, 2, padding=2)
+    elapsed = time.monotonic() - start
+    _assert_valid(sizes, packed, 2, 2)
+    # Used to take minutes with MaxRects over many page sizes
+    assert elapsed < 2.0
+    used_area = sum(width * height for width, height in packed[0])
+    assert sum((width + 2) * (height + 2) for width, height in sizes) / used_area > 0.8
+
+
+def test_too_large_returns_none():
+    assert pack_rects([(300, 300)] * 8, 1, max_size=512) is None